@@ -1,14 +1,38 @@
+import os
+import shutil
+
 import streamlit as st
 import pandas as pd
-import spacy
 from spacy import displacy
 
+from ner_engine import (BATCH_SIZE, DOWNLOAD_PART_BYTES, ENTITY_COLUMNS, PREVIEW_ROWS, RULER_CACHE_SIZE, SPACY_MODEL,
+                        EntityTableWriter, annotate_documents, build_overlay, iter_documents, load_base_pipeline,
+                        new_batch_directory, pattern_set_key, total_text_bytes)
+
 # Set up the Streamlit app
 st.set_page_config(page_title="Custom NER App", layout="wide") # Set the page title and layout
 
 st.title("🧠 Named Entity Recognition (NER) App with spaCy")
 st.write("Upload or paste your text, define custom entity patterns, and see the named entities highlighted below!") # App description
 
+@st.cache_resource(show_spinner="Loading the spaCy model...")
+def get_base_pipeline():
+    """The pretrained pipeline, loaded once per server process and shared by every session."""
+    return load_base_pipeline(SPACY_MODEL)
+
+@st.cache_resource(max_entries=RULER_CACHE_SIZE, show_spinner=False)
+def get_session_pipeline(pattern_key, _patterns):
+    """Base pipeline plus an EntityRuler for one set of custom patterns, cached by the set's hash."""
+    return build_overlay(get_base_pipeline(), _patterns)
+
+def get_nlp():
+    """Pipeline for the current session's patterns. Stops the app with an install hint if the model is missing."""
+    try:
+        return get_session_pipeline(pattern_set_key(st.session_state.entity_list), st.session_state.entity_list)
+    except OSError as e: # Model package not installed
+        st.error(f"Could not load the spaCy model '{SPACY_MODEL}'. Install it with `python -m spacy download en_core_web_sm`. ({e})")
+        st.stop()
+
 # Initialize session state for text input and entity list
 if "entity_list" not in st.session_state: # Check if entity_list is in session state
     st.session_state.entity_list = []
@@ -79,13 +103,7 @@ if st.sidebar.button("🗑️ Clear Patterns"):
 st.header("🔍 Entity Recognition Results")
 
 if text:
-    nlp = spacy.load("en_core_web_sm") # Load spaCy model
-    try:
-        ruler = nlp.get_pipe("entity_ruler") # Try to get existing entity ruler
-    except:
-        ruler = nlp.add_pipe("entity_ruler", before="ner") # Add entity ruler if it doesn't exist
-    ruler.add_patterns(st.session_state.entity_list) # Add custom patterns to the entity ruler
-
+    nlp = get_nlp()
     doc = nlp(text) # Process the text with spaCy
 
     if doc.ents: # Check if any entities were recognized
@@ -97,6 +115,75 @@ if text:
 else:
     st.info("Please enter some text to see recognized entities.") # Info message if no text is entered
 
+# Batch entity extraction for large uploads
+st.header("📚 Batch Entity Extraction")
+st.write("Upload several `.txt` files or a `.zip` of them to extract every entity into a downloadable table. Your custom patterns are applied too.")
+
+batch_files = st.file_uploader("📦 Upload .txt files or a .zip archive", type=["txt", "zip"], accept_multiple_files=True, key="batch_files")
+col1, col2 = st.columns(2)
+with col1:
+    batch_size = st.number_input("Batch size (text chunks per step)", min_value=1, max_value=1024, value=BATCH_SIZE)
+with col2:
+    n_process = st.number_input("Worker processes", min_value=1, max_value=os.cpu_count() or 1, value=1)
+
+if st.button("▶️ Extract Entities", disabled=not batch_files):
+    nlp = get_nlp()
+    previous = st.session_state.pop("batch_result", None)
+    if previous: # Only the latest run's files are kept
+        shutil.rmtree(previous["directory"], ignore_errors=True)
+
+    total_bytes = max(total_text_bytes(batch_files), 1)
+    progress = st.progress(0.0, text="Extracting entities...")
+    done_chars = 0
+    directory = new_batch_directory() # Also prunes results left behind by abandoned sessions
+    with EntityTableWriter(directory) as writer: # Entities go straight to disk; only a preview stays in memory
+        for chunk_chars, records in annotate_documents(nlp, iter_documents(batch_files), batch_size=int(batch_size), n_process=int(n_process)):
+            writer.write(records)
+            done_chars += chunk_chars
+            progress.progress(min(done_chars / total_bytes, 1.0), text=f"Extracting entities... {writer.rows:,} found so far")
+    progress.progress(1.0, text="Done!")
+    st.session_state.batch_result = {
+        "directory": directory,
+        "csv_paths": writer.csv_paths,
+        "jsonl_paths": writer.jsonl_paths,
+        "rows": writer.rows,
+        "documents": len(writer.documents),
+        "label_counts": dict(writer.label_counts.most_common()),
+        "preview": writer.preview,
+    }
+
+batch_result = st.session_state.get("batch_result")
+if batch_result and os.path.isdir(batch_result["directory"]):
+    st.success(f"✅ Found {batch_result['rows']:,} entities in {batch_result['documents']:,} documents.")
+    if batch_result["label_counts"]:
+        st.subheader("🏷️ Entities per Label")
+        st.dataframe(pd.DataFrame(batch_result["label_counts"].items(), columns=["Label", "Count"]), hide_index=True)
+        st.subheader("👀 Preview")
+        if batch_result["rows"] > PREVIEW_ROWS:
+            st.caption(f"Showing the first {PREVIEW_ROWS:,} entities. Download the table for all of them.")
+        st.dataframe(pd.DataFrame(batch_result["preview"], columns=ENTITY_COLUMNS), hide_index=True)
+
+    st.subheader("⬇️ Download")
+    col1, col2 = st.columns(2)
+    with col1:
+        download_format = st.radio("Download format", ["CSV", "JSONL"], horizontal=True)
+    download_paths, mime = {
+        "CSV": (batch_result["csv_paths"], "text/csv"),
+        "JSONL": (batch_result["jsonl_paths"], "application/jsonl"),
+    }[download_format]
+    part_sizes = [os.path.getsize(path) for path in download_paths]
+    with col2: # Large tables are split into parts so one download never holds more than DOWNLOAD_PART_BYTES (plus one batch)
+        part = st.selectbox(
+            "Part", range(len(download_paths)), disabled=len(download_paths) == 1,
+            format_func=lambda i: f"{i + 1} of {len(download_paths)} ({part_sizes[i] / 1024 ** 2:.1f} MB)"
+        )
+    st.caption(f"The {download_format} table is {sum(part_sizes) / 1024 ** 2:.1f} MB in {len(download_paths)} part(s) "
+               f"of up to {DOWNLOAD_PART_BYTES / 1024 ** 2:.0f} MB.")
+    if st.button("📦 Prepare Download"): # The part is only read on this rerun, not on every interaction
+        with open(download_paths[part], "rb") as fh:
+            st.download_button(f"⬇️ Download {os.path.basename(download_paths[part])}", data=fh,
+                               file_name=os.path.basename(download_paths[part]), mime=mime)
+
 # Footer
 st.markdown("---")
 st.markdown("Built with [spaCy](https://spacy.io) and [Streamlit](https://streamlit.io) 💬")
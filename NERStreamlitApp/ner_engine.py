@@ -0,0 +1,238 @@
+"""Headless spaCy helpers for the NER app: one shared base pipeline, cheap per-pattern-set overlays and
+streaming batch extraction.
+
+Nothing here imports Streamlit. The app caches the base pipeline once per process and one overlay per
+distinct set of custom patterns, so adding a pattern builds a new EntityRuler instead of reloading the model.
+"""
+
+import collections
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+
+import spacy
+
+# --- Constants ---
+
+SPACY_MODEL = os.environ.get("NER_SPACY_MODEL", "en_core_web_sm") # Package name or path of the base pipeline
+RULER_CACHE_SIZE = 64 # Distinct custom pattern sets kept as ready-made overlays
+
+CHUNK_CHARS = 20_000 # Longest text handed to spaCy at once (far below nlp.max_length)
+BATCH_SIZE = 32      # Chunks per nlp.pipe batch
+PREVIEW_ROWS = 1000  # Entities kept in memory for the on-screen preview; the rest only go to disk
+ENTITY_COLUMNS = ['doc', 'start', 'end', 'label', 'text']
+BATCH_RESULTS_DIR = os.environ.get("NER_BATCH_DIR", os.path.join(tempfile.gettempdir(), "ner_batch_results"))
+BATCH_RESULT_MAX_AGE = 6 * 60 * 60 # Seconds before another run's result folder counts as abandoned
+DOWNLOAD_PART_BYTES = 32 * 1024 * 1024 # Entity tables are split into files of about this size; one download holds one part
+
+SENTENCE_END = re.compile(r'(?<=[.!?])["\')\]]*\s+')
+
+# --- Pipelines ---
+
+def load_base_pipeline(model=SPACY_MODEL):
+    """Loads the pretrained pipeline every session shares. It is never modified afterwards."""
+    return spacy.load(model)
+
+def pattern_set_key(patterns):
+    """Stable hash of a list of EntityRuler patterns ({'label': ..., 'pattern': [...]})."""
+    return hashlib.sha256(json.dumps(patterns, sort_keys=True).encode('utf-8')).hexdigest()
+
+def build_overlay(base_nlp, patterns):
+    """Pipeline running `base_nlp` with an EntityRuler for `patterns` just before its NER.
+
+    The overlay reuses the base pipeline's vocab, tokenizer and component objects (model weights are
+    not copied), so building one costs about as much as compiling the patterns. With no patterns the
+    base pipeline itself is returned.
+    """
+    if not patterns:
+        return base_nlp
+    overlay = spacy.blank(base_nlp.lang, vocab=base_nlp.vocab)
+    overlay.tokenizer = base_nlp.tokenizer
+    overlay.max_length = base_nlp.max_length
+    for name in base_nlp.pipe_names:
+        overlay.add_pipe(name, source=base_nlp) # Same vocab, so the component object itself is shared
+    ruler_position = {"before": "ner"} if "ner" in overlay.pipe_names else {}
+    ruler = overlay.add_pipe("entity_ruler", **ruler_position)
+    ruler.add_patterns(patterns)
+    return overlay
+
+# --- Batch extraction ---
+
+def iter_documents(uploads):
+    """Yields (name, text stream) for every .txt upload and every .txt file inside uploaded .zip archives.
+
+    Streams decode UTF-8 lazily (undecodable bytes become U+FFFD) and keep the original line endings, so
+    offsets match the decoded file.
+    """
+    for upload in uploads:
+        upload.seek(0)
+        if upload.name.lower().endswith('.zip'):
+            with zipfile.ZipFile(upload) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or not info.filename.lower().endswith('.txt'):
+                        continue
+                    with archive.open(info) as member:
+                        yield f"{upload.name}/{info.filename}", io.TextIOWrapper(member, encoding='utf-8', errors='replace', newline='')
+        else:
+            stream = io.TextIOWrapper(upload, encoding='utf-8', errors='replace', newline='')
+            yield upload.name, stream
+            stream.detach() # Leaves the upload open for later reruns
+
+def total_text_bytes(uploads):
+    """Bytes of text iter_documents will read (uncompressed sizes for zip members), for progress reporting."""
+    total = 0
+    for upload in uploads:
+        if upload.name.lower().endswith('.zip'):
+            upload.seek(0)
+            with zipfile.ZipFile(upload) as archive:
+                total += sum(info.file_size for info in archive.infolist()
+                             if not info.is_dir() and info.filename.lower().endswith('.txt'))
+        else:
+            total += upload.size
+    return total
+
+def _split_long(text, max_chars):
+    """Cuts text into pieces of at most max_chars, at the last sentence end, else the last space, else hard."""
+    while len(text) > max_chars:
+        window = text[:max_chars]
+        cut = max((match.end() for match in SENTENCE_END.finditer(window)), default=0)
+        if cut == 0:
+            cut = window.rfind(' ') + 1
+        if cut == 0:
+            cut = max_chars
+        yield text[:cut]
+        text = text[cut:]
+    if text:
+        yield text
+
+def iter_chunks(stream, max_chars=CHUNK_CHARS):
+    """Splits a text stream into consecutive chunks of at most max_chars. Yields (character offset, text).
+
+    Whole paragraphs (ending at a blank line) are packed together. A paragraph longer than max_chars is
+    cut at sentence ends. Only about one chunk of text is held in memory at a time.
+    """
+    offset = 0
+    chunk, chunk_len = [], 0 # Complete paragraphs waiting to be sent
+    paragraph, paragraph_len = [], 0
+    for line in iter(lambda: stream.readline(max_chars), ''):
+        paragraph.append(line)
+        paragraph_len += len(line)
+        if line.strip() and paragraph_len <= max_chars:
+            continue # Paragraph still open
+        if chunk and chunk_len + paragraph_len > max_chars:
+            yield offset, ''.join(chunk)
+            offset += chunk_len
+            chunk, chunk_len = [], 0
+        if paragraph_len > max_chars:
+            *complete, rest = _split_long(''.join(paragraph), max_chars)
+            for piece in complete:
+                yield offset, piece
+                offset += len(piece)
+            paragraph, paragraph_len = [rest], len(rest)
+            if line.strip():
+                continue # The rest of the paragraph is still to come
+        chunk.extend(paragraph)
+        chunk_len += paragraph_len
+        paragraph, paragraph_len = [], 0
+
+    if chunk and chunk_len + paragraph_len > max_chars:
+        yield offset, ''.join(chunk)
+        offset += chunk_len
+        chunk, chunk_len = [], 0
+    remainder = ''.join(chunk + paragraph)
+    if remainder:
+        yield offset, remainder
+
+def annotate_documents(nlp, documents, batch_size=BATCH_SIZE, n_process=1, max_chars=CHUNK_CHARS):
+    """Runs every chunk of every (name, stream) document through `nlp.pipe`.
+
+    Yields (characters processed, entity records) per chunk, in document order. Records hold the document
+    name, start/end offsets within the document, label and text.
+    """
+    def chunks():
+        for name, stream in documents:
+            for offset, text in iter_chunks(stream, max_chars):
+                yield text, (name, offset, len(text))
+
+    for doc, (name, offset, length) in nlp.pipe(chunks(), as_tuples=True, batch_size=batch_size, n_process=n_process):
+        yield length, [
+            {'doc': name, 'start': offset + ent.start_char, 'end': offset + ent.end_char, 'label': ent.label_, 'text': ent.text}
+            for ent in doc.ents
+        ]
+
+def new_batch_directory(root=BATCH_RESULTS_DIR, max_age=BATCH_RESULT_MAX_AGE):
+    """Fresh folder for one run's entity tables, after deleting folders under `root` older than `max_age` seconds.
+
+    Sessions only delete their own previous results, so this pruning is what cleans up after abandoned ones.
+    """
+    os.makedirs(root, exist_ok=True)
+    cutoff = time.time() - max_age
+    for entry in os.scandir(root):
+        try:
+            if entry.is_dir(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except OSError: # Removed by another session meanwhile
+            pass
+    return tempfile.mkdtemp(prefix="ner_batch_", dir=root)
+
+class EntityTableWriter:
+    """Appends entity records to CSV and JSON Lines files as they arrive.
+
+    Both tables are split into numbered parts (entities-001.csv, entities-001.jsonl, ...) once either
+    part reaches `part_bytes`, so each download stays bounded. Every CSV part has its own header.
+    Only per-label counts, document names and the first PREVIEW_ROWS records stay in memory.
+    """
+
+    def __init__(self, directory, part_bytes=DOWNLOAD_PART_BYTES):
+        self.directory = directory
+        self.part_bytes = part_bytes
+        self.csv_paths, self.jsonl_paths = [], []
+        self._csv_file = self._jsonl_file = None
+        self.label_counts = collections.Counter()
+        self.documents = set()
+        self.preview = []
+        self.rows = 0
+        self._open_part()
+
+    def _open_part(self):
+        self.close()
+        part = len(self.csv_paths) + 1
+        self.csv_paths.append(os.path.join(self.directory, f"entities-{part:03d}.csv"))
+        self.jsonl_paths.append(os.path.join(self.directory, f"entities-{part:03d}.jsonl"))
+        self._csv_file = open(self.csv_paths[-1], 'w', newline='', encoding='utf-8')
+        self._jsonl_file = open(self.jsonl_paths[-1], 'w', encoding='utf-8')
+        self._csv = csv.DictWriter(self._csv_file, fieldnames=ENTITY_COLUMNS)
+        self._csv.writeheader()
+        self._part_rows = 0
+
+    def write(self, records):
+        if self._part_rows and max(self._csv_file.tell(), self._jsonl_file.tell()) >= self.part_bytes:
+            self._open_part()
+        self._csv.writerows(records)
+        self._jsonl_file.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        for record in records:
+            self.label_counts[record['label']] += 1
+            self.documents.add(record['doc'])
+        if len(self.preview) < PREVIEW_ROWS:
+            self.preview.extend(records[:PREVIEW_ROWS - len(self.preview)])
+        self.rows += len(records)
+        self._part_rows += len(records)
+
+    def close(self):
+        for fh in (self._csv_file, self._jsonl_file):
+            if fh is not None:
+                fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
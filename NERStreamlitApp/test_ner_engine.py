@@ -0,0 +1,127 @@
+"""Checks for the headless pipeline and batch extraction helpers in ner_engine."""
+
+import csv
+import io
+import json
+import os
+import time
+import zipfile
+
+import pytest
+import spacy
+
+from ner_engine import (EntityTableWriter, annotate_documents, build_overlay, iter_chunks, iter_documents,
+                        new_batch_directory, pattern_set_key)
+
+PATTERNS = [{"label": "CHARACTER", "pattern": [{"TEXT": "Frodo"}, {"TEXT": "Baggins"}]}]
+
+SAMPLE_TEXT = (
+    "Frodo Baggins left the Shire. Sam went with him!\n"
+    "They walked for days.\n\n"
+    "A second paragraph, a bit longer than the first one, with no sentence end for quite a while and then a stop. "
+    "Another sentence follows? Yes.\r\n\r\n"
+    + "Frodo Baggins " * 40 + "\n"
+    + "x" * 130 + "\n\n"
+    "Last words without a newline"
+)
+
+
+class Upload(io.BytesIO):
+    """Stand-in for Streamlit's UploadedFile: a named, seekable byte stream."""
+
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+# --- Pipelines ---
+
+def test_pattern_set_key_ignores_dict_order():
+    reordered = [{"pattern": [{"TEXT": "Frodo"}, {"TEXT": "Baggins"}], "label": "CHARACTER"}]
+    assert pattern_set_key(PATTERNS) == pattern_set_key(reordered)
+    assert pattern_set_key(PATTERNS) != pattern_set_key([])
+
+
+def test_overlay_adds_patterns_without_changing_the_base_pipeline():
+    base = spacy.blank("en")
+    assert build_overlay(base, []) is base
+    overlay = build_overlay(base, PATTERNS)
+    assert overlay.vocab is base.vocab
+    assert [(ent.text, ent.label_) for ent in overlay("Frodo Baggins left the Shire.").ents] == [("Frodo Baggins", "CHARACTER")]
+    assert base.pipe_names == []
+    assert base("Frodo Baggins left the Shire.").ents == ()
+
+
+# --- Batch extraction ---
+
+@pytest.mark.parametrize("max_chars", [20, 64, 100, 1000])
+def test_chunks_rebuild_the_text_at_their_offsets(max_chars):
+    chunks = list(iter_chunks(io.StringIO(SAMPLE_TEXT, newline=''), max_chars))
+    assert "".join(text for _, text in chunks) == SAMPLE_TEXT
+    for offset, text in chunks:
+        assert 0 < len(text) <= max_chars
+        assert SAMPLE_TEXT[offset:offset + len(text)] == text
+    assert [offset for offset, _ in chunks] == [sum(len(text) for _, text in chunks[:i]) for i in range(len(chunks))]
+
+
+def test_chunks_keep_paragraphs_and_sentences_whole_when_they_fit():
+    text = "One. Two.\n\nThree is here.\n\nFour. Five. Six. Seven."
+    assert [chunk for _, chunk in iter_chunks(io.StringIO(text), 16)] == ["One. Two.\n\n", "Three is here.\n\n", "Four. Five. ", "Six. Seven."]
+    assert [chunk for _, chunk in iter_chunks(io.StringIO(text), 1000)] == [text]
+
+
+def test_documents_are_read_from_text_files_and_zip_archives():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr("notes/a.txt", "Zipped text")
+        zf.writestr("notes/image.png", b"not text")
+    uploads = [Upload("plain.txt", "Caf\u00e9\r\nline".encode('utf-8')), Upload("bundle.zip", archive.getvalue())]
+    assert [(name, stream.read()) for name, stream in iter_documents(uploads)] == [
+        ("plain.txt", "Caf\u00e9\r\nline"), ("bundle.zip/notes/a.txt", "Zipped text")
+    ]
+    assert not uploads[0].closed # Left open for the next rerun
+
+
+def test_entity_offsets_point_into_the_original_document():
+    nlp = build_overlay(spacy.blank("en"), PATTERNS)
+    texts = {"a.txt": "Frodo Baggins left.\r\n\r\nHe met Frodo Baggins again. " * 5, "b.txt": SAMPLE_TEXT}
+    documents = [(name, io.StringIO(text, newline='')) for name, text in texts.items()]
+    results = list(annotate_documents(nlp, documents, batch_size=4, max_chars=64))
+    assert sum(chars for chars, _ in results) == sum(len(text) for text in texts.values())
+    records = [record for _, chunk_records in results for record in chunk_records]
+    assert sum(record['doc'] == "a.txt" for record in records) == 10 # Chunks end at paragraphs, so no name is cut
+    for record in records:
+        assert texts[record['doc']][record['start']:record['end']] == record['text'] == "Frodo Baggins"
+
+
+def test_entity_tables_are_split_into_parts(tmp_path):
+    records = [{'doc': "a.txt", 'start': i, 'end': i + 5, 'label': "CHARACTER", 'text': "Frodo"} for i in range(50)]
+    with EntityTableWriter(str(tmp_path), part_bytes=500) as writer:
+        for i in range(0, 50, 10):
+            writer.write(records[i:i + 10])
+    assert len(writer.csv_paths) == len(writer.jsonl_paths) > 1
+    assert all(os.path.getsize(path) < 500 + 500 for path in writer.csv_paths + writer.jsonl_paths) # At most one batch past the cap
+    csv_rows, jsonl_rows = [], []
+    for csv_path, jsonl_path in zip(writer.csv_paths, writer.jsonl_paths):
+        with open(csv_path, newline='', encoding='utf-8') as fh:
+            csv_rows.extend(csv.DictReader(fh)) # Every part has its own header
+        with open(jsonl_path, encoding='utf-8') as fh:
+            jsonl_rows.extend(json.loads(line) for line in fh)
+    assert [int(row['start']) for row in csv_rows] == [row['start'] for row in jsonl_rows] == list(range(50))
+    assert writer.rows == 50
+    assert writer.label_counts == {"CHARACTER": 50}
+    assert writer.documents == {"a.txt"}
+
+
+def test_new_batch_directory_prunes_only_stale_results(tmp_path):
+    stale = tmp_path / "ner_batch_stale"
+    stale.mkdir()
+    old = time.time() - 7200
+    os.utime(stale, (old, old))
+    recent = tmp_path / "ner_batch_recent"
+    recent.mkdir()
+    directory = new_batch_directory(str(tmp_path), max_age=3600)
+    assert os.path.isdir(directory)
+    assert not stale.exists()
+    assert recent.exists()
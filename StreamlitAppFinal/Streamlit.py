@@ -1,9 +1,23 @@
+import functools
+import os
+import sqlite3
+
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import matplotlib.ticker as mticker
+
+from blindbox_engine import (
+    APP_INTERNAL_COLUMNS, DATA_URL, LOCAL_DATA_PATH, USER_COLLECTION_COLUMNS, CatalogIndex, CatalogManifestCache, CollectionStore, MasterCatalogCache,
+    SQLiteCollectionStore, apply_figure_ownership, catalog_price, completion_cdf, completion_horizon, expected_boxes_to_complete,
+    filter_and_sort_figures, optimize_purchase_plan, prepare_collection_upload
+)
+from chart_cache import (
+    ChartRenderCache, render_completion_chart, render_price_histogram, render_probability_curve,
+    render_share_bars, render_step_curve
+)
+from box_simulator import STOP_ALL_TARGETS, STOP_ANY_TARGET, STOP_BUDGET, simulate_box_openings, summarize_simulation
+from thumbnail_cache import ThumbnailCache, fetch_image_bytes, looks_like_image
+from perf_spans import PROFILE_ENABLED, PROFILE_TRACEMALLOC, SPAN_REGISTRY, profile_rerun, span
 
 # --- Page Configuration ---
 st.set_page_config( # Set up the page configuration 
@@ -12,46 +26,52 @@ st.set_page_config( # Set up the page configuration
     page_icon="🎁"
 )
 
+# Sessions share one parsed catalog; copy-on-write keeps any per-session edits off the shared frame
+pd.set_option("mode.copy_on_write", True)
+
 # --- Constants ---
 
-# URL for the master CSV data file on GitHub
-DATA_URL = "https://raw.githubusercontent.com/kmgilland/GILLAND-Python-Portfolio/refs/heads/main/StreamlitAppFinal/box_data.csv"
-
-EXPECTED_CSV_COLUMNS_FOR_APP_LOGIC = [
-    'character_name',  # e.g., Peach Riot, Skullpanda
-    'series_name',     # e.g., Rise Up, The Mare
-    'figure_name',     # e.g., Poppy: Acorn, Birdy
-    'price',
-    'probability',
-    'figure_photo',    # Optional
-    'quantity'         # Optional, for pre-populating owned quantities
-]
-
-# APP_INTERNAL_COLUMNS defines the structure of the DataFrame stored in session state.
-APP_INTERNAL_COLUMNS = [
-    'character_series_name', # Data from CSV 'character_name'
-    'series',                # Data from CSV 'series_name'
-    'figure_name',           # Data from CSV 'figure_name'
-    'price',                 # Data from CSV 'price'
-    'probability',           # Data from CSV 'probability'
-    'figure_photo'           # Data from CSV 'figure_photo'
-]
-
-# Expected columns for user's personal collection data (when uploading or manually adding)
-USER_COLLECTION_COLUMNS = ['figure_name', 'series_name', 'sub_series_name', 'price_paid', 'owned_date', 'source', 'quantity']
+# Sorting and paging choices for the "Manage My Collection" tab
+MANAGE_SORT_OPTIONS = {
+    "Figure Name": 'figure_name',
+    "Character Series": 'character_series_name',
+    "Sub-Series": 'series',
+    "Box Price": 'price'
+}
+MANAGE_PAGE_SIZES = [10, 25, 50, 100]
+
+# Display widths (px) of figure photos; photos are served as thumbnails downscaled for these widths
+MANAGE_THUMBNAIL_WIDTH = 75
+TARGET_THUMBNAIL_WIDTH = 100
+
+# Stopping rules and run sizes offered by the Probability Workbench simulator
+SIMULATION_STOP_RULES = {
+    "All my targets are pulled": STOP_ALL_TARGETS,
+    "Any one target is pulled": STOP_ANY_TARGET,
+    "My budget runs out": STOP_BUDGET
+}
+SIMULATION_TRIAL_OPTIONS = [10_000, 100_000, 1_000_000]
+
+# Optional catalog CSV path or URL used instead of the published catalog (e.g. a local or synthetic one)
+CATALOG_SOURCE_OVERRIDE = os.environ.get("BLINDBOX_CATALOG")
+
+# Optional manifest listing many per-series catalog CSVs (paths or URLs, one per line), merged into one catalog
+CATALOG_MANIFEST_PATH = os.environ.get("BLINDBOX_CATALOG_MANIFEST")
+
+# Optional SQLite persistence for personal collections; unset keeps collections in session memory only
+COLLECTION_DB_PATH = os.environ.get("BLINDBOX_COLLECTION_DB")
 
 # --- Helper Functions ---
 def initialize_session_state():
     """Initializes session state variables if they don't exist."""
     if 'all_loaded_series_data_df' not in st.session_state: # Check if the DataFrame is already loaded
         st.session_state.all_loaded_series_data_df = pd.DataFrame(columns=APP_INTERNAL_COLUMNS)
+    if 'catalog_index' not in st.session_state: # Character series -> sub-series -> rows of the loaded catalog
+        st.session_state.catalog_index = CatalogIndex(st.session_state.all_loaded_series_data_df)
     if 'figures_for_management_df' not in st.session_state: # DataFrame for figures to manage
         st.session_state.figures_for_management_df = pd.DataFrame(columns=APP_INTERNAL_COLUMNS)
-    if 'user_collection_df' not in st.session_state: # DataFrame for user's collection
-        # Ensure 'quantity' column is present and numeric from the start
-        df = pd.DataFrame(columns=USER_COLLECTION_COLUMNS)
-        df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce')
-        st.session_state.user_collection_df = df
+    if 'collection_store' not in st.session_state: # User's collection, keyed by figure name
+        st.session_state.collection_store = CollectionStore()
     if 'target_figures' not in st.session_state: # List of target figures
         st.session_state.target_figures = []
     if 'selected_character_series_names' not in st.session_state: # List of selected character series names
@@ -60,24 +80,53 @@ def initialize_session_state():
         st.session_state.selected_sub_series_map = {}
     if 'active_tab' not in st.session_state: # Active tab for navigation
         st.session_state.active_tab = "Manage My Collection"
-    if 'data_load_attempted' not in st.session_state: # Flag to check if data load was attempted
-        st.session_state.data_load_attempted = False
-
-def convert_fraction_to_float(fraction_str):
-    """Converts a fraction string (e.g., '1/12') to a float."""
-    if isinstance(fraction_str, str) and '/' in fraction_str: # Check if it's a fraction
-        try:
-            num, den = fraction_str.split('/') # Split into numerator and denominator
-            return float(num) / float(den) # Convert to float
-        except ValueError: # Handle invalid fractions
-            return np.nan
-    elif pd.isna(fraction_str): # Handle NaN values
-        return np.nan
-    else: # Handle non-fraction strings
-        try:
-            return float(fraction_str) # Convert to float if it's not a fraction
-        except ValueError: # Handle invalid float conversion
-            return np.nan
+    if 'catalog_version' not in st.session_state: # Content hash of the master catalog this session is showing
+        st.session_state.catalog_version = None
+
+@st.cache_resource(show_spinner=False)
+def get_master_catalog_cache():
+    """One catalog cache per server process, reused across sessions and reruns."""
+    if CATALOG_MANIFEST_PATH:
+        return CatalogManifestCache(CATALOG_MANIFEST_PATH)
+    return MasterCatalogCache([CATALOG_SOURCE_OVERRIDE] if CATALOG_SOURCE_OVERRIDE else [DATA_URL, LOCAL_DATA_PATH])
+
+@st.cache_resource(show_spinner=False)
+def get_chart_render_cache():
+    """One rendered-chart cache per server process; identical charts are shared across sessions."""
+    return ChartRenderCache()
+
+@st.cache_resource(show_spinner=False)
+def get_thumbnail_cache():
+    """One thumbnail cache per server process; relative photo paths resolve next to this script."""
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    return ThumbnailCache(fetcher=functools.partial(fetch_image_bytes, base_dir=app_dir))
+
+def display_chart(renderer, *arrays, **style):
+    """Shows a chart from the shared render cache, timed as a 'chart.<name>' span."""
+    with span(f"chart.{renderer.__name__.removeprefix('render_')}", rows=len(arrays[0])):
+        st.image(get_chart_render_cache().render(renderer, *arrays, **style))
+
+def display_profile_panel(rerun_profile):
+    """Sidebar debug panel with this rerun's timing spans and JSON Lines / Prometheus exports."""
+    with st.sidebar.expander("⏱️ Performance (Last Rerun)"):
+        spans_df = pd.DataFrame(rerun_profile.records())
+        spans_df['span'] = ["\u00a0\u00a0\u00a0" * depth + path.rsplit('/', 1)[-1] for path, depth in zip(spans_df['span'], spans_df['depth'])] # Indent nested spans
+        spans_df['rows'] = spans_df['rows'].astype('Int64') # Sections without a row count stay blank
+        shown_columns = ['span', 'wall_ms', 'rows', 'alloc_blocks'] + (['alloc_bytes'] if PROFILE_TRACEMALLOC else [])
+        st.dataframe(
+            spans_df[shown_columns],
+            column_config={
+                'span': "Section",
+                'wall_ms': st.column_config.NumberColumn("Time (ms)", format="%.1f"),
+                'rows': "Rows",
+                'alloc_blocks': "Net Blocks",
+                'alloc_bytes': "Net Bytes"
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+        st.download_button("Download Spans (JSON Lines)", rerun_profile.to_jsonl(), file_name=f"spans_{rerun_profile.run_id}.jsonl", mime="application/jsonl")
+        st.download_button("Download Metrics (Prometheus)", SPAN_REGISTRY.prometheus_text(), file_name="blindbox_metrics.prom", mime="text/plain")
 
 # --- UI Helper for Dynamic Sub-Series Selection ---
 def display_sub_series_selectors():
@@ -87,9 +136,7 @@ def display_sub_series_selectors():
         return
 
     for char_series_name_internal in st.session_state.selected_character_series_names: # Iterate over selected character series
-        sub_series_in_char_series = sorted(st.session_state.all_loaded_series_data_df[
-            st.session_state.all_loaded_series_data_df['character_series_name'] == char_series_name_internal
-        ]['series'].unique()) # Get unique sub-series for the character series
+        sub_series_in_char_series = st.session_state.catalog_index.sub_series_options(char_series_name_internal) # Sorted sub-series from the catalog index
 
         if sub_series_in_char_series: # Check if there are sub-series available
             with st.sidebar.expander(f"Sub-Series for {char_series_name_internal}", expanded=True): # Create an expander for each character series
@@ -113,100 +160,66 @@ def main():
     st.markdown("Manage your blind box collection, track your targets, and analyze your chances!")
 
     # --- Auto Load Master Collection Data ---
-    if not st.session_state.data_load_attempted or \
-       ('all_loaded_series_data_df' in st.session_state and st.session_state.all_loaded_series_data_df.empty and not st.session_state.data_load_attempted): # Check if data load was attempted
-        st.session_state.data_load_attempted = True # Set the flag to indicate data load was attempted
-        try: # Attempt to load the CSV file
-            df = pd.read_csv(DATA_URL, dtype=str) # Load the CSV file into a DataFrame
-
-            csv_cols_needed_for_core_functionality = ['character_name', 'series_name', 'figure_name', 'price', 'probability']
-            missing_cols = [col for col in csv_cols_needed_for_core_functionality if col not in df.columns] # Check for missing columns
-
-            if missing_cols:
-                st.error(f"Critical Error: The CSV data from the URL is missing the following essential columns: {', '.join(missing_cols)}. "
-                         "The application cannot proceed without them. Please check the CSV file at the source.") # Error message for missing columns
-                st.session_state.all_loaded_series_data_df = pd.DataFrame(columns=APP_INTERNAL_COLUMNS) # Initialize empty DataFrame
-            else: # Process the DataFrame
-                df.rename(columns={
-                    'character_name': 'character_series_name',
-                    'series_name': 'series'
-                }, inplace=True)
-
-                if 'price' in df.columns: # Convert price to numeric
-                    df['price'] = df['price'].astype(str).str.replace('$', '', regex=False)
-                    df['price'] = pd.to_numeric(df['price'], errors='coerce')
-
-                if 'probability' in df.columns: # Convert probability to numeric
-                    df['probability'] = df['probability'].apply(convert_fraction_to_float)
-                    df['probability'] = pd.to_numeric(df['probability'], errors='coerce')
-
-                if 'figure_photo' not in df.columns: # Check if figure_photo column exists
-                    df['figure_photo'] = pd.NA # Initialize with NA if not present
-                else:
-                    df['figure_photo'] = df['figure_photo'].astype(str).replace('', pd.NA) # Convert empty strings to NA
-                
-                # Quantity from master CSV is not currently used by APP_INTERNAL_COLUMNS,
-                # but might be used if pre-populating user_collection_df.
-
-                essential_cols_for_dropna = ['character_series_name', 'series', 'figure_name', 'price', 'probability']
-                for col_name in ['character_series_name', 'series', 'figure_name']:
-                    if col_name in df.columns: # Check if column exists
-                        df[col_name] = df[col_name].astype(str) # Convert to string to avoid NaN issues
-
-                df.dropna(subset=essential_cols_for_dropna, inplace=True) # Drop rows with NaN in essential columns
-                
-                for col_internal in APP_INTERNAL_COLUMNS: # Check if internal columns exist in the DataFrame
-                    if col_internal not in df.columns:
-                        df[col_internal] = pd.NA # Should mainly apply to figure_photo
-
-                st.session_state.all_loaded_series_data_df = df[APP_INTERNAL_COLUMNS].drop_duplicates().reset_index(drop=True) # Remove duplicates and reset index
-
-                if st.session_state.all_loaded_series_data_df.empty: # Check if DataFrame is empty after processing
-                    st.warning("Warning: No valid data rows found in 'box_data.csv' after processing. ")
-                else:
-                    st.success(f"Successfully auto-loaded and processed data from 'box_data.csv'. "
-                               f"{len(st.session_state.all_loaded_series_data_df)} unique figures loaded.")
-                    st.session_state.selected_character_series_names = []
-                    st.session_state.selected_sub_series_map = {}
-                    st.session_state.figures_for_management_df = pd.DataFrame(columns=APP_INTERNAL_COLUMNS)
-
+    # The catalog is parsed once per process and shared; each session just picks up the current version.
+    with span("catalog_load") as catalog_span:
+        catalog_index = None
+        try:
+            catalog_df, catalog_index, catalog_version = get_master_catalog_cache().get()
         except FileNotFoundError:
             st.error(f"Critical Error: The data file 'box_data.csv' was not found. ")
-            st.session_state.all_loaded_series_data_df = pd.DataFrame(columns=APP_INTERNAL_COLUMNS)
+            catalog_df, catalog_version = pd.DataFrame(columns=APP_INTERNAL_COLUMNS), None
         except pd.errors.EmptyDataError:
             st.error("Critical Error: The CSV file 'box_data.csv' is empty.")
-            st.session_state.all_loaded_series_data_df = pd.DataFrame(columns=APP_INTERNAL_COLUMNS)
+            catalog_df, catalog_version = pd.DataFrame(columns=APP_INTERNAL_COLUMNS), None
+        except ValueError as e: # Missing essential columns
+            st.error(f"Critical Error: {e} "
+                     "The application cannot proceed without them. Please check the CSV file at the source.")
+            catalog_df, catalog_version = pd.DataFrame(columns=APP_INTERNAL_COLUMNS), None
         except Exception as e:
             st.error(f"An unexpected error occurred while auto-loading or processing 'box_data.csv': {e}. ")
-            st.session_state.all_loaded_series_data_df = pd.DataFrame(columns=APP_INTERNAL_COLUMNS)
+            catalog_df, catalog_version = pd.DataFrame(columns=APP_INTERNAL_COLUMNS), None
+        catalog_span.count(len(catalog_df))
+    if CATALOG_MANIFEST_PATH: # Sources that failed are skipped (or keep their last good data) until they load again
+        for failed_source, error in get_master_catalog_cache().errors.items():
+            st.warning(f"Catalog source '{failed_source}' could not be loaded: {error}")
+
+    if catalog_version != st.session_state.catalog_version: # First load in this session, or the source changed
+        st.session_state.catalog_version = catalog_version
+        st.session_state.all_loaded_series_data_df = catalog_df
+        st.session_state.catalog_index = catalog_index if catalog_index is not None else CatalogIndex(catalog_df) # Empty index when loading failed
+        if catalog_version is not None:
+            if catalog_df.empty: # Check if DataFrame is empty after processing
+                st.warning("Warning: No valid data rows found in 'box_data.csv' after processing. ")
+            else:
+                st.success(f"Successfully auto-loaded and processed data from 'box_data.csv'. "
+                           f"{len(catalog_df)} unique figures loaded.")
+                st.session_state.selected_character_series_names = []
+                st.session_state.selected_sub_series_map = {}
+                st.session_state.figures_for_management_df = pd.DataFrame(columns=APP_INTERNAL_COLUMNS)
 
-    with st.sidebar: # Sidebar for filtering and managing figures
+    with st.sidebar, span("sidebar"): # Sidebar for filtering and managing figures
         st.header("⚙️ Collection Setup")
         st.subheader("Filter Figures for Management")
         if not st.session_state.all_loaded_series_data_df.empty: # Check if DataFrame is not empty
-            available_char_series_for_selection = sorted(st.session_state.all_loaded_series_data_df['character_series_name'].unique())
+            available_char_series_for_selection = st.session_state.catalog_index.character_series # Pre-sorted at catalog load
             st.session_state.selected_character_series_names = st.multiselect(
                 "Select Character Series to Manage:",
                 options=available_char_series_for_selection,
                 default=st.session_state.selected_character_series_names,
                 key="character_series_selector_main"
             )
-            display_sub_series_selectors() #
+            with span("sub_series_selectors", rows=len(st.session_state.selected_character_series_names)):
+                display_sub_series_selectors()
             if st.button("Show Figures from Selected Sub-Series", key="filter_figures_button"): # Button to filter figures
                 if not st.session_state.selected_character_series_names: # Check if any character series is selected
                     st.warning("Please select at least one character series.")
                 else:
-                    filtered_dfs = []
-                    for char_series_name_internal, sub_series_list in st.session_state.selected_sub_series_map.items(): # Iterate over selected character series and their sub-series
-                        if char_series_name_internal in st.session_state.selected_character_series_names and sub_series_list: # Check if character series is selected and sub-series list is not empty
-                            series_data = st.session_state.all_loaded_series_data_df[
-                                (st.session_state.all_loaded_series_data_df['character_series_name'] == char_series_name_internal) &
-                                (st.session_state.all_loaded_series_data_df['series'].isin(sub_series_list))
-                            ]
-                            if not series_data.empty:
-                                filtered_dfs.append(series_data)
-                    if filtered_dfs: # Check if any filtered DataFrames are available
-                        st.session_state.figures_for_management_df = pd.concat(filtered_dfs, ignore_index=True).drop_duplicates()
+                    # Rows of every selected sub-series of the selected character series, looked up in the catalog index
+                    selected_rows = st.session_state.catalog_index.selection_rows(
+                        st.session_state.selected_sub_series_map, set(st.session_state.selected_character_series_names)
+                    )
+                    if len(selected_rows): # Check if any figures were found
+                        st.session_state.figures_for_management_df = st.session_state.all_loaded_series_data_df.take(selected_rows).reset_index(drop=True)
                         st.success(f"Displaying {len(st.session_state.figures_for_management_df)} figures. Go to 'Manage My Collection' tab.")
                         st.session_state.active_tab = "Manage My Collection"
                     else:
@@ -229,6 +242,22 @@ def main():
         else:
             st.info("Filter and show figures first to enable target selection.")
 
+        if COLLECTION_DB_PATH: # Optional persistent storage
+            st.subheader("💾 Saved Collection")
+            collection_name = st.text_input("Collection Name", key="collection_db_name",
+                                            help="Your collection is saved under this name and reloaded next time you use it.").strip()
+            current_store = st.session_state.collection_store
+            if collection_name and (not isinstance(current_store, SQLiteCollectionStore) or current_store.collection_id != collection_name):
+                try:
+                    st.session_state.collection_store = SQLiteCollectionStore(COLLECTION_DB_PATH, collection_name)
+                    st.success(f"Opened saved collection '{collection_name}' ({len(st.session_state.collection_store)} figures).")
+                except sqlite3.Error as e:
+                    st.error(f"Could not open the collection database: {e}")
+            elif collection_name:
+                current_store.refresh() # Pick up changes saved from other sessions
+            else:
+                st.caption("Enter a name to save your collection between visits.")
+
         st.subheader("Add/Edit Other Owned Figures") # Sidebar for adding/editing owned figures
         collection_input_method = st.radio(
             "Input method for other figures or to edit details:",
@@ -248,9 +277,8 @@ def main():
                 submitted_manual = st.form_submit_button("Add/Update Figure")
 
                 if submitted_manual and figure_name_manual and char_series_name_manual_input and sub_series_name_manual_input and price_paid_manual is not None and quantity_manual > 0:
-                    existing_entry_index = st.session_state.user_collection_df[
-                        st.session_state.user_collection_df['figure_name'] == figure_name_manual
-                    ].index
+                    store = st.session_state.collection_store
+                    is_existing_entry = figure_name_manual in store
 
                     entry_data = {
                         'figure_name': figure_name_manual, 
@@ -261,17 +289,10 @@ def main():
                         'source': source_manual,
                         'quantity': quantity_manual # Add quantity
                     }
-                    if not existing_entry_index.empty: # Check if entry already exists
-                        idx_to_update = existing_entry_index[0]
-                        for col, val in entry_data.items():
-                            st.session_state.user_collection_df.loc[idx_to_update, col] = val
+                    store.upsert(figure_name_manual, entry_data)
+                    if is_existing_entry: # Check if entry already existed
                         st.success(f"Updated '{figure_name_manual}'.")
                     else: 
-                        new_entry_df = pd.DataFrame([entry_data], columns=USER_COLLECTION_COLUMNS)
-                        st.session_state.user_collection_df = pd.concat(
-                            [st.session_state.user_collection_df, new_entry_df], ignore_index=True
-                        ) # Concatenate new entry
-                        st.session_state.user_collection_df = st.session_state.user_collection_df.drop_duplicates(subset=['figure_name'], keep='last').reset_index(drop=True)
                         st.success(f"Added '{figure_name_manual}'.")
                 elif submitted_manual:
                     st.warning("Please fill in all required fields and ensure quantity is at least 1.")
@@ -284,47 +305,12 @@ def main():
             )
             if uploaded_collection_file: # Check if a file is uploaded
                 try:
-                    df_user_upload = pd.read_csv(uploaded_collection_file)
-                    required_upload_cols = ['figure_name', 'series_name', 'sub_series_name', 'price_paid'] # quantity is optional
-                    missing_upload_cols = [col for col in required_upload_cols if col not in df_user_upload.columns]
-
-                    if not missing_upload_cols: # Check if required columns are present
-                        for col_uc in USER_COLLECTION_COLUMNS: 
-                            if col_uc not in df_user_upload.columns:
-                                if col_uc == 'quantity':
-                                    df_user_upload[col_uc] = 1 # Default quantity to 1 if not in CSV
-                                else:
-                                    df_user_upload[col_uc] = pd.NA 
-                        
-                        df_user_upload['price_paid'] = pd.to_numeric(df_user_upload['price_paid'], errors='coerce')
-                        df_user_upload['owned_date'] = pd.to_datetime(df_user_upload['owned_date'], errors='coerce')
-                        df_user_upload['quantity'] = pd.to_numeric(df_user_upload['quantity'], errors='coerce').fillna(1).astype(int)
-                        df_user_upload['source'] = df_user_upload['source'].fillna("CSV Upload")
-                        
-                        # Consolidate with existing collection, updating quantities for matching figure_names
-                        for index, row_upload in df_user_upload.iterrows():
-                            existing_entry = st.session_state.user_collection_df[
-                                st.session_state.user_collection_df['figure_name'] == row_upload['figure_name']
-                            ]
-                            if not existing_entry.empty:
-                                existing_idx = existing_entry.index[0]
-                                # Update existing entry, especially quantity and price if source is also CSV
-                                st.session_state.user_collection_df.loc[existing_idx, 'quantity'] = row_upload['quantity']
-                                st.session_state.user_collection_df.loc[existing_idx, 'price_paid'] = row_upload['price_paid']
-                                st.session_state.user_collection_df.loc[existing_idx, 'series_name'] = row_upload['series_name']
-                                st.session_state.user_collection_df.loc[existing_idx, 'sub_series_name'] = row_upload['sub_series_name']
-                                st.session_state.user_collection_df.loc[existing_idx, 'owned_date'] = row_upload['owned_date']
-                                st.session_state.user_collection_df.loc[existing_idx, 'source'] = row_upload['source']
-
-                            else:
-                                st.session_state.user_collection_df = pd.concat(
-                                    [st.session_state.user_collection_df, pd.DataFrame([row_upload], columns=USER_COLLECTION_COLUMNS)],
-                                    ignore_index=True
-                                )
-                        st.session_state.user_collection_df = st.session_state.user_collection_df.drop_duplicates(subset=['figure_name'], keep='last').reset_index(drop=True)
-                        st.success("Collection CSV processed and merged/updated.")
-                    else: 
-                        st.error(f"Uploaded CSV is missing required columns: {', '.join(missing_upload_cols)}. ")
+                    df_user_upload = prepare_collection_upload(pd.read_csv(uploaded_collection_file)) # Raises ValueError on missing columns
+                    # Consolidate with existing collection, updating quantities for matching figure_names
+                    merge_counts = st.session_state.collection_store.bulk_upsert(df_user_upload)
+                    st.success(f"Collection CSV processed and merged/updated: {merge_counts['inserted']} added, "
+                               f"{merge_counts['updated']} updated, {merge_counts['unchanged']} unchanged.")
+                except ValueError as e: st.error(f"{e} ")
                 except Exception as e: st.error(f"Error processing collection CSV: {e}")
 
     tab_list = ["Manage My Collection", "🎯 Target Overview", "📊 My Collection Stats", "🎲 Probability Workbench", "📚 Browse Loaded Series"]
@@ -334,110 +320,146 @@ def main():
 
     manage_tab, target_tab, stats_tab, prob_tab, browse_tab = st.tabs(tab_list)
 
-    with manage_tab: # Main tab for managing collection
+    with manage_tab, span("manage_tab"): # Main tab for managing collection
         st.header("Manage My Collection (Figures from Selected Sub-Series)")
         if st.session_state.all_loaded_series_data_df.empty:
             st.info("Master data ('box_data.csv') could not be loaded or is empty.")
         elif st.session_state.figures_for_management_df.empty:
             st.info("No figures loaded for management. Use 'Filter Figures' in the sidebar.")
         else:
-            st.markdown(f"Mark figures you own from the **{len(st.session_state.figures_for_management_df)}** figures shown.")
-            
-
-            for index, fig_to_manage_row in st.session_state.figures_for_management_df.iterrows(): # Iterate over each figure
-                fig_name = fig_to_manage_row['figure_name']
-                fig_char_series = fig_to_manage_row['character_series_name']
-                fig_sub_series = fig_to_manage_row['series']
-                fig_box_price = fig_to_manage_row['price']
-                fig_photo_url = fig_to_manage_row['figure_photo']
+            store = st.session_state.collection_store
+            view_cols = st.columns([2, 1, 1, 1])
+            with view_cols[0]:
+                manage_search_text = st.text_input("Search figures", key="manage_search", placeholder="Figure, character or sub-series name")
+            with view_cols[1]:
+                manage_sort_label = st.selectbox("Sort by", list(MANAGE_SORT_OPTIONS), key="manage_sort")
+            with view_cols[2]:
+                manage_sort_descending = st.toggle("Descending", key="manage_sort_desc")
+            with view_cols[3]:
+                manage_view_mode = st.radio("View", ["Cards", "Bulk Edit Table"], key="manage_view_mode", horizontal=True)
+
+            figures_in_view_df = filter_and_sort_figures(
+                st.session_state.figures_for_management_df, manage_search_text,
+                MANAGE_SORT_OPTIONS[manage_sort_label], manage_sort_descending
+            )
+            st.markdown(f"Mark figures you own from the **{len(figures_in_view_df)}** figures shown.")
+
+            if figures_in_view_df.empty:
+                st.info("No figures match your search.")
+            elif manage_view_mode == "Bulk Edit Table":
+                # One editor for every matching figure; the grid only renders (and fetches images for) visible rows
+                editor_df = pd.DataFrame({
+                    'own': [store.quantity(name) > 0 for name in figures_in_view_df['figure_name']],
+                    'quantity': [max(store.quantity(name), 1) for name in figures_in_view_df['figure_name']],
+                    'figure_name': figures_in_view_df['figure_name'].to_numpy(),
+                    'character_series_name': figures_in_view_df['character_series_name'].to_numpy(),
+                    'series': figures_in_view_df['series'].to_numpy(),
+                    'price': figures_in_view_df['price'].to_numpy(),
+                    'figure_photo': figures_in_view_df['figure_photo'].to_numpy(),
+                })
+                with st.form("manage_bulk_edit_form"):
+                    edited_df = st.data_editor(
+                        editor_df,
+                        column_config={
+                            'own': st.column_config.CheckboxColumn("Own"),
+                            'quantity': st.column_config.NumberColumn("Quantity", min_value=1, step=1),
+                            'figure_name': "Figure",
+                            'character_series_name': "Character",
+                            'series': "Sub-Series",
+                            'price': st.column_config.NumberColumn("Box Price", format="$%.2f"),
+                            'figure_photo': st.column_config.ImageColumn("Photo"),
+                        },
+                        disabled=['figure_name', 'character_series_name', 'series', 'price', 'figure_photo'],
+                        hide_index=True,
+                        use_container_width=True,
+                        key="manage_bulk_editor"
+                    )
+                    bulk_submitted = st.form_submit_button("Save Changes")
+                if bulk_submitted:
+                    changed_mask = (edited_df['own'] != editor_df['own']) | (edited_df['own'] & (edited_df['quantity'] != editor_df['quantity']))
+                    with store.batch(), span("manage_bulk_save", rows=int(changed_mask.sum())): # Commit every edited row together
+                        for position in np.flatnonzero(changed_mask.to_numpy()):
+                            apply_figure_ownership(
+                                store, figures_in_view_df.iloc[position],
+                                bool(edited_df['own'].iat[position]), int(edited_df['quantity'].iat[position])
+                            )
+                    st.success(f"Saved changes to {int(changed_mask.sum())} figure(s).")
+            else:
+                page_cols = st.columns([1, 1, 2])
+                with page_cols[0]:
+                    manage_page_size = st.selectbox("Figures per page", MANAGE_PAGE_SIZES, key="manage_page_size")
+                total_pages = max(1, -(-len(figures_in_view_df) // manage_page_size)) # Ceiling division
+                if st.session_state.get("manage_page", 1) > total_pages: # Search or page size shrank the list
+                    st.session_state.manage_page = total_pages
+                with page_cols[1]:
+                    manage_page = st.number_input("Page", min_value=1, max_value=total_pages, step=1, key="manage_page")
+                with page_cols[2]:
+                    st.caption(f"Page {manage_page} of {total_pages}")
+                page_start = (manage_page - 1) * manage_page_size
+                page_df = figures_in_view_df.iloc[page_start:page_start + manage_page_size]
+
+                with span("manage_thumbnails", rows=len(page_df)):
+                    page_thumbnails = get_thumbnail_cache().thumbnails(page_df['figure_photo'].dropna(), MANAGE_THUMBNAIL_WIDTH) # Fetch the page's photos in parallel
+                with store.batch(), span("manage_cards", rows=len(page_df)): # Commit every figure's ownership change together
+                    for index, fig_to_manage_row in page_df.iterrows(): # Only the current page gets widgets and images
+                        fig_name = fig_to_manage_row['figure_name']
+                        fig_char_series = fig_to_manage_row['character_series_name']
+                        fig_sub_series = fig_to_manage_row['series']
+                        fig_box_price = fig_to_manage_row['price']
+                        fig_photo_url = fig_to_manage_row['figure_photo']
+
+                        unique_key_base = f"{fig_char_series.replace(' ','_')}_{fig_sub_series.replace(' ','_')}_{fig_name.replace(' ','_')}" # Unique key for each figure
+
+                        current_qty_in_df = store.quantity(fig_name) # Check if figure is already owned
+                        is_owned_in_df = current_qty_in_df > 0
+
+                        cols = st.columns([0.5, 2, 1, 1]) # Create columns for layout
+                        with cols[0]: # Column for checkbox
+                            checkbox_state = st.checkbox("Own", value=is_owned_in_df, key=f"owned_cb_{unique_key_base}")
+
+                        with cols[1]: # Column for figure details
+                            st.subheader(f"{fig_name}")
+                            st.caption(f"Character: {fig_char_series} | Sub-Series: {fig_sub_series} | Box Price: ${fig_box_price:.2f}")
+
+                        quantity_input = 0
+                        with cols[2]: # Column for quantity input
+                            if checkbox_state:
+                                default_slider_qty = current_qty_in_df if current_qty_in_df > 0 else 1
+                                quantity_input = st.number_input(
+                                    "Quantity", 
+                                    min_value=1, 
+                                    value=default_slider_qty, 
+                                    step=1, 
+                                    key=f"qty_ni_{unique_key_base}",
+                                    label_visibility="collapsed" # More compact
+                                )
+                            else:
+                                # Placeholder to maintain layout if not checked
+                                st.empty() 
 
-                unique_key_base = f"{fig_char_series.replace(' ','_')}_{fig_sub_series.replace(' ','_')}_{fig_name.replace(' ','_')}" # Unique key for each figure
-                
-                owned_entry = st.session_state.user_collection_df[
-                    st.session_state.user_collection_df['figure_name'] == fig_name
-                ] # Check if figure is already owned
-                
-                is_owned_in_df = not owned_entry.empty and owned_entry['quantity'].iloc[0] > 0
-                current_qty_in_df = owned_entry['quantity'].iloc[0] if not owned_entry.empty else 0
+                        with cols[3]:
+                            if looks_like_image(fig_photo_url): # Basic check for image
+                                # If figure_photo_url are just filenames like "image.jpg", they must be in the same dir as Streamlit.py
+                                st.image(page_thumbnails.get(fig_photo_url) or fig_photo_url, width=MANAGE_THUMBNAIL_WIDTH, caption="Figure") # Fall back to the original if the thumbnail can't be made
+                            else:
+                                st.caption("No image")
+                        st.divider()
 
-                cols = st.columns([0.5, 2, 1, 1]) # Create columns for layout
-                with cols[0]: # Column for checkbox
-                    checkbox_state = st.checkbox("Own", value=is_owned_in_df, key=f"owned_cb_{unique_key_base}")
-                
-                with cols[1]: # Column for figure details
-                    st.subheader(f"{fig_name}")
-                    st.caption(f"Character: {fig_char_series} | Sub-Series: {fig_sub_series} | Box Price: ${fig_box_price:.2f}")
-
-                with cols[2]: # Column for quantity input
-                    if checkbox_state:
-                        default_slider_qty = current_qty_in_df if current_qty_in_df > 0 else 1
-                        quantity_input = st.number_input(
-                            "Quantity", 
-                            min_value=1, 
-                            value=default_slider_qty, 
-                            step=1, 
-                            key=f"qty_ni_{unique_key_base}",
-                            label_visibility="collapsed" # More compact
-                        )
-                    else:
-                        # Placeholder to maintain layout if not checked
-                        st.empty() 
-                
-                with cols[3]:
-                    if pd.notna(fig_photo_url) and isinstance(fig_photo_url, str) and (fig_photo_url.startswith('http') or '.jpg' in fig_photo_url or '.png' in fig_photo_url) : # Basic check for image
-                        # If figure_photo_url are just filenames like "image.jpg", they must be in the same dir as Streamlit.py
-                        st.image(fig_photo_url, width=75, caption="Figure")
-                    else:
-                        st.caption("No image")
-                st.divider()
-
-                # --- Logic to update user_collection_df based on interactions ---
-                existing_entry_idx = owned_entry.index[0] if not owned_entry.empty else None
-
-                if checkbox_state: # If checkbox is checked
-                    new_quantity = quantity_input # Get value from the number input
-                    if existing_entry_idx is not None: # Figure exists in user collection
-                        st.session_state.user_collection_df.loc[existing_entry_idx, 'quantity'] = new_quantity
-                        # If it was marked owned, update price to current box price, and series info
-                        if st.session_state.user_collection_df.loc[existing_entry_idx, 'source'] == 'Marked Owned' or pd.isna(st.session_state.user_collection_df.loc[existing_entry_idx, 'source']):
-                            st.session_state.user_collection_df.loc[existing_entry_idx, 'price_paid'] = fig_box_price
-                            st.session_state.user_collection_df.loc[existing_entry_idx, 'series_name'] = fig_char_series
-                            st.session_state.user_collection_df.loc[existing_entry_idx, 'sub_series_name'] = fig_sub_series
-                    else: # Figure does not exist, add new entry
-                        new_data = {
-                            'figure_name': fig_name,
-                            'series_name': fig_char_series,
-                            'sub_series_name': fig_sub_series,
-                            'price_paid': fig_box_price,
-                            'owned_date': pd.NaT,
-                            'source': 'Marked Owned',
-                            'quantity': new_quantity
-                        }
-                        new_df_row = pd.DataFrame([new_data], columns=USER_COLLECTION_COLUMNS)
-                        st.session_state.user_collection_df = pd.concat(
-                            [st.session_state.user_collection_df, new_df_row],
-                            ignore_index=True
-                        )
-                        # Ensure one entry per figure_name after adding, taking the latest (this one)
-                        st.session_state.user_collection_df = st.session_state.user_collection_df.drop_duplicates(subset=['figure_name'], keep='last').reset_index(drop=True)
+                        # --- Logic to update the collection based on interactions ---
+                        apply_figure_ownership(store, fig_to_manage_row, checkbox_state, quantity_input)
 
-                else: # If checkbox is NOT checked
-                    if existing_entry_idx is not None:
-                        # Set quantity to 0. The entry remains but won't be counted as "owned" in stats.
-                        st.session_state.user_collection_df.loc[existing_entry_idx, 'quantity'] = 0
-            
             if st.button("Refresh Collection View & Stats", key="refresh_collection_button_main"):
                 st.rerun()
             
             st.subheader("Current Personal Collection Summary (Owned: Qty > 0, Last 5)")
-            display_owned_collection = st.session_state.user_collection_df[st.session_state.user_collection_df['quantity'] > 0]
+            display_owned_collection = store.owned_dataframe()
             if not display_owned_collection.empty:
                 st.dataframe(display_owned_collection.tail(), use_container_width=True) 
                 st.caption(f"Total unique figure types with quantity > 0: {len(display_owned_collection)}")
             else:
                 st.caption("Your personal collection (with quantity > 0) is currently empty.")
 
-    with target_tab:
+    with target_tab, span("target_tab"):
         st.header("🎯 Target Figure Overview")
         if st.session_state.all_loaded_series_data_df.empty:
             st.info("Master data ('box_data.csv') could not be loaded or is empty.")
@@ -446,36 +468,34 @@ def main():
         else:
             targets_details_df = st.session_state.all_loaded_series_data_df[
                 st.session_state.all_loaded_series_data_df['figure_name'].isin(st.session_state.target_figures)
-            ].drop_duplicates(subset=['figure_name', 'character_series_name', 'series']).copy()
+            ] # The catalog holds one row per figure, so the selection needs no de-duplication or copy
 
             if targets_details_df.empty and st.session_state.target_figures:
                  st.warning("Selected target figures are not found in the loaded master data.")
             else:
                 st.markdown(f"You have selected **{len(st.session_state.target_figures)}** target figure(s).")
+                target_thumbnails = get_thumbnail_cache().thumbnails(targets_details_df['figure_photo'].dropna(), TARGET_THUMBNAIL_WIDTH)
                 for index, row in targets_details_df.iterrows():
                     st.subheader(row['figure_name'])
-                    owned_info = st.session_state.user_collection_df[
-                        (st.session_state.user_collection_df['figure_name'] == row['figure_name']) &
-                        (st.session_state.user_collection_df['quantity'] > 0)
-                    ]
+                    owned_info = st.session_state.collection_store.get(row['figure_name'])
                     status_text = "❌ Not Owned"
                     price_paid_text = ""
                     quantity_owned_text = ""
 
-                    if not owned_info.empty:
+                    if owned_info is not None and st.session_state.collection_store.quantity(row['figure_name']) > 0:
                         status_text = f"✅ Owned"
-                        qty = owned_info['quantity'].iloc[0]
+                        qty = owned_info['quantity']
                         if qty > 0 : quantity_owned_text = f" (Quantity: {qty})" # Display quantity
                         
-                        price_paid_val = owned_info['price_paid'].iloc[0]
+                        price_paid_val = owned_info['price_paid']
                         if pd.notna(price_paid_val):
                             price_paid_text = f"**You Paid (per unit):** ${float(price_paid_val):.2f}"
 
 
                     col1, col2 = st.columns([1, 3])
                     with col1:
-                        if pd.notna(row['figure_photo']) and isinstance(row['figure_photo'], str) and (row['figure_photo'].startswith('http') or '.jpg' in row['figure_photo'] or '.png' in row['figure_photo']):
-                            st.image(row['figure_photo'], width=100, caption="Target Figure")
+                        if looks_like_image(row['figure_photo']):
+                            st.image(target_thumbnails.get(row['figure_photo']) or row['figure_photo'], width=TARGET_THUMBNAIL_WIDTH, caption="Target Figure")
                         else: st.caption("No image URL")
                     with col2:
                         st.markdown(f"**Character:** {row['character_series_name']} | **Sub-Series:** {row['series']}")
@@ -485,10 +505,10 @@ def main():
                              st.markdown(price_paid_text)
                     st.divider()
 
-    with stats_tab:
+    with stats_tab, span("stats_tab"):
         st.header("📊 My Collection Statistics")
         # Filter for items with quantity > 0 for display and calculations
-        active_collection_df = st.session_state.user_collection_df[st.session_state.user_collection_df['quantity'] > 0].copy()
+        active_collection_df = st.session_state.collection_store.owned_dataframe()
 
         if active_collection_df.empty:
             st.info("No figures with quantity > 0 in your collection yet.")
@@ -496,11 +516,12 @@ def main():
             st.subheader("My Full Collection List (Owned Figures):")
             st.dataframe(active_collection_df[USER_COLLECTION_COLUMNS], use_container_width=True)
 
-            # Calculate total spent considering quantity
-            active_collection_df['total_value_for_figure'] = pd.to_numeric(active_collection_df['price_paid'], errors='coerce') * pd.to_numeric(active_collection_df['quantity'], errors='coerce')
-            total_spent = active_collection_df['total_value_for_figure'].sum()
+            # Totals consider quantity; maintained incrementally (or by SQL aggregates for a saved collection)
+            collection_totals = st.session_state.collection_store.collection_totals()
+            collection_stats = st.session_state.collection_store.stats # Kept current as the collection changes
+            total_spent = collection_totals['total_spent']
             
-            total_individual_figures = active_collection_df['quantity'].sum() # Sum of quantities
+            total_individual_figures = collection_totals['total_figures'] # Sum of quantities
             
             avg_cost_per_individual_figure = total_spent / total_individual_figures if total_individual_figures > 0 else 0
 
@@ -510,44 +531,53 @@ def main():
             col2.metric("Total Amount Spent", f"${total_spent:.2f}")
             col3.metric("Avg. Cost Per Individual Figure", f"${avg_cost_per_individual_figure:.2f}") # Changed metric
 
-            if total_individual_figures > 0 and 'price_paid' in active_collection_df.columns:
-                valid_prices_paid_per_unit = pd.to_numeric(active_collection_df['price_paid'], errors='coerce').dropna()
+            breakdown_columns = {
+                'series_name': "Character Series",
+                'sub_series_name': "Sub-Series",
+                'source': "Source",
+                'month': "Month Acquired",
+                'figure_types': "Figure Types",
+                'figures': "Figures Owned",
+                'spent': st.column_config.NumberColumn("Spent", format="$%.2f")
+            }
+            st.subheader("By Series:")
+            st.dataframe(st.session_state.collection_store.series_breakdown(), column_config=breakdown_columns, hide_index=True, use_container_width=True)
+            col_source, col_month = st.columns(2)
+            with col_source:
+                st.subheader("By Source:")
+                st.dataframe(collection_stats.breakdown('source'), column_config=breakdown_columns, hide_index=True, use_container_width=True)
+            with col_month:
+                st.subheader("By Month Acquired:")
+                st.dataframe(collection_stats.breakdown('month'), column_config=breakdown_columns, hide_index=True, use_container_width=True)
+
+            if total_individual_figures > 0:
+                # One weight per distinct price (units owned at it) instead of one value per physical figure
+                hist_prices, hist_units = collection_stats.price_distribution()
                 
-                if not valid_prices_paid_per_unit.empty:
+                if len(hist_prices):
                     st.subheader("Distribution of Prices Paid (Per Unit)")
-                    fig, ax = plt.subplots()
-                    # Create a list of prices, repeated by quantity for a more representative histogram of individual purchases
-                    prices_for_hist = []
-                    for _, row_hist in active_collection_df.iterrows():
-                        if pd.notna(row_hist['price_paid']) and pd.notna(row_hist['quantity']):
-                             prices_for_hist.extend([float(row_hist['price_paid'])] * int(row_hist['quantity']))
-                    
-                    if prices_for_hist:
-                        sns.histplot(prices_for_hist, kde=True, ax=ax, bins=max(1, min(20, int(len(prices_for_hist)/2))))
-                        ax.set_title("Histogram of Prices Paid (Per Unit, Reflecting Quantities)")
-                        ax.set_xlabel("Price Paid ($)")
-                        ax.set_ylabel("Number of Individual Figures")
-                        st.pyplot(fig)
-                        plt.close(fig)
-                    else:
-                        st.caption("Not enough data for price distribution histogram.")
+                    display_chart(
+                        render_price_histogram, hist_prices, hist_units,
+                        title="Histogram of Prices Paid (Per Unit, Reflecting Quantities)",
+                        xlabel="Price Paid ($)", ylabel="Number of Individual Figures",
+                        bins=max(1, min(20, int(hist_units.sum()/2)))
+                    )
 
                 else:
                     st.caption("No valid price data to plot histogram.")
 
-    with prob_tab:
+    with prob_tab, span("prob_tab"):
         st.header("🎲 Probability Workbench")
         if st.session_state.all_loaded_series_data_df.empty:
             st.info("Master data ('box_data.csv') could not be loaded or is empty.")
         elif not st.session_state.target_figures:
             st.info("Select target figures from 'Set Target Figures' in the sidebar.")
         else:
-            # Get figures that are targets AND have quantity 0 or are not in user_collection_df
-            unowned_target_names = []
-            for target_name in st.session_state.target_figures:
-                owned_entry = st.session_state.user_collection_df[st.session_state.user_collection_df['figure_name'] == target_name]
-                if owned_entry.empty or owned_entry['quantity'].iloc[0] == 0:
-                    unowned_target_names.append(target_name)
+            # Get figures that are targets AND have quantity 0 or are not in the collection
+            unowned_target_names = [
+                target_name for target_name in st.session_state.target_figures
+                if st.session_state.collection_store.quantity(target_name) == 0
+            ]
 
             if not unowned_target_names:
                 st.success("🎉 Congratulations! You own all your selected target figures (with quantity > 0).")
@@ -557,7 +587,7 @@ def main():
 
                 unowned_targets_details_df = st.session_state.all_loaded_series_data_df[
                     st.session_state.all_loaded_series_data_df['figure_name'].isin(unowned_target_names)
-                ].drop_duplicates(subset=['figure_name', 'character_series_name', 'series'])
+                ]
 
                 if unowned_targets_details_df.empty:
                     st.warning("Could not find details for unowned targets in loaded master data.")
@@ -581,7 +611,7 @@ def main():
                                 if 'price' not in targets_in_selected_sub_series_df.columns or targets_in_selected_sub_series_df['price'].empty or pd.isna(targets_in_selected_sub_series_df['price'].iloc[0]):
                                     st.error(f"Price information missing or invalid for sub-series '{selected_sub_series_to_buy}'.")
                                 else:
-                                    box_price = targets_in_selected_sub_series_df['price'].iloc[0] 
+                                    box_price = catalog_price(targets_in_selected_sub_series_df['price'].iloc[0])
                                     st.metric(f"Std. Box Price for '{selected_sub_series_to_buy}'", f"${box_price:.2f}")
                                     st.markdown(f"Combined probability of pulling *any* of these targets "
                                                 f"({', '.join(targets_in_selected_sub_series_df['figure_name'])}) "
@@ -594,35 +624,142 @@ def main():
                                     st.metric(f"P(At Least One Target) in {num_boxes} boxes:", f"{prob_at_least_one_N_boxes:.2%}")
                                     st.markdown(f"Simulated cost for {num_boxes} boxes: **${num_boxes * box_price:.2f}**")
                                     box_counts = np.arange(1, 51)
-                                    probs = [1 - (prob_no_target_one_box ** count) for count in box_counts]
-                                    fig_prob, ax_prob = plt.subplots()
-                                    sns.lineplot(x=box_counts, y=probs, ax=ax_prob, marker='o')
-                                    ax_prob.set_title(f"Chance of Target from '{selected_sub_series_to_buy}'")
-                                    ax_prob.set_xlabel("Number of Boxes")
-                                    ax_prob.set_ylabel("P(At Least One Target)")
-                                    ax_prob.yaxis.set_major_formatter(mticker.PercentFormatter(xmax=1.0))
-                                    ax_prob.grid(True, linestyle='--', alpha=0.7)
-                                    st.pyplot(fig_prob)
-                                    plt.close(fig_prob)
+                                    probs = 1 - np.power(prob_no_target_one_box, box_counts)
+                                    display_chart(
+                                        render_probability_curve, box_counts, probs,
+                                        title=f"Chance of Target from '{selected_sub_series_to_buy}'",
+                                        xlabel="Number of Boxes", ylabel="P(At Least One Target)"
+                                    )
+
+                                    st.subheader(f"Collecting *All* Targets from '{selected_sub_series_to_buy}'")
+                                    # Listed odds often add up to slightly over 100% (a secret replaces a regular figure), so rescale
+                                    sub_series_catalog_df = st.session_state.all_loaded_series_data_df[
+                                        st.session_state.all_loaded_series_data_df['series'] == selected_sub_series_to_buy
+                                    ]
+                                    sub_series_total_prob = sub_series_catalog_df['probability'].sum()
+                                    target_probs_in_sub_series = targets_in_selected_sub_series_df['probability'].to_numpy() / max(1.0, sub_series_total_prob)
+                                    with span("completion", rows=len(target_probs_in_sub_series)):
+                                        try:
+                                            expected_boxes_all = expected_boxes_to_complete(target_probs_in_sub_series)
+                                            all_targets_horizon = max(num_boxes, completion_horizon(target_probs_in_sub_series))
+                                            all_targets_cdf = completion_cdf(target_probs_in_sub_series, all_targets_horizon)
+                                        except ValueError as e:
+                                            st.warning(f"Completion odds unavailable for this sub-series: {e}")
+                                        else:
+                                            col1, col2, col3 = st.columns(3)
+                                            col1.metric("Expected Boxes for All Targets", f"{expected_boxes_all:.1f}")
+                                            col2.metric("Expected Cost for All Targets", f"${expected_boxes_all * box_price:.2f}")
+                                            col3.metric(f"P(All Targets) in {num_boxes} boxes:", f"{all_targets_cdf[num_boxes]:.2%}")
+                                            median_boxes_all = int(np.searchsorted(all_targets_cdf, 0.5))
+                                            p90_boxes_all = int(np.searchsorted(all_targets_cdf, 0.9))
+                                            st.markdown(f"Half of collectors finish within **{median_boxes_all}** boxes "
+                                                        f"(${median_boxes_all * box_price:.2f}); 90% finish within **{p90_boxes_all}** boxes "
+                                                        f"(${p90_boxes_all * box_price:.2f}).")
+                                            display_chart(
+                                                render_completion_chart, np.arange(1, all_targets_horizon + 1), all_targets_cdf, expected_boxes_all,
+                                                title=f"Completing All Targets from '{selected_sub_series_to_buy}'"
+                                            )
+
+                                    st.subheader(f"Simulate Buying from '{selected_sub_series_to_buy}'")
+                                    sim_cols = st.columns(3)
+                                    with sim_cols[0]:
+                                        sim_stop_label = st.selectbox("Stop buying when...", list(SIMULATION_STOP_RULES), key="sim_stop_rule")
+                                    with sim_cols[1]:
+                                        sim_trials = st.select_slider("Simulated collectors", options=SIMULATION_TRIAL_OPTIONS, value=100_000, key="sim_trials")
+                                    with sim_cols[2]:
+                                        sim_seed = st.number_input("Random seed", min_value=0, value=0, step=1, key="sim_seed")
+                                    sim_stop_rule = SIMULATION_STOP_RULES[sim_stop_label]
+                                    sim_max_boxes = None
+                                    if sim_stop_rule == STOP_BUDGET:
+                                        sim_budget = st.number_input("Budget ($)", min_value=float(box_price), value=float(num_boxes * box_price), step=float(box_price), key="sim_budget")
+                                        sim_max_boxes = int(sim_budget // box_price)
+                                        st.caption(f"A ${sim_budget:.2f} budget buys {sim_max_boxes} boxes.")
+
+                                    with span("simulation", rows=sim_trials):
+                                        sub_series_figure_names = sub_series_catalog_df['figure_name']
+                                        try: # Cached per parameter set, so other widgets don't trigger a re-run
+                                            sim_result = simulate_box_openings(
+                                                sub_series_catalog_df['probability'].to_numpy(),
+                                                sub_series_figure_names.isin(unowned_target_names).to_numpy(),
+                                                np.array([st.session_state.collection_store.quantity(name) > 0 for name in sub_series_figure_names]),
+                                                stop_rule=sim_stop_rule, max_boxes=sim_max_boxes, n_trials=sim_trials, seed=sim_seed
+                                            )
+                                        except ValueError as e:
+                                            st.warning(f"Simulation unavailable for this sub-series: {e}")
+                                        else:
+                                            sim_summary_df = summarize_simulation(sim_result, box_price)
+                                            col1, col2, col3 = st.columns(3)
+                                            col1.metric("Simulated Success Rate", f"{sim_result['completed'].mean():.2%}")
+                                            col2.metric("Median Cost", f"${sim_summary_df.loc['Cost ($)', 'P50']:.2f}")
+                                            col3.metric("Avg. Duplicates", f"{sim_summary_df.loc['Duplicates', 'Mean']:.1f}")
+                                            st.dataframe(sim_summary_df.style.format("{:.1f}"), use_container_width=True)
+                                            cost_counts = np.bincount(sim_result['boxes'])
+                                            shown_boxes = np.flatnonzero(cost_counts)
+                                            display_chart(
+                                                render_share_bars, shown_boxes * box_price, cost_counts[shown_boxes] / sim_trials,
+                                                width=box_price, title=f"Simulated Spend for {sim_trials:,} Collectors",
+                                                xlabel="Total Cost ($)", ylabel="Share of Collectors"
+                                            )
                         else:
                             st.info("Select a sub-series to see probability calculations.")
 
-    with browse_tab:
+                    st.subheader("💡 Best Plan Across All Sub-Series")
+                    st.markdown("Split a budget across every sub-series that holds an unowned target to maximize "
+                                "the expected number of different targets you pull.")
+                    with span("optimizer", rows=len(unowned_targets_details_df)):
+                        cheapest_box_price = catalog_price(unowned_targets_details_df['price'].min())
+                        optimizer_budget = st.number_input(
+                            "Total Budget ($)", min_value=0.0, value=round(10 * cheapest_box_price, 2),
+                            step=max(1.0, round(cheapest_box_price, 2)), key="optimizer_budget"
+                        )
+                        purchase_plan = optimize_purchase_plan(
+                            unowned_targets_details_df, optimizer_budget,
+                            st.session_state.all_loaded_series_data_df.groupby('series', observed=True)['probability'].sum()
+                        )
+                        if purchase_plan['plan'].empty:
+                            st.info(f"A budget of ${optimizer_budget:.2f} does not cover a box from any of these sub-series.")
+                        else:
+                            col1, col2, col3 = st.columns(3)
+                            col1.metric("Expected Targets Pulled", f"{purchase_plan['expected_targets']:.2f} of {len(unowned_targets_details_df)}")
+                            col2.metric("Planned Spend", f"${purchase_plan['spend']:.2f}")
+                            col3.metric("Value of Another $100", f"+{100 * purchase_plan['marginal_value']:.2f} targets")
+                            st.dataframe(
+                                purchase_plan['plan'],
+                                column_config={
+                                    'series': "Sub-Series",
+                                    'character_series_name': "Character",
+                                    'box_price': st.column_config.NumberColumn("Box Price", format="$%.2f"),
+                                    'boxes': "Boxes to Buy",
+                                    'spend': st.column_config.NumberColumn("Spend", format="$%.2f"),
+                                    'expected_targets': st.column_config.NumberColumn("Expected Targets", format="%.2f"),
+                                    'targets': "Unowned Targets"
+                                },
+                                hide_index=True,
+                                use_container_width=True
+                            )
+                            display_chart(
+                                render_step_curve, purchase_plan['curve']['spend'].to_numpy(), purchase_plan['curve']['expected_targets'].to_numpy(),
+                                title="Expected Targets vs. Spend (Optimal Order of Purchases)",
+                                xlabel="Cumulative Spend ($)", ylabel="Expected Distinct Targets"
+                            )
+
+    with browse_tab, span("browse_tab"):
         st.header("📚 Browse All Figures from Loaded Master Data")
         if st.session_state.all_loaded_series_data_df.empty:
             st.info("Master data ('box_data.csv') could not be loaded or is empty.")
         else:
             st.markdown(f"Displaying all {len(st.session_state.all_loaded_series_data_df)} figures from 'box_data.csv'.")
-            display_df_browse = st.session_state.all_loaded_series_data_df.copy()
-            char_series_filter_options = ["All Character Series"] + sorted(display_df_browse['character_series_name'].unique().tolist())
+            catalog_index = st.session_state.catalog_index
+            display_df_browse = st.session_state.all_loaded_series_data_df
+            char_series_filter_options = ["All Character Series"] + catalog_index.character_series
             selected_char_series_filter = st.selectbox("Filter by Character Series:", char_series_filter_options, key="browse_char_series_filter")
             if selected_char_series_filter != "All Character Series":
-                display_df_browse = display_df_browse[display_df_browse['character_series_name'] == selected_char_series_filter]
+                display_df_browse = display_df_browse.take(catalog_index.rows(selected_char_series_filter))
             if not display_df_browse.empty and selected_char_series_filter != "All Character Series":
-                sub_series_filter_options = ["All Sub-Series"] + sorted(display_df_browse['series'].unique().tolist())
+                sub_series_filter_options = ["All Sub-Series"] + catalog_index.sub_series_options(selected_char_series_filter)
                 selected_sub_series_filter = st.selectbox(f"Filter by Sub-Series within {selected_char_series_filter}:", sub_series_filter_options, key="browse_sub_series_filter")
                 if selected_sub_series_filter != "All Sub-Series":
-                    display_df_browse = display_df_browse[display_df_browse['series'] == selected_sub_series_filter]
+                    display_df_browse = st.session_state.all_loaded_series_data_df.take(catalog_index.rows(selected_char_series_filter, selected_sub_series_filter))
             st.dataframe(
                 display_df_browse[['figure_name', 'character_series_name', 'series', 'price', 'probability']], 
                 use_container_width=True
@@ -632,4 +769,9 @@ def main():
     st.markdown("Built with ❤️ by a fellow collector, powered by Streamlit.")
 
 if __name__ == "__main__":
-    main()
+    if PROFILE_ENABLED: # Timing spans only when BLINDBOX_PROFILE is set
+        with profile_rerun() as rerun_profile:
+            main()
+        display_profile_panel(rerun_profile)
+    else:
+        main()
@@ -0,0 +1,1231 @@
+"""Headless blind-box engine: catalog parsing, collection storage and stats, and probability maths.
+
+Everything here runs without Streamlit or matplotlib, so the app, batch reports (`blindbox_report.py`)
+and notebooks share one implementation. The Streamlit app only adds widgets and process-wide caching
+on top.
+"""
+
+import concurrent.futures
+import contextlib
+import functools
+import hashlib
+import io
+import itertools
+import os
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+# --- Constants ---
+
+# URL for the master CSV data file on GitHub
+DATA_URL = "https://raw.githubusercontent.com/kmgilland/GILLAND-Python-Portfolio/refs/heads/main/StreamlitAppFinal/box_data.csv"
+
+# Bundled copy of the master CSV, used when the GitHub URL cannot be reached
+LOCAL_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "box_data.csv")
+
+CATALOG_REFRESH_SECONDS = 300 # How often a remote catalog source is re-checked for changes
+CATALOG_FETCH_TIMEOUT = 10    # Seconds to wait on the remote catalog before falling back
+CATALOG_FETCH_WORKERS = 32    # Manifest sources fetched at the same time (I/O bound, so threads are cheap)
+
+EXPECTED_CSV_COLUMNS_FOR_APP_LOGIC = [
+    'character_name',  # e.g., Peach Riot, Skullpanda
+    'series_name',     # e.g., Rise Up, The Mare
+    'figure_name',     # e.g., Poppy: Acorn, Birdy
+    'price',
+    'probability',
+    'figure_photo',    # Optional
+    'quantity'         # Optional, for pre-populating owned quantities
+]
+
+# APP_INTERNAL_COLUMNS defines the structure of the DataFrame stored in session state.
+APP_INTERNAL_COLUMNS = [
+    'character_series_name', # Data from CSV 'character_name'
+    'series',                # Data from CSV 'series_name'
+    'figure_name',           # Data from CSV 'figure_name'
+    'price',                 # Data from CSV 'price'
+    'probability',           # Data from CSV 'probability'
+    'figure_photo'           # Data from CSV 'figure_photo'
+]
+
+# Catalog storage: names and photo URLs as categoricals (each distinct string stored once, rows hold small
+# integer codes), prices and odds as float32. A figure is identified by its character series, sub-series and name.
+CATALOG_CATEGORY_COLUMNS = ['character_series_name', 'series', 'figure_name', 'figure_photo']
+CATALOG_FLOAT_COLUMNS = ['price', 'probability']
+CATALOG_KEY_COLUMNS = ['character_series_name', 'series', 'figure_name']
+
+# Expected columns for user's personal collection data (when uploading or manually adding)
+USER_COLLECTION_COLUMNS = ['figure_name', 'series_name', 'sub_series_name', 'price_paid', 'owned_date', 'source', 'quantity']
+
+# Bulk changes above this many figures are committed as frames: records and stats are rebuilt in one pass when needed
+STATS_REBUILD_THRESHOLD = 1000
+
+COLLECTION_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS collection_items (
+    collection_id   TEXT NOT NULL,
+    figure_name     TEXT NOT NULL,
+    series_name     TEXT,
+    sub_series_name TEXT,
+    price_paid      REAL,
+    owned_date      TEXT,
+    source          TEXT,
+    quantity        INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (collection_id, figure_name)
+);
+CREATE INDEX IF NOT EXISTS idx_collection_items_series ON collection_items (collection_id, series_name, sub_series_name);
+"""
+COLLECTION_DB_UPSERT = f"""
+INSERT INTO collection_items (collection_id, {', '.join(USER_COLLECTION_COLUMNS)})
+VALUES ({', '.join('?' * (len(USER_COLLECTION_COLUMNS) + 1))})
+ON CONFLICT (collection_id, figure_name) DO UPDATE SET
+    {', '.join(f'{col} = excluded.{col}' for col in USER_COLLECTION_COLUMNS if col != 'figure_name')}
+"""
+
+# --- Catalog ---
+def convert_fractions_to_float(values):
+    """Converts a Series of fraction strings (e.g., '1/12') or plain numbers to floats in one vectorized pass."""
+    text = values.astype("string").str.strip()
+    parts = text.str.split('/', n=1, expand=True) # Split into numerator and denominator
+    numerator = pd.to_numeric(parts[0], errors='coerce')
+    if parts.shape[1] < 2: # No fractions at all in the column
+        return numerator.astype(float)
+    denominator = pd.to_numeric(parts[1], errors='coerce')
+    has_slash = text.str.contains('/', regex=False).fillna(False).to_numpy(dtype=bool)
+    result = pd.Series(np.where(has_slash, numerator / denominator, numerator), index=values.index, dtype=float)
+    return result.replace([np.inf, -np.inf], np.nan) # Treat '1/0' like any other invalid fraction
+
+def compact_catalog(df):
+    """Converts a catalog frame to its compact storage: categorical names and photo URLs, float32 numbers.
+
+    Row selections (`take`, boolean masks) of the result copy only the codes and share the string tables.
+    """
+    df = df.copy(deep=False)
+    for col_name in CATALOG_CATEGORY_COLUMNS:
+        df[col_name] = df[col_name].astype(object).astype('category') # Categories come out sorted
+    for col_name in CATALOG_FLOAT_COLUMNS:
+        df[col_name] = df[col_name].astype(np.float32)
+    return df
+
+def catalog_price(value):
+    """Catalog box price (stored as float32) as the exact dollars-and-cents float it was listed at."""
+    return round(float(value), 2)
+
+def read_catalog_source(source):
+    """Reads raw CSV bytes from a URL or local path. Returns (bytes, mtime), with mtime None for URLs."""
+    if source.startswith(('http://', 'https://')):
+        with urllib.request.urlopen(source, timeout=CATALOG_FETCH_TIMEOUT) as response:
+            return response.read(), None
+    with open(source, 'rb') as fh:
+        raw = fh.read()
+    return raw, os.path.getmtime(source)
+
+def fetch_catalog_source(source, validators=None):
+    """Conditionally re-reads one catalog source. Returns (bytes, validators), with bytes None if unchanged.
+
+    URLs send the ETag / Last-Modified of the previous response and local files compare mtimes; pass the
+    returned validators back on the next call.
+    """
+    validators = validators or {}
+    if source.startswith(('http://', 'https://')):
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        try:
+            with urllib.request.urlopen(urllib.request.Request(source, headers=headers), timeout=CATALOG_FETCH_TIMEOUT) as response:
+                return response.read(), {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+        except urllib.error.HTTPError as e:
+            if e.code == 304: # Not Modified
+                return None, validators
+            raise
+    if validators.get('mtime') == os.path.getmtime(source):
+        return None, validators
+    raw, mtime = read_catalog_source(source)
+    return raw, {'mtime': mtime}
+
+def read_catalog_manifest(path):
+    """Catalog sources listed in a manifest file: one local path or URL per line, '#' lines are comments.
+
+    Relative paths are resolved against the manifest's folder; repeated entries are listed once.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    sources = []
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            entry = line.strip()
+            if not entry or entry.startswith('#'):
+                continue
+            if not entry.startswith(('http://', 'https://')) and not os.path.isabs(entry):
+                entry = os.path.join(base_dir, entry)
+            sources.append(entry)
+    return list(dict.fromkeys(sources))
+
+def parse_master_catalog(raw):
+    """Parses master CSV bytes into the typed APP_INTERNAL_COLUMNS frame.
+
+    Raises ValueError if the CSV is missing columns the app cannot work without.
+    """
+    df = pd.read_csv(io.BytesIO(raw), dtype=str) # Load the CSV bytes into a DataFrame
+
+    csv_cols_needed_for_core_functionality = ['character_name', 'series_name', 'figure_name', 'price', 'probability']
+    missing_cols = [col for col in csv_cols_needed_for_core_functionality if col not in df.columns] # Check for missing columns
+    if missing_cols:
+        raise ValueError(f"The CSV data is missing the following essential columns: {', '.join(missing_cols)}.")
+
+    df = df.rename(columns={
+        'character_name': 'character_series_name',
+        'series_name': 'series'
+    })
+    df['price'] = pd.to_numeric(df['price'].str.replace('$', '', regex=False), errors='coerce').astype(float)
+    df['probability'] = convert_fractions_to_float(df['probability'])
+
+    if 'figure_photo' not in df.columns: # Check if figure_photo column exists
+        df['figure_photo'] = pd.NA # Initialize with NA if not present
+    else:
+        df['figure_photo'] = df['figure_photo'].replace('', pd.NA) # Convert empty strings to NA
+
+    # Quantity from master CSV is not currently used by APP_INTERNAL_COLUMNS,
+    # but might be used if pre-populating the user's collection.
+
+    essential_cols_for_dropna = ['character_series_name', 'series', 'figure_name', 'price', 'probability']
+    df = df.dropna(subset=essential_cols_for_dropna) # Drop rows with NaN in essential columns
+    df = df.drop_duplicates(subset=CATALOG_KEY_COLUMNS) # One row per figure; the first listing wins
+
+    return compact_catalog(df[APP_INTERNAL_COLUMNS].reset_index(drop=True))
+
+def merge_catalog_frames(frames):
+    """Stacks parsed catalogs (e.g. one per series file) into one compact catalog; a figure's first listing wins."""
+    if not frames:
+        return compact_catalog(pd.DataFrame(columns=APP_INTERNAL_COLUMNS))
+    merged = pd.concat(frames, ignore_index=True) # Differing categories fall back to object, re-encoded below
+    return compact_catalog(merged.drop_duplicates(subset=CATALOG_KEY_COLUMNS).reset_index(drop=True))
+
+class CatalogIndex:
+    """Character series -> sub-series -> catalog row positions, built once per parsed catalog.
+
+    Option lists are sorted up front, so selectors and filters resolve a selection with dictionary
+    lookups and a single `take` instead of scanning the whole catalog.
+    """
+
+    def __init__(self, catalog_df):
+        groups = catalog_df.groupby(['character_series_name', 'series'], sort=True, observed=True).indices if len(catalog_df) else {}
+        self._rows = {} # (character series, sub-series) -> ascending row positions
+        self.sub_series = {} # character series -> sorted sub-series names
+        for (character, sub_series), positions in sorted(groups.items()):
+            self._rows[(character, sub_series)] = np.asarray(positions, dtype=np.intp)
+            self.sub_series.setdefault(character, []).append(sub_series)
+        self.character_series = list(self.sub_series) # Sorted character series names
+        self._character_rows = {
+            character: np.sort(np.concatenate([self._rows[(character, sub)] for sub in subs]))
+            for character, subs in self.sub_series.items()
+        }
+
+    def sub_series_options(self, character_series):
+        """Sorted sub-series of a character series (empty if it is not in the catalog)."""
+        return self.sub_series.get(character_series, [])
+
+    def rows(self, character_series, sub_series=None):
+        """Catalog row positions of a character series, or of one of its sub-series, in catalog order."""
+        if sub_series is None:
+            return self._character_rows.get(character_series, np.empty(0, dtype=np.intp))
+        return self._rows.get((character_series, sub_series), np.empty(0, dtype=np.intp))
+
+    def selection_rows(self, selected_sub_series_map, character_series_names=None):
+        """Row positions for {character series: [sub-series]}, grouped by character series in the map's order.
+
+        Only character series in `character_series_names` count, when given.
+        """
+        parts = []
+        for character, sub_series_list in selected_sub_series_map.items():
+            if character_series_names is not None and character not in character_series_names:
+                continue
+            positions = [self.rows(character, sub) for sub in dict.fromkeys(sub_series_list)]
+            if positions:
+                parts.append(np.sort(np.concatenate(positions)))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.intp)
+
+class MasterCatalogCache:
+    """Process-wide holder for the parsed master catalog, shared by every browser session.
+
+    The catalog is downloaded, parsed and indexed once. Local sources are re-checked by mtime on every
+    call, remote sources at most every `refresh_seconds`, and the CSV is only re-parsed when its content
+    hash actually changes.
+    """
+
+    def __init__(self, sources, refresh_seconds=CATALOG_REFRESH_SECONDS):
+        self.sources = list(sources) # Tried in order; later entries are fallbacks
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._df = None
+        self._index = None
+        self._digest = None
+        self._source = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def _is_fresh(self, now):
+        if self._df is None or now - self._checked_at >= self.refresh_seconds:
+            return False
+        if self._mtime is not None: # Local file: cheap mtime check catches edits immediately
+            try:
+                return os.path.getmtime(self._source) == self._mtime
+            except OSError:
+                return False
+        return True
+
+    def get(self):
+        """Returns (read-only catalog view, its CatalogIndex, content hash), refreshing from the sources if needed."""
+        with self._lock:
+            now = time.monotonic()
+            if not self._is_fresh(now):
+                last_error = None
+                for source in self.sources:
+                    try:
+                        raw, mtime = read_catalog_source(source)
+                        break
+                    except Exception as e: # Fall back to the next source
+                        last_error = e
+                else:
+                    if self._df is None:
+                        raise last_error
+                    raw = None # Keep serving the last good catalog until a source comes back
+                    self._checked_at = now
+
+                if raw is not None:
+                    self._source, self._mtime, self._checked_at = source, mtime, now
+                    digest = hashlib.sha256(raw).hexdigest()
+                    if digest != self._digest:
+                        self._df = parse_master_catalog(raw)
+                        self._index = CatalogIndex(self._df)
+                        self._digest = digest
+            # A shallow copy shares the parsed columns; copy-on-write keeps session edits private
+            return self._df.copy(deep=False), self._index, self._digest
+
+def _load_catalog_source(source, validators, digest):
+    """Fetches and, if its content changed, parses one manifest source. Returns (validators, digest, frame or None)."""
+    raw, validators = fetch_catalog_source(source, validators)
+    if raw is None:
+        return validators, digest, None
+    new_digest = hashlib.sha256(raw).hexdigest()
+    if new_digest == digest: # Touched or re-served, but the same content
+        return validators, digest, None
+    try:
+        return validators, new_digest, parse_master_catalog(raw)
+    except ValueError as e:
+        raise ValueError(f"{e} ({os.path.basename(source) or source})") from e
+
+class CatalogManifestCache:
+    """Process-wide catalog merged from the many per-series CSV sources listed in a manifest file.
+
+    Sources are fetched and parsed on a thread pool, so a cold load takes about as long as the slowest
+    source rather than all of them. Local sources are re-checked by mtime on every call and remote ones
+    at most every `refresh_seconds` with a conditional request; only sources whose content changed are
+    re-parsed, and the merged catalog is only rebuilt when one did. A source that fails keeps serving
+    its last good data (if any) and is listed in `errors`.
+    """
+
+    def __init__(self, manifest_path, refresh_seconds=CATALOG_REFRESH_SECONDS, max_workers=CATALOG_FETCH_WORKERS):
+        self.manifest_path = manifest_path
+        self.refresh_seconds = refresh_seconds
+        self.max_workers = max_workers
+        self.errors = {} # source -> exception from its latest failed load
+        self._lock = threading.Lock()
+        self._manifest_mtime = None
+        self._sources = []
+        self._entries = {} # source -> {'validators', 'digest', 'df', 'checked_at'}
+        self._merged_digests = None
+        self._df = None
+        self._index = None
+        self._digest = None
+
+    def _is_due(self, source, now):
+        entry = self._entries.get(source)
+        if entry is None:
+            return True
+        if source.startswith(('http://', 'https://')):
+            return now - entry['checked_at'] >= self.refresh_seconds
+        try: # Local file: cheap mtime check catches edits immediately
+            return os.path.getmtime(source) != entry['validators'].get('mtime')
+        except OSError:
+            return True
+
+    def get(self):
+        """Returns (read-only catalog view, its CatalogIndex, content hash), refreshing changed sources if needed."""
+        with self._lock:
+            now = time.monotonic()
+            manifest_mtime = os.path.getmtime(self.manifest_path)
+            if manifest_mtime != self._manifest_mtime: # Sources added or removed
+                self._sources = read_catalog_manifest(self.manifest_path)
+                self._manifest_mtime = manifest_mtime
+                self._entries = {source: entry for source, entry in self._entries.items() if source in self._sources}
+                self.errors = {source: e for source, e in self.errors.items() if source in self._sources}
+            due = [source for source in self._sources if self._is_due(source, now)]
+            if due:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(due))) as pool:
+                    futures = {
+                        pool.submit(_load_catalog_source, source, entry.get('validators'), entry.get('digest')): source
+                        for source, entry in ((source, self._entries.get(source, {})) for source in due)
+                    }
+                    for future in concurrent.futures.as_completed(futures):
+                        source = futures[future]
+                        entry = self._entries.setdefault(source, {'validators': {}, 'digest': None, 'df': None})
+                        entry['checked_at'] = now
+                        try:
+                            validators, digest, df = future.result()
+                        except Exception as e: # Keep the source's last good data
+                            self.errors[source] = e
+                            continue
+                        self.errors.pop(source, None)
+                        entry['validators'], entry['digest'] = validators, digest
+                        if df is not None:
+                            entry['df'] = df
+
+            loaded = [source for source in self._sources if self._entries.get(source, {}).get('df') is not None]
+            merged_digests = tuple(self._entries[source]['digest'] for source in loaded)
+            if merged_digests != self._merged_digests:
+                if not loaded:
+                    raise next(iter(self.errors.values()), ValueError("The catalog manifest lists no sources."))
+                self._df = merge_catalog_frames([self._entries[source]['df'] for source in loaded])
+                self._index = CatalogIndex(self._df)
+                self._digest = hashlib.sha256("".join(merged_digests).encode()).hexdigest()
+                self._merged_digests = merged_digests
+            # A shallow copy shares the parsed columns; copy-on-write keeps session edits private
+            return self._df.copy(deep=False), self._index, self._digest
+
+# --- Personal Collection ---
+def _same_value(a, b):
+    """Scalar equality that treats missing values (NaN/NA/NaT) as equal to each other."""
+    if a is b:
+        return True
+    if pd.isna(a) or pd.isna(b):
+        return bool(pd.isna(a) and pd.isna(b))
+    try:
+        return bool(a == b)
+    except (TypeError, ValueError):
+        return False
+
+def _missing_as_none(values):
+    """Object Series with every missing value as None, so == compares instead of raising on pd.NA."""
+    return values.where(values.notna(), None) if values.dtype == object else values
+
+def _frame_records(df):
+    """{figure_name: record dict} for the rows of a USER_COLLECTION_COLUMNS frame."""
+    columns = [df[col].tolist() for col in USER_COLLECTION_COLUMNS] # Column-wise tolist beats to_dict('records')
+    return {values[0]: dict(zip(USER_COLLECTION_COLUMNS, values)) for values in zip(*columns)}
+
+def _to_float(value):
+    """float(value), or None for missing or non-numeric values."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value # NaN check
+
+class CollectionStats:
+    """Running totals and breakdowns over owned figures (quantity > 0), updated per record change.
+
+    `add`/`remove` adjust every total in O(1), so stats never rescan the collection. Prices are kept
+    as {price: units owned}, which lets the histogram and KDE be drawn from weighted values without
+    expanding one row per physical figure.
+    """
+
+    GROUPINGS = ('series', 'source', 'month')
+
+    def __init__(self):
+        self.figure_types = 0
+        self.total_figures = 0
+        self.total_spent = 0.0
+        self._price_units = {} # price paid -> units owned at that price
+        self._groups = {grouping: {} for grouping in self.GROUPINGS} # grouping -> key -> [figure types, figures, spent]
+
+    @staticmethod
+    def _contribution(record):
+        """(quantity, price or None, group keys) for an owned record, or None if it does not count."""
+        if record is None:
+            return None
+        quantity = _to_float(record['quantity'])
+        if quantity is None or quantity <= 0:
+            return None
+        owned_date = record['owned_date']
+        if isinstance(owned_date, str) or (owned_date is not None and not hasattr(owned_date, 'strftime')):
+            owned_date = pd.to_datetime(owned_date, errors='coerce') # Only unparsed values take the slow path
+        keys = {
+            'series': tuple(None if pd.isna(record[col]) else record[col] for col in ('series_name', 'sub_series_name')),
+            'source': None if pd.isna(record['source']) else record['source'],
+            'month': None if pd.isna(owned_date) else owned_date.year * 100 + owned_date.month, # e.g. 202403
+        }
+        return int(quantity), _to_float(record['price_paid']), keys
+
+    def _update(self, record, sign):
+        contribution = self._contribution(record)
+        if contribution is None:
+            return
+        quantity, price, keys = contribution
+        spent = price * quantity if price is not None else 0.0
+        self.figure_types += sign
+        self.total_figures += sign * quantity
+        self.total_spent += sign * spent
+        if price is not None:
+            units = self._price_units.get(price, 0) + sign * quantity
+            if units:
+                self._price_units[price] = units
+            else:
+                self._price_units.pop(price, None)
+        for grouping, key in keys.items():
+            totals = self._groups[grouping].setdefault(key, [0, 0, 0.0])
+            totals[0] += sign
+            totals[1] += sign * quantity
+            totals[2] += sign * spent
+            if totals[0] == 0: # Last owned figure in this group is gone
+                del self._groups[grouping][key]
+
+    def add(self, record):
+        self._update(record, 1)
+
+    def remove(self, record):
+        self._update(record, -1)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Builds the stats for a whole USER_COLLECTION_COLUMNS frame with vectorized group-bys."""
+        stats = cls()
+        quantity = pd.to_numeric(df['quantity'], errors='coerce')
+        owned = df[quantity > 0]
+        quantity = quantity[quantity > 0].astype(np.int64)
+        price = pd.to_numeric(owned['price_paid'], errors='coerce')
+        spent = (price * quantity).fillna(0.0)
+        stats.figure_types = len(owned)
+        stats.total_figures = int(quantity.sum())
+        stats.total_spent = float(spent.sum())
+        stats._price_units = quantity[price.notna()].groupby(price[price.notna()]).sum().to_dict()
+        owned_date = pd.to_datetime(owned['owned_date'], errors='coerce')
+        group_keys = {
+            'series': [owned['series_name'], owned['sub_series_name']],
+            'source': [owned['source']],
+            'month': [(owned_date.dt.year * 100 + owned_date.dt.month).astype('Int64')], # Integer codes; labels are formatted in breakdown()
+        }
+        values = pd.DataFrame({'types': 1, 'figures': quantity, 'spent': spent})
+        for grouping, keys in group_keys.items():
+            grouped = values.groupby([key.astype(object) for key in keys], dropna=False).sum()
+            for key, (types, figures, group_spent) in zip(grouped.index, grouped.itertuples(index=False)):
+                key = tuple(None if pd.isna(k) else k for k in key) if len(keys) > 1 else (None if pd.isna(key) else key)
+                stats._groups[grouping][key] = [int(types), int(figures), float(group_spent)]
+        return stats
+
+    def price_distribution(self):
+        """(sorted distinct prices paid, units owned at each price) as NumPy arrays."""
+        prices = np.array(sorted(self._price_units), dtype=float)
+        return prices, np.array([self._price_units[price] for price in prices], dtype=np.int64)
+
+    def breakdown(self, grouping):
+        """Figure types, figures and spend per group ('series', 'source' or 'month') as a DataFrame."""
+        key_columns = {'series': ['series_name', 'sub_series_name'], 'source': ['source'], 'month': ['month']}[grouping]
+        rows = [
+            (*(key if grouping == 'series' else (key,)), types, figures, spent)
+            for key, (types, figures, spent) in self._groups[grouping].items()
+        ]
+        df = pd.DataFrame(rows, columns=[*key_columns, 'figure_types', 'figures', 'spent'])
+        if grouping == 'month':
+            df = df.sort_values('month', ignore_index=True, na_position='last')
+            df['month'] = [None if pd.isna(code) else f"{int(code) // 100:04d}-{int(code) % 100:02d}" for code in df['month']]
+            return df
+        return df.sort_values('spent', ascending=False, ignore_index=True)
+
+class CollectionStore:
+    """The user's personal collection, keyed by figure_name.
+
+    Lookups, upserts and deletes are O(1) dict operations. Writes made inside `batch()` are staged
+    and applied together when the block exits (or dropped if it raises). `to_dataframe()` builds a
+    USER_COLLECTION_COLUMNS frame lazily and reuses it until the collection changes. `stats` is a
+    CollectionStats kept current with every committed change.
+
+    A collection loaded as a whole frame (a database read or a big upload) keeps that frame as its
+    base: lookups read single rows from it, and record dicts and stats are only built when needed.
+    """
+
+    def __init__(self, records=None):
+        self._records = {} # figure_name -> record dict, in insertion order (None while a base frame holds them)
+        self._base = None # Whole-collection frame the records are read from on demand
+        self._base_rows = None # figure_name -> row position in the base frame, built on first lookup
+        self._base_columns = None # The base frame's columns as arrays, for single-row reads
+        self._pending = None # Staged writes while a batch is open; None marks a delete
+        self._df_view = None
+        self._stats = CollectionStats() # None until next requested after a base frame is loaded
+        if records is not None:
+            for record in records:
+                self.upsert(record['figure_name'], record)
+
+    @staticmethod
+    def _empty_record(figure_name):
+        record = {col: pd.NA for col in USER_COLLECTION_COLUMNS}
+        record.update(figure_name=figure_name, owned_date=pd.NaT, quantity=0)
+        return record
+
+    @property
+    def stats(self):
+        if self._stats is None:
+            self._stats = CollectionStats.from_frame(self.to_dataframe())
+        return self._stats
+
+    def _set_base(self, df):
+        """Replaces the whole collection with a USER_COLLECTION_COLUMNS frame, without building record dicts."""
+        self._base = df
+        self._base_rows = self._base_columns = None
+        self._records = None
+        self._df_view = df
+        self._stats = None
+
+    def _base_record(self, figure_name):
+        if self._base_rows is None:
+            self._base_rows = dict(zip(self._base['figure_name'].tolist(), range(len(self._base))))
+            self._base_columns = [self._base[col].array for col in USER_COLLECTION_COLUMNS]
+        row = self._base_rows.get(figure_name)
+        if row is None:
+            return None
+        return dict(zip(USER_COLLECTION_COLUMNS, (values[row] for values in self._base_columns)))
+
+    def _record_map(self):
+        """figure_name -> record dict for the whole collection, built from the base frame if necessary."""
+        if self._records is None:
+            self._records = _frame_records(self._base)
+            self._base = self._base_rows = self._base_columns = None
+        return self._records
+
+    def __len__(self):
+        return len(self._base) if self._records is None else len(self._records)
+
+    def __contains__(self, figure_name):
+        return self.get(figure_name) is not None
+
+    def get(self, figure_name):
+        """Returns the record for a figure, or None if it is not in the collection."""
+        if self._pending is not None and figure_name in self._pending:
+            return self._pending[figure_name]
+        if self._records is None:
+            return self._base_record(figure_name)
+        return self._records.get(figure_name)
+
+    def quantity(self, figure_name):
+        """Owned quantity for a figure (0 if it is not in the collection)."""
+        record = self.get(figure_name)
+        return 0 if record is None or pd.isna(record['quantity']) else int(record['quantity'])
+
+    def upsert(self, figure_name, fields):
+        """Adds a figure or updates the given fields of an existing one."""
+        existing = self.get(figure_name)
+        record = dict(existing) if existing is not None else self._empty_record(figure_name)
+        record.update({col: val for col, val in fields.items() if col in USER_COLLECTION_COLUMNS})
+        record['figure_name'] = figure_name
+        if existing is not None and all(_same_value(record[col], existing[col]) for col in USER_COLLECTION_COLUMNS):
+            return # Nothing changed; keep the cached DataFrame view
+        self._write(figure_name, record)
+
+    def delete(self, figure_name):
+        """Removes a figure from the collection if present."""
+        if figure_name in self:
+            self._write(figure_name, None)
+
+    def _write(self, figure_name, record):
+        if self._pending is not None:
+            self._pending[figure_name] = record
+        else:
+            self._apply({figure_name: record})
+
+    def _apply(self, changes, df_view=None):
+        """Commits {figure_name: record or None} changes; `df_view` is the resulting frame if already known."""
+        records = self._record_map()
+        for figure_name, record in changes.items():
+            if self._stats is not None:
+                self._stats.remove(records.get(figure_name))
+                self._stats.add(record)
+            if record is None:
+                records.pop(figure_name, None)
+            else:
+                records[figure_name] = record
+        self._df_view = df_view
+
+    def _apply_frame(self, changed, merged):
+        """Commits a large bulk change: `changed` holds the new or updated rows, `merged` the whole resulting collection."""
+        self._set_base(merged) # Record dicts and stats are rebuilt from the frame only when next needed
+
+    def bulk_upsert(self, df):
+        """Upserts every row of a USER_COLLECTION_COLUMNS frame in one index-aligned pass.
+
+        Later rows win over earlier ones with the same figure_name, and existing figures have all
+        their columns replaced. Returns a dict with 'inserted', 'updated' and 'unchanged' counts.
+        """
+        incoming = df[USER_COLLECTION_COLUMNS].drop_duplicates(subset=['figure_name'], keep='last').set_index('figure_name')
+        current = self._pending_view().set_index('figure_name')
+
+        is_existing = incoming.index.isin(current.index)
+        new_rows = incoming[~is_existing]
+        existing_rows = incoming[is_existing]
+        if len(existing_rows):
+            before = current.loc[existing_rows.index]
+            same = pd.DataFrame({
+                col: (_missing_as_none(existing_rows[col]) == _missing_as_none(before[col])).fillna(False).astype(bool)
+                     | (existing_rows[col].isna() & before[col].isna())
+                for col in existing_rows.columns
+            }, index=existing_rows.index).all(axis=1)
+            updated_rows = existing_rows[~same]
+        else: # Nothing to compare against, e.g. loading into an empty collection
+            same = pd.Series(False, index=existing_rows.index)
+            updated_rows = existing_rows
+
+        changed = (pd.concat([updated_rows, new_rows]) if len(updated_rows) else new_rows).reset_index()[USER_COLLECTION_COLUMNS]
+        if self._pending is not None:
+            self._pending.update(_frame_records(changed))
+        elif len(changed):
+            merged = pd.concat([frame for frame in (current, new_rows) if not frame.empty])
+            if len(updated_rows):
+                merged.loc[updated_rows.index] = updated_rows # Index-aligned overwrite of existing figures
+            merged = merged.reset_index()[USER_COLLECTION_COLUMNS]
+            merged['quantity'] = pd.to_numeric(merged['quantity'], errors='coerce')
+            if len(changed) > STATS_REBUILD_THRESHOLD: # Large uploads stay frames; per-record updates would dominate
+                self._apply_frame(changed, merged)
+            else:
+                self._apply(_frame_records(changed), df_view=merged)
+        return {'inserted': len(new_rows), 'updated': len(updated_rows), 'unchanged': int(same.sum())}
+
+    def _pending_view(self):
+        """Collection as a DataFrame including any writes staged by an open batch."""
+        if not self._pending:
+            return self.to_dataframe()
+        records = {**self._record_map(), **self._pending}
+        return pd.DataFrame.from_records([r for r in records.values() if r is not None], columns=USER_COLLECTION_COLUMNS)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Stages every write in the block and commits them in one step."""
+        if self._pending is not None: # Nested batches fold into the outer one
+            yield self
+            return
+        self._pending = {}
+        try:
+            yield self
+            staged, self._pending = self._pending, None
+            if staged:
+                self._apply(staged)
+        finally:
+            self._pending = None
+
+    def to_dataframe(self):
+        """Committed collection as a USER_COLLECTION_COLUMNS DataFrame (shared; do not modify)."""
+        if self._df_view is None:
+            df = pd.DataFrame.from_records(list(self._record_map().values()), columns=USER_COLLECTION_COLUMNS)
+            df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce')
+            self._df_view = df
+        return self._df_view
+
+    def owned_dataframe(self):
+        """Committed records with quantity > 0."""
+        df = self.to_dataframe()
+        return df[df['quantity'] > 0]
+
+    def collection_totals(self):
+        """Totals over owned figures: 'figure_types', 'total_figures' and 'total_spent'."""
+        return {
+            'figure_types': self.stats.figure_types,
+            'total_figures': self.stats.total_figures,
+            'total_spent': self.stats.total_spent
+        }
+
+    def series_breakdown(self):
+        """Owned figure types, figures and spend per character series / sub-series, biggest spend first."""
+        return self.stats.breakdown('series')
+
+    def refresh(self):
+        """Picks up changes made outside this store. Nothing to do for an in-memory collection."""
+        return False
+
+class SQLiteCollectionStats:
+    """CollectionStats' read interface, answered by SQL aggregates over a SQLiteCollectionStore's table."""
+
+    GROUPINGS = CollectionStats.GROUPINGS
+    GROUP_KEYS = {'source': "source", 'month': "substr(owned_date, 1, 7)"} # owned_date is stored as ISO text
+
+    def __init__(self, store):
+        self._store = store
+        self._results = {} # Query results for the store's current version
+
+    def _memo(self, name, compute):
+        """Result of `compute()`, reused until the collection changes (results are shared; do not modify)."""
+        key = (name, self._store.version)
+        if key not in self._results:
+            self._results = {k: v for k, v in self._results.items() if k[1] == self._store.version}
+            self._results[key] = compute()
+        return self._results[key]
+
+    @property
+    def figure_types(self):
+        return self._store.collection_totals()['figure_types']
+
+    @property
+    def total_figures(self):
+        return self._store.collection_totals()['total_figures']
+
+    @property
+    def total_spent(self):
+        return self._store.collection_totals()['total_spent']
+
+    def price_distribution(self):
+        """(sorted distinct prices paid, units owned at each price) as NumPy arrays."""
+        return self._memo('prices', self._price_distribution)
+
+    def breakdown(self, grouping):
+        """Figure types, figures and spend per group ('series', 'source' or 'month') as a DataFrame."""
+        if grouping == 'series':
+            return self._store.series_breakdown()
+        return self._memo(grouping, lambda: self._breakdown(grouping))
+
+    def _price_distribution(self):
+        with self._store._lock:
+            rows = self._store._conn.execute(
+                "SELECT price_paid, SUM(quantity) FROM collection_items "
+                "WHERE collection_id = ? AND quantity > 0 AND price_paid IS NOT NULL GROUP BY price_paid ORDER BY price_paid",
+                (self._store.collection_id,)
+            ).fetchall()
+        return np.array([row[0] for row in rows], dtype=float), np.array([row[1] for row in rows], dtype=np.int64)
+
+    def _breakdown(self, grouping):
+        order = "month IS NULL, month" if grouping == 'month' else "spent DESC"
+        with self._store._lock:
+            return pd.read_sql_query(
+                f"SELECT {self.GROUP_KEYS[grouping]} AS {grouping}, COUNT(*) AS figure_types, SUM(quantity) AS figures, "
+                f"COALESCE(SUM(price_paid * quantity), 0) AS spent FROM collection_items "
+                f"WHERE collection_id = ? AND quantity > 0 GROUP BY 1 ORDER BY {order}",
+                self._store._conn, params=(self._store.collection_id,)
+            )
+
+class SQLiteCollectionStore(CollectionStore):
+    """A CollectionStore persisted to a local SQLite database, one named collection per store.
+
+    The database runs in WAL mode so many app sessions can read while one writes. Every committed
+    change (a single upsert, a batch or a bulk upload) is written in one transaction, and totals,
+    breakdowns and the price distribution are computed by SQL aggregates on the indexed table.
+    """
+
+    def __init__(self, db_path, collection_id):
+        super().__init__()
+        self.db_path = db_path
+        self.collection_id = collection_id
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False) # Reruns may land on different threads
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            with self._conn:
+                self._conn.executescript(COLLECTION_DB_SCHEMA)
+        self._data_version = None
+        self.version = 0 # Bumped by every reload and committed change, so cached aggregates know when to refresh
+        self._sql_stats = SQLiteCollectionStats(self)
+        self.refresh()
+
+    @property
+    def stats(self):
+        return self._sql_stats
+
+    @staticmethod
+    def _to_db_value(col, value):
+        if pd.isna(value):
+            return None
+        if col == 'owned_date':
+            return pd.Timestamp(value).isoformat()
+        if col == 'price_paid':
+            return float(value)
+        if col == 'quantity':
+            return int(value)
+        return str(value)
+
+    def refresh(self):
+        """Reloads the collection if another connection has committed since the last load."""
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return False
+            df = pd.read_sql_query(
+                f"SELECT {', '.join(USER_COLLECTION_COLUMNS)} FROM collection_items WHERE collection_id = ? ORDER BY rowid",
+                self._conn, params=(self.collection_id,)
+            )
+            self._data_version = data_version
+        df['owned_date'] = pd.to_datetime(df['owned_date'], errors='coerce')
+        df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce')
+        self._set_base(df)
+        self.version += 1
+        return True
+
+    def _apply(self, changes, df_view=None):
+        upserts = [
+            (self.collection_id, *(self._to_db_value(col, record[col]) for col in USER_COLLECTION_COLUMNS))
+            for record in changes.values() if record is not None
+        ]
+        deletes = [(self.collection_id, name) for name, record in changes.items() if record is None]
+        with self._lock:
+            with self._conn: # One transaction; rolled back if any statement fails
+                if upserts:
+                    self._conn.executemany(COLLECTION_DB_UPSERT, upserts)
+                if deletes:
+                    self._conn.executemany("DELETE FROM collection_items WHERE collection_id = ? AND figure_name = ?", deletes)
+            # Commits on this connection leave its data_version unchanged, so the loaded records stay current
+        self.version += 1
+        super()._apply(changes, df_view)
+
+    def _db_column(self, values, col):
+        """A frame column as a list of database values, converted column-wise (like _to_db_value)."""
+        missing = values.isna().to_numpy()
+        if col == 'owned_date':
+            dates = pd.to_datetime(values, errors='coerce')
+            if dates.dt.tz is None and not (dates.dt.microsecond.any() or dates.dt.nanosecond.any()):
+                text = np.datetime_as_string(dates.to_numpy(dtype='datetime64[s]'), unit='s') # Same text as Timestamp.isoformat()
+                return [None if skip else value for skip, value in zip(missing, text.tolist())]
+            return [self._to_db_value(col, value) for value in values] # Rare: sub-second or timezone-aware dates
+        if col == 'price_paid':
+            converted = pd.to_numeric(values, errors='coerce').astype(float).tolist()
+        elif col == 'quantity':
+            converted = pd.to_numeric(values, errors='coerce').fillna(0).astype(np.int64).tolist()
+        else:
+            converted = values.astype(str).tolist()
+        return [None if skip else value for skip, value in zip(missing, converted)]
+
+    def _apply_frame(self, changed, merged):
+        columns = [self._db_column(changed[col], col) for col in USER_COLLECTION_COLUMNS]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(COLLECTION_DB_UPSERT, zip(itertools.repeat(self.collection_id), *columns))
+        self.version += 1
+        super()._apply_frame(changed, merged)
+
+    def collection_totals(self):
+        return self._sql_stats._memo('totals', self._collection_totals)
+
+    def series_breakdown(self):
+        return self._sql_stats._memo('series', self._series_breakdown)
+
+    def _collection_totals(self):
+        with self._lock:
+            figure_types, total_figures, total_spent = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(quantity), 0), COALESCE(SUM(price_paid * quantity), 0) "
+                "FROM collection_items WHERE collection_id = ? AND quantity > 0",
+                (self.collection_id,)
+            ).fetchone()
+        return {'figure_types': figure_types, 'total_figures': int(total_figures), 'total_spent': float(total_spent)}
+
+    def _series_breakdown(self):
+        with self._lock:
+            return pd.read_sql_query(
+                "SELECT series_name, sub_series_name, COUNT(*) AS figure_types, SUM(quantity) AS figures, "
+                "COALESCE(SUM(price_paid * quantity), 0) AS spent FROM collection_items "
+                "WHERE collection_id = ? AND quantity > 0 GROUP BY series_name, sub_series_name ORDER BY spent DESC",
+                self._conn, params=(self.collection_id,)
+            )
+
+
+def prepare_collection_upload(df):
+    """Validates and types an uploaded collection frame into USER_COLLECTION_COLUMNS.
+
+    Raises ValueError if a required column is missing. 'quantity' defaults to 1 and 'source' to
+    "CSV Upload"; other optional columns default to missing.
+    """
+    required_upload_cols = ['figure_name', 'series_name', 'sub_series_name', 'price_paid'] # quantity is optional
+    missing_upload_cols = [col for col in required_upload_cols if col not in df.columns]
+    if missing_upload_cols:
+        raise ValueError(f"Uploaded CSV is missing required columns: {', '.join(missing_upload_cols)}.")
+
+    df = df.copy()
+    for col_uc in USER_COLLECTION_COLUMNS:
+        if col_uc not in df.columns:
+            df[col_uc] = 1 if col_uc == 'quantity' else pd.NA # Default quantity to 1 if not in CSV
+    df['price_paid'] = pd.to_numeric(df['price_paid'], errors='coerce')
+    df['owned_date'] = pd.to_datetime(df['owned_date'], errors='coerce')
+    df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce').fillna(1).astype(int)
+    df['source'] = df['source'].fillna("CSV Upload")
+    return df[USER_COLLECTION_COLUMNS]
+
+def read_collection_csv(path_or_buffer):
+    """Reads a collection CSV into a new CollectionStore."""
+    store = CollectionStore()
+    store.bulk_upsert(prepare_collection_upload(pd.read_csv(path_or_buffer)))
+    return store
+
+def filter_and_sort_figures(figures_df, search_text, sort_column, descending=False):
+    """Case-insensitive search over figure/character/sub-series names, then a stable sort."""
+    if search_text:
+        needle = search_text.strip().lower()
+        matches = np.zeros(len(figures_df), dtype=bool)
+        for col in ['figure_name', 'character_series_name', 'series']:
+            matches |= figures_df[col].str.lower().str.contains(needle, regex=False).to_numpy(dtype=bool)
+        figures_df = figures_df[matches]
+    return figures_df.sort_values(sort_column, ascending=not descending, kind='mergesort')
+
+def apply_figure_ownership(store, fig_row, owned, quantity):
+    """Applies the Own checkbox and quantity for one catalog figure to the collection store."""
+    fig_name = fig_row['figure_name']
+    owned_entry = store.get(fig_name)
+    if owned: # If checkbox is checked
+        if owned_entry is not None: # Figure exists in user collection
+            updates = {'quantity': quantity}
+            # If it was marked owned, update price to current box price, and series info
+            if owned_entry['source'] == 'Marked Owned' or pd.isna(owned_entry['source']):
+                updates.update(price_paid=catalog_price(fig_row['price']), series_name=fig_row['character_series_name'], sub_series_name=fig_row['series'])
+            store.upsert(fig_name, updates)
+        else: # Figure does not exist, add new entry
+            store.upsert(fig_name, {
+                'series_name': fig_row['character_series_name'],
+                'sub_series_name': fig_row['series'],
+                'price_paid': catalog_price(fig_row['price']),
+                'owned_date': pd.NaT,
+                'source': 'Marked Owned',
+                'quantity': quantity
+            })
+    elif owned_entry is not None: # If checkbox is NOT checked
+        # Set quantity to 0. The entry remains but won't be counted as "owned" in stats.
+        store.upsert(fig_name, {'quantity': 0})
+
+# --- Probability Engine ---
+# Exact coupon-collector maths for unequal pull probabilities, via inclusion-exclusion over target subsets:
+#   P(all targets within n boxes) = sum over subsets S of (-1)^|S| * (1 - p_S)^n
+#   E[boxes to collect all]       = sum over non-empty S of (-1)^(|S|+1) / p_S
+# Subsets with the same probability mass are merged as they are built, so a 12-figure series of
+# equal odds plus a secret collapses from 8192 terms to a few dozen. Kernels are memoized at module
+# level; the app imports this module once per process, so the caches survive Streamlit reruns.
+
+MAX_COMPLETION_TARGETS = 20 # Inclusion-exclusion is exponential in the number of distinct targets
+MAX_COMPLETION_CELLS = 50_000_000 # Subset masses x boxes evaluated for one CDF (about half a second)
+COMPLETION_CHUNK_CELLS = 1 << 20  # Subset masses x boxes held in memory at once
+PROBABILITY_SUM_TOLERANCE = 1e-6 # Float32 catalog odds of a full series can add up to a hair over 1
+
+def _probability_key(target_probabilities):
+    """Order-independent, hashable memo key for a probability vector."""
+    probs = tuple(sorted(round(float(p), 12) for p in target_probabilities))
+    if not probs:
+        raise ValueError("At least one target probability is required.")
+    if len(probs) > MAX_COMPLETION_TARGETS:
+        raise ValueError(f"Exact completion odds support at most {MAX_COMPLETION_TARGETS} targets at once.")
+    total = sum(probs)
+    if probs[0] <= 0 or total > 1 + PROBABILITY_SUM_TOLERANCE:
+        raise ValueError("Target probabilities must be positive and sum to at most 1.")
+    if total > 1: # Rounding overshoot only; renormalize so every subset mass stays within [0, 1]
+        probs = tuple(round(p / total, 12) for p in probs)
+    return probs
+
+@functools.lru_cache(maxsize=256)
+def _completion_terms(probability_key):
+    """Distinct subset masses p_S and their summed inclusion-exclusion signs (empty set included)."""
+    masses, signs = np.zeros(1), np.ones(1)
+    for p in probability_key:
+        merged_masses = np.round(np.concatenate([masses, masses + p]), 12)
+        masses, inverse = np.unique(merged_masses, return_inverse=True)
+        signs = np.bincount(inverse, weights=np.concatenate([signs, -signs]))
+        keep = signs != 0
+        masses, signs = masses[keep], signs[keep]
+    return masses, signs
+
+@functools.lru_cache(maxsize=256)
+def _completion_cdf(probability_key, max_boxes):
+    masses, signs = _completion_terms(probability_key)
+    if len(masses) * (max_boxes + 1) > MAX_COMPLETION_CELLS:
+        raise ValueError("Too many targets with different odds to compute exact completion odds this far out.")
+    with np.errstate(divide='ignore'): # log(0) for a subset holding all the mass
+        log_misses = np.log(np.clip(1 - masses, 0, 1))
+    cdf = np.empty(max_boxes + 1)
+    step = max(1, COMPLETION_CHUNK_CELLS // len(masses)) # Boxes per chunk, so the power matrix stays small
+    for start in range(0, max_boxes + 1, step):
+        boxes = np.arange(start, min(start + step, max_boxes + 1))
+        with np.errstate(invalid='ignore'): # -inf * 0 at box 0
+            powers = np.exp(np.outer(log_misses, boxes)) # exp/log is much cheaper than power
+        if start == 0:
+            powers[:, 0] = 1.0
+        cdf[boxes] = signs @ powers
+    cdf = np.maximum.accumulate(np.clip(cdf, 0, 1)) # Guard against round-off making the CDF dip
+    cdf.flags.writeable = False # Shared by every caller through the cache
+    return cdf
+
+def completion_cdf(target_probabilities, max_boxes):
+    """P(every target collected within n boxes) for n = 0..max_boxes, as one NumPy array."""
+    return _completion_cdf(_probability_key(target_probabilities), int(max_boxes))
+
+@functools.lru_cache(maxsize=256)
+def _expected_boxes(probability_key):
+    masses, signs = _completion_terms(probability_key)
+    nonempty = masses > 0
+    return float(-(signs[nonempty] / masses[nonempty]).sum())
+
+def expected_boxes_to_complete(target_probabilities):
+    """Expected number of boxes needed to pull every target at least once."""
+    return _expected_boxes(_probability_key(target_probabilities))
+
+def completion_horizon(target_probabilities, confidence=0.99):
+    """Upper bound on the boxes needed to finish with the given confidence (union bound on the rarest target)."""
+    probs = _probability_key(target_probabilities)
+    if probs[0] >= 1:
+        return 1
+    return max(1, int(np.ceil(np.log((1 - confidence) / len(probs)) / np.log1p(-probs[0]))))
+
+def boxes_for_completion_probability(target_probabilities, level):
+    """Smallest number of boxes n with P(all targets within n boxes) >= level."""
+    cdf = completion_cdf(target_probabilities, completion_horizon(target_probabilities, max(level, 0.99)))
+    return int(np.searchsorted(cdf, level))
+
+# --- Purchase Optimizer ---
+def optimize_purchase_plan(targets_df, budget, series_total_probability=None):
+    """Splits a dollar budget across sub-series to maximize the expected number of distinct targets pulled.
+
+    `targets_df` has one row per unowned target with 'series', 'character_series_name', 'price' and
+    'probability'. Buying b boxes of a sub-series yields sum(1 - (1 - p)^b) expected targets over its
+    targets, which is concave in b, so boxes are bought greedily by expected targets gained per dollar.
+    `series_total_probability` (series -> summed listed odds) rescales series whose odds add up to over 100%.
+
+    Returns a dict with 'plan' (boxes per sub-series), 'curve' (expected targets after each purchase),
+    'expected_targets', 'spend' and 'marginal_value' (expected targets per extra dollar at the budget).
+    """
+    plan_columns = ['series', 'character_series_name', 'box_price', 'boxes', 'spend', 'expected_targets', 'targets']
+    series_groups = [(series, group) for series, group in targets_df.groupby('series', sort=True, observed=True) if group['price'].iloc[0] > 0]
+    candidate_series, candidate_boxes, candidate_cost, candidate_gain = [], [], [], []
+    for series_index, (series, group) in enumerate(series_groups):
+        box_price = catalog_price(group['price'].iloc[0])
+        max_boxes = int(budget // box_price)
+        probs = group['probability'].to_numpy(dtype=float)
+        if series_total_probability is not None:
+            probs = probs / max(1.0, series_total_probability.get(series, 1.0))
+        # One box past what the budget affords (even for series it affords none of), to price extra budget
+        box_numbers = np.arange(1, max_boxes + 2)
+        # Expected new targets from box b: sum over targets of p * (1 - p)^(b - 1)
+        gains = (probs[:, None] * np.power.outer(1 - probs, box_numbers - 1)).sum(axis=0)
+        candidate_series.append(np.full(len(box_numbers), series_index))
+        candidate_boxes.append(box_numbers)
+        candidate_cost.append(np.full(len(box_numbers), box_price))
+        candidate_gain.append(gains)
+
+    boxes_bought = np.zeros(len(series_groups), dtype=int)
+    curve_spend, curve_gain = [0.0], [0.0]
+    marginal_value = 0.0
+    if candidate_series:
+        series_idx, box_number, cost, gain = (np.concatenate(parts) for parts in (candidate_series, candidate_boxes, candidate_cost, candidate_gain))
+        affordable = box_number * cost <= budget # The extra box per series never enters the greedy fill
+        # Within a series gains shrink with every box, so sorting by gain per dollar keeps each series' boxes in order
+        order = np.lexsort((box_number, -gain / cost))
+        order = order[affordable[order]]
+        remaining = float(budget)
+        cheapest_box = cost[affordable].min() if affordable.any() else np.inf
+        for idx in order:
+            if remaining + 1e-9 < cheapest_box:
+                break # Nothing else fits
+            if box_number[idx] != boxes_bought[series_idx[idx]] + 1 or cost[idx] > remaining + 1e-9:
+                continue # An earlier box of this series was unaffordable, or this one is
+            boxes_bought[series_idx[idx]] += 1
+            remaining -= cost[idx]
+            curve_spend.append(curve_spend[-1] + cost[idx])
+            curve_gain.append(curve_gain[-1] + gain[idx])
+        next_boxes = box_number == boxes_bought[series_idx] + 1 # The best box not bought sets the value of more budget
+        marginal_value = float((gain[next_boxes] / cost[next_boxes]).max())
+
+    plan_rows = []
+    for (series, group), bought in zip(series_groups, boxes_bought):
+        if bought == 0:
+            continue
+        probs = group['probability'].to_numpy(dtype=float)
+        if series_total_probability is not None:
+            probs = probs / max(1.0, series_total_probability.get(series, 1.0))
+        box_price = catalog_price(group['price'].iloc[0])
+        plan_rows.append({
+            'series': series,
+            'character_series_name': group['character_series_name'].iloc[0],
+            'box_price': box_price,
+            'boxes': int(bought),
+            'spend': bought * box_price,
+            'expected_targets': float((1 - (1 - probs) ** bought).sum()),
+            'targets': ", ".join(group['figure_name'])
+        })
+    plan_df = pd.DataFrame(plan_rows, columns=plan_columns).sort_values('expected_targets', ascending=False, ignore_index=True)
+    return {
+        'plan': plan_df,
+        'curve': pd.DataFrame({'spend': curve_spend, 'expected_targets': curve_gain}),
+        'expected_targets': curve_gain[-1],
+        'spend': curve_spend[-1],
+        'marginal_value': marginal_value
+    }
+
+
+# --- Reports ---
+# Plain-dict summaries shared by the batch CLI and anything else that runs without the app.
+
+COMPLETION_REPORT_LEVELS = (0.5, 0.9) # Share of collectors finishing within the reported box counts
+
+def _records(df):
+    """DataFrame rows as dicts with missing values as None (JSON-safe)."""
+    columns = [[None if pd.isna(value) else value for value in df[col].tolist()] for col in df.columns]
+    return [dict(zip(df.columns, values)) for values in zip(*columns)]
+
+def rescaled_probabilities(catalog_df):
+    """Pull odds divided by their sub-series total wherever a sub-series' listed odds add up to over 100%."""
+    probabilities = catalog_df['probability'].astype(float)
+    series_totals = probabilities.groupby(catalog_df['series'], observed=True).transform('sum')
+    return probabilities / series_totals.clip(lower=1.0)
+
+def collection_report(store):
+    """Totals and series/source/month breakdowns of a collection."""
+    totals = store.collection_totals()
+    return {
+        **totals,
+        'avg_cost_per_figure': totals['total_spent'] / totals['total_figures'] if totals['total_figures'] else 0.0,
+        'by_series': _records(store.series_breakdown()),
+        'by_source': _records(store.stats.breakdown('source')),
+        'by_month': _records(store.stats.breakdown('month'))
+    }
+
+def completion_report(catalog_df, store, target_names=None):
+    """Odds of finishing the unowned targets of each sub-series, one dict per sub-series.
+
+    Without `target_names`, every unowned figure of each sub-series the collection has started
+    counts as a target.
+    """
+    figure_names = catalog_df['figure_name'].to_numpy()
+    series_names = catalog_df['series'].to_numpy()
+    probabilities = rescaled_probabilities(catalog_df).to_numpy()
+    is_owned = np.isin(figure_names, store.owned_dataframe()['figure_name'].to_numpy())
+    if target_names is None:
+        wanted = ~is_owned & np.isin(series_names, series_names[is_owned])
+    else:
+        wanted = ~is_owned & np.isin(figure_names, list(target_names))
+
+    rows = []
+    for series in sorted(set(series_names[wanted])): # Plain NumPy masks; a catalog is only a few hundred rows
+        in_series = wanted & (series_names == series)
+        first = np.flatnonzero(in_series)[0]
+        box_price = catalog_price(catalog_df['price'].iat[first])
+        row = {
+            'series': series,
+            'character_series_name': catalog_df['character_series_name'].iat[first],
+            'box_price': box_price,
+            'targets': figure_names[in_series].tolist()
+        }
+        probs = probabilities[in_series]
+        try:
+            expected_boxes = expected_boxes_to_complete(probs)
+            row.update(expected_boxes=expected_boxes, expected_cost=expected_boxes * box_price)
+            for level in COMPLETION_REPORT_LEVELS:
+                row[f"boxes_p{round(level * 100)}"] = boxes_for_completion_probability(probs, level)
+        except ValueError as e: # Too many targets for exact odds
+            row['error'] = str(e)
+        rows.append(row)
+    return rows
+
+def purchase_plan_report(catalog_df, store, target_names, budget):
+    """Best split of `budget` across sub-series for the collection's unowned targets."""
+    targets_df = catalog_df[
+        catalog_df['figure_name'].isin(target_names) & ~catalog_df['figure_name'].isin(store.owned_dataframe()['figure_name'])
+    ]
+    plan = optimize_purchase_plan(targets_df, budget, catalog_df['probability'].astype(float).groupby(catalog_df['series'], observed=True).sum())
+    return {
+        'budget': float(budget),
+        'expected_targets': float(plan['expected_targets']),
+        'spend': float(plan['spend']),
+        'marginal_value': plan['marginal_value'],
+        'plan': _records(plan['plan'])
+    }
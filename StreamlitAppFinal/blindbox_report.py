@@ -0,0 +1,115 @@
+"""Batch collection reports without starting the Streamlit app.
+
+Reads any number of collection CSVs (the same format as the app's upload) and writes one JSON line
+per collection with its stats and completion odds, plus a purchase plan when a budget is given:
+
+    python blindbox_report.py collections/ --output reports.jsonl
+    python blindbox_report.py alice.csv bob.csv --target "Poppy: Baddie on Bass" --budget 100 --workers 4
+
+Without --target, every unowned figure of each sub-series a collection has started is a target.
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import json
+import math
+import numbers
+import os
+import sys
+import time
+
+from blindbox_engine import (
+    LOCAL_DATA_PATH, collection_report, completion_report, parse_master_catalog, purchase_plan_report,
+    read_catalog_source, read_collection_csv
+)
+
+_catalog_df = None # Parsed once per worker process
+
+
+def _load_catalog(catalog_source):
+    global _catalog_df
+    _catalog_df = parse_master_catalog(read_catalog_source(catalog_source)[0])
+
+
+def _json_default(value):
+    if hasattr(value, 'item'): # NumPy scalars
+        return value.item()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _json_safe(value):
+    """`value` with NaN and infinite numbers (e.g. the spend of an unpriced series) replaced by None."""
+    if isinstance(value, dict):
+        return {key: _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(item) for item in value]
+    if isinstance(value, numbers.Real) and not isinstance(value, numbers.Integral) and not math.isfinite(value):
+        return None
+    return value
+
+
+def build_report(collection_path, target_names=None, budget=None):
+    """One collection's report as a dict; failures are reported in an 'error' field instead of raised."""
+    report = {'collection': collection_path}
+    try:
+        store = read_collection_csv(collection_path)
+        report['stats'] = collection_report(store)
+        report['completion'] = completion_report(_catalog_df, store, target_names)
+        if budget is not None and target_names:
+            report['purchase_plan'] = purchase_plan_report(_catalog_df, store, target_names, budget)
+    except Exception as e: # One bad file should not stop the batch
+        report['error'] = f"{type(e).__name__}: {e}"
+    return report
+
+
+def expand_paths(paths):
+    """Files as given, directories expanded to the CSVs they contain (sorted)."""
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            expanded.extend(sorted(glob.glob(os.path.join(path, '*.csv'))))
+        else:
+            expanded.append(path)
+    return expanded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute collection stats and completion odds for many collection CSVs.")
+    parser.add_argument('paths', nargs='+', help="Collection CSV files or directories of them")
+    parser.add_argument('--catalog', default=LOCAL_DATA_PATH, help="Master catalog CSV path or URL (default: bundled box_data.csv)")
+    parser.add_argument('--target', action='append', dest='targets', help="Target figure name (repeatable)")
+    parser.add_argument('--budget', type=float, help="Budget in dollars for a purchase plan over the targets")
+    parser.add_argument('--output', default='-', help="JSON Lines output file (default: stdout)")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes (default: 1)")
+    args = parser.parse_args(argv)
+
+    collection_paths = expand_paths(args.paths)
+    started = time.perf_counter()
+    _load_catalog(args.catalog)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    failed = 0
+    pool = None
+    try:
+        if args.workers > 1 and len(collection_paths) > 1:
+            pool = concurrent.futures.ProcessPoolExecutor(max_workers=args.workers, initializer=_load_catalog, initargs=(args.catalog,))
+            reports = pool.map(build_report, collection_paths, [args.targets] * len(collection_paths),
+                               [args.budget] * len(collection_paths), chunksize=max(1, len(collection_paths) // (args.workers * 4)))
+        else:
+            reports = (build_report(path, args.targets, args.budget) for path in collection_paths)
+        for report in reports: # Written in input order as they complete
+            failed += 'error' in report
+            output.write(json.dumps(_json_safe(report), default=_json_default, allow_nan=False) + '\n') # Strict JSON: no NaN
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True) # Also on errors and Ctrl+C, so no worker is left running
+        if output is not sys.stdout:
+            output.close()
+    print(f"Wrote {len(collection_paths)} reports ({failed} failed) in {time.perf_counter() - started:.1f}s.", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""Seeded Monte Carlo simulation of buying blind boxes from one sub-series.
+
+Kept in its own module (no Streamlit imports) so simulation chunks can be pickled to a process
+pool and results stay cached across Streamlit reruns.
+
+Boxes are independent draws, so a trial is split into two independent streams: the boxes that
+hold a target and the boxes that do not. The target stream is simulated one *new* target at a
+time: the wait is geometric in the share of target mass still missing, and which target
+arrives is a categorical draw. Targets with equal odds are grouped, so a trial's state is just
+"how many are still missing per odds class". The non-target boxes are then interleaved with a
+negative binomial (or a binomial for a fixed budget). Distinct non-target figures are sampled
+from exact occupancy tables. Every step is one vectorized operation over all trials in a chunk.
+"""
+
+import concurrent.futures
+import functools
+
+import numpy as np
+import pandas as pd
+
+# Stopping rules
+STOP_ALL_TARGETS = "all"  # Keep buying until every target has been pulled
+STOP_ANY_TARGET = "any"   # Stop at the first target
+STOP_BUDGET = "budget"    # Buy exactly as many boxes as the budget covers
+
+SIMULATION_CHUNK_TRIALS = 200_000 # Trials per chunk; each chunk gets its own child seed
+SIMULATION_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def _odds_classes(probs):
+    """Groups equal probabilities: returns (distinct probabilities, how many figures share each)."""
+    return np.unique(np.round(probs, 12), return_counts=True)
+
+
+def _geometric(rng, p):
+    """Geometric draws (trials to first success) by inverse transform; several times faster than rng.geometric."""
+    with np.errstate(divide='ignore'):
+        waits = 1 + np.floor(np.log(rng.random(len(p))) / np.log1p(-np.minimum(p, 1.0)))
+    return np.where(p >= 1.0, 1, waits).astype(np.int64)
+
+
+def _occupancy_cdf(n_figures, max_draws):
+    """cdf[x, d] = P(at most d distinct figures seen after x draws from n_figures equally likely ones)."""
+    pmf = np.zeros((max_draws + 1, n_figures + 1))
+    pmf[0, 0] = 1.0
+    seen = np.arange(n_figures + 1)
+    for x in range(max_draws):
+        pmf[x + 1] = pmf[x] * seen / n_figures
+        pmf[x + 1, 1:] += pmf[x, :-1] * (n_figures - seen[:-1]) / n_figures
+    return np.cumsum(pmf, axis=1)
+
+
+def _distinct_new_figures(rng, draws, new_probs, other_mass):
+    """Distinct figures from `new_probs` seen in `draws` boxes drawn from those figures plus `other_mass`."""
+    distinct = np.zeros(len(draws), dtype=np.int64)
+    class_probs, class_sizes = _odds_classes(new_probs)
+    remaining_draws, remaining_mass = draws.copy(), class_probs @ class_sizes + other_mass
+    for prob, size in zip(class_probs, class_sizes):
+        share = prob * size / remaining_mass if remaining_mass > 0 else 0.0
+        class_draws = rng.binomial(remaining_draws, min(share, 1.0))
+        remaining_draws -= class_draws
+        remaining_mass -= prob * size
+        cdf = _occupancy_cdf(int(size), int(class_draws.max(initial=0)))
+        distinct += (cdf[class_draws] < rng.random(len(draws))[:, None]).sum(axis=1)
+    return distinct
+
+
+def _simulate_chunk(probabilities, target_mask, owned_mask, stop_rule, max_boxes, n_trials, seed_seq):
+    """Simulates one chunk of trials. Returns (boxes, duplicates, targets_collected)."""
+    rng = np.random.default_rng(seed_seq)
+    target_mass = probabilities[target_mask].sum()
+    class_probs, class_sizes = _odds_classes(probabilities[target_mask] / target_mass)
+    n_steps = 1 if stop_rule == STOP_ANY_TARGET else int(class_sizes.sum())
+
+    # Target stream: target draws needed to see the 1st, 2nd, ... new target
+    missing = [np.full(n_trials, size, dtype=np.int64) for size in class_sizes] # Still-missing targets per odds class
+    target_draws = np.zeros((n_steps, n_trials), dtype=np.int64)
+    draws_so_far = np.zeros(n_trials, dtype=np.int64)
+    for step in range(n_steps):
+        class_masses = [count * prob for count, prob in zip(missing, class_probs)]
+        missing_mass = sum(class_masses)
+        draws_so_far += _geometric(rng, missing_mass)
+        target_draws[step] = draws_so_far
+        if step + 1 < n_steps: # Which odds class the new target came from
+            threshold = rng.random(n_trials) * missing_mass
+            not_picked = np.ones(n_trials, dtype=bool)
+            for count, class_mass in zip(missing[:-1], class_masses[:-1]):
+                picked = not_picked & (threshold < class_mass)
+                count -= picked
+                threshold -= class_mass
+                not_picked &= ~picked
+            missing[-1] -= not_picked
+
+    if stop_rule == STOP_BUDGET:
+        boxes = np.full(n_trials, max_boxes, dtype=np.int64)
+        targets_drawn = rng.binomial(max_boxes, min(target_mass, 1.0), size=n_trials)
+        collected = (target_draws <= targets_drawn).sum(axis=0)
+    else:
+        targets_drawn = target_draws[-1]
+        collected = np.full(n_trials, n_steps)
+        boxes = targets_drawn.copy()
+        if target_mass < 1.0: # Non-target boxes opened alongside the target draws
+            boxes += rng.negative_binomial(targets_drawn, target_mass)
+    other_draws = boxes - targets_drawn
+
+    # Non-target boxes: unowned figures are new, owned ones are duplicates
+    new_other_probs = probabilities[~target_mask & ~owned_mask]
+    owned_other_mass = probabilities[~target_mask & owned_mask].sum()
+    new_others = 0
+    if len(new_other_probs):
+        new_others = _distinct_new_figures(rng, other_draws, new_other_probs, owned_other_mass)
+    duplicates = boxes - collected - new_others
+    return boxes, duplicates, collected.astype(np.int16)
+
+
+@functools.lru_cache(maxsize=8)
+def _simulate_cached(probabilities, target_mask, owned_mask, stop_rule, max_boxes, n_trials, seed, n_workers):
+    probabilities = np.asarray(probabilities)
+    target_mask = np.asarray(target_mask)
+    owned_mask = np.asarray(owned_mask)
+    chunk_sizes = [SIMULATION_CHUNK_TRIALS] * (n_trials // SIMULATION_CHUNK_TRIALS)
+    if n_trials % SIMULATION_CHUNK_TRIALS:
+        chunk_sizes.append(n_trials % SIMULATION_CHUNK_TRIALS)
+    # Child seeds depend only on (seed, chunk), so results are identical with or without a pool
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    args = [(probabilities, target_mask, owned_mask, stop_rule, max_boxes, size, seq) for size, seq in zip(chunk_sizes, seeds)]
+
+    if n_workers > 1 and len(args) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as pool:
+            chunks = list(pool.map(_simulate_chunk, *zip(*args)))
+    else:
+        chunks = [_simulate_chunk(*chunk_args) for chunk_args in args]
+
+    boxes, duplicates, collected = (np.concatenate(parts) for parts in zip(*chunks))
+    n_targets = int(target_mask.sum())
+    result = {
+        'boxes': boxes,
+        'duplicates': duplicates,
+        'targets_collected': collected,
+        'completed': collected >= (1 if stop_rule == STOP_ANY_TARGET else n_targets),
+    }
+    for values in result.values():
+        values.flags.writeable = False # Cached and shared between callers
+    return result
+
+
+def simulate_box_openings(probabilities, target_mask, owned_mask, stop_rule=STOP_ALL_TARGETS, max_boxes=None,
+                          n_trials=1_000_000, seed=0, n_workers=1):
+    """Simulates buying boxes from one sub-series until the stopping rule is met.
+
+    `probabilities` holds the pull odds of every figure in the sub-series (rescaled to sum to 1),
+    `target_mask` marks the figures being chased and `owned_mask` the figures already owned; owned
+    targets are not chased. `max_boxes` caps every trial for the budget rule. Returns a dict of
+    read-only per-trial arrays: 'boxes', 'duplicates', 'targets_collected' and 'completed'.
+    Results are cached per parameter set and reproducible from `seed`.
+    """
+    probabilities = np.asarray(probabilities, dtype=float)
+    if probabilities.ndim != 1 or len(probabilities) == 0 or (probabilities < 0).any() or probabilities.sum() <= 0:
+        raise ValueError("Probabilities must be a non-empty vector of non-negative odds.")
+    probabilities = probabilities / probabilities.sum()
+    owned_mask = np.asarray(owned_mask, dtype=bool)
+    target_mask = np.asarray(target_mask, dtype=bool) & ~owned_mask
+    if not target_mask.any():
+        raise ValueError("There are no unowned targets to simulate.")
+    if (probabilities[target_mask] <= 0).any():
+        raise ValueError("Every target needs a positive pull probability.")
+    if stop_rule not in (STOP_ALL_TARGETS, STOP_ANY_TARGET, STOP_BUDGET):
+        raise ValueError(f"Unknown stopping rule: {stop_rule!r}")
+    if stop_rule == STOP_BUDGET:
+        if max_boxes is None or max_boxes < 0:
+            raise ValueError("The budget rule needs a non-negative box cap.")
+        max_boxes = int(max_boxes)
+    else:
+        max_boxes = None
+    return _simulate_cached(
+        tuple(probabilities.round(12)), tuple(target_mask), tuple(owned_mask),
+        stop_rule, max_boxes, int(n_trials), int(seed), int(n_workers)
+    )
+
+
+def summarize_simulation(result, box_price, percentiles=SIMULATION_PERCENTILES):
+    """Mean and percentile bands of boxes, cost and duplicates, one row per measure."""
+    rows = {
+        'Boxes Opened': result['boxes'],
+        'Cost ($)': result['boxes'] * box_price,
+        'Duplicates': result['duplicates'],
+        'Targets Collected': result['targets_collected'],
+    }
+    summary = pd.DataFrame(
+        {name: np.percentile(values, percentiles) for name, values in rows.items()},
+        index=[f"P{p}" for p in percentiles]
+    ).T
+    summary.insert(0, 'Mean', [values.mean() for values in rows.values()])
+    return summary
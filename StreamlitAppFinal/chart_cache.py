@@ -0,0 +1,149 @@
+"""Content-addressed render cache for the app's matplotlib/seaborn charts.
+
+Each chart is identified by a hash of its renderer, the plotted arrays and its styling. The rendered
+PNG/SVG bytes are kept in a size-bounded LRU cache, so an unchanged chart is served without running
+matplotlib. matplotlib and seaborn are only imported when a chart actually has to be drawn.
+"""
+
+import collections
+import hashlib
+import io
+import threading
+
+import numpy as np
+
+CHART_CACHE_MAX_BYTES = 64 * 1024 * 1024 # Memory cap for rendered chart bytes
+CHART_DPI = 150
+
+
+def _pyplot():
+    """Imports pyplot on first use with a non-interactive backend."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _percent_axis(axis):
+    import matplotlib.ticker as mticker
+    axis.set_major_formatter(mticker.PercentFormatter(xmax=1.0))
+
+
+def _figure_bytes(fig, fmt):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=CHART_DPI, bbox_inches='tight')
+    _pyplot().close(fig)
+    return buffer.getvalue()
+
+
+class ChartRenderCache:
+    """LRU cache of rendered chart bytes, keyed by a hash of the chart's data and styling."""
+
+    def __init__(self, max_bytes=CHART_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict() # key -> bytes, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def chart_key(renderer, arrays, style):
+        """Hash of the renderer's name, every plotted array (dtype, shape and bytes) and the styling."""
+        digest = hashlib.sha256(f"{renderer.__module__}.{renderer.__qualname__}".encode())
+        for values in arrays:
+            values = np.ascontiguousarray(values)
+            digest.update(f"{values.dtype.str}{values.shape}".encode())
+            digest.update(values.tobytes() if values.dtype != object else repr(values.tolist()).encode())
+        digest.update(repr(sorted(style.items())).encode())
+        return digest.hexdigest()
+
+    def render(self, renderer, *arrays, fmt="png", **style):
+        """Returns the chart's bytes, calling `renderer(*arrays, fmt=fmt, **style)` only on a cache miss."""
+        key = self.chart_key(renderer, arrays, {**style, 'fmt': fmt})
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        rendered = renderer(*arrays, fmt=fmt, **style)
+        with self._lock:
+            self.misses += 1
+            if key not in self._entries and len(rendered) <= self.max_bytes:
+                self._entries[key] = rendered
+                self._total_bytes += len(rendered)
+                while self._total_bytes > self.max_bytes: # Evict least recently used charts
+                    _, evicted = self._entries.popitem(last=False)
+                    self._total_bytes -= len(evicted)
+        return rendered
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+
+# --- Renderers ---
+# Each takes NumPy arrays plus keyword styling and returns the encoded image bytes.
+
+def render_price_histogram(prices, weights, *, title, xlabel, ylabel, bins, fmt="png"):
+    plt = _pyplot()
+    import seaborn as sns
+    fig, ax = plt.subplots()
+    sns.histplot(x=prices, weights=weights, kde=len(prices) > 1, ax=ax, bins=bins) # KDE needs more than one distinct price
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    return _figure_bytes(fig, fmt)
+
+
+def render_probability_curve(box_counts, probs, *, title, xlabel, ylabel, fmt="png"):
+    plt = _pyplot()
+    import seaborn as sns
+    fig, ax = plt.subplots()
+    sns.lineplot(x=box_counts, y=probs, ax=ax, marker='o')
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    _percent_axis(ax.yaxis)
+    ax.grid(True, linestyle='--', alpha=0.7)
+    return _figure_bytes(fig, fmt)
+
+
+def render_completion_chart(box_axis, cdf, expected_boxes, *, title, fmt="png"):
+    plt = _pyplot()
+    fig, ax = plt.subplots()
+    ax.plot(box_axis, cdf[1:], label="P(All Targets) within N boxes")
+    ax.bar(box_axis, np.diff(cdf), color='tab:orange', alpha=0.5, label="P(Finish at exactly N)")
+    ax.axvline(float(expected_boxes), color='gray', linestyle=':', label="Expected boxes")
+    ax.set_title(title)
+    ax.set_xlabel("Number of Boxes")
+    ax.set_ylabel("Probability")
+    _percent_axis(ax.yaxis)
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.legend()
+    return _figure_bytes(fig, fmt)
+
+
+def render_share_bars(x, shares, *, width, title, xlabel, ylabel, fmt="png"):
+    plt = _pyplot()
+    fig, ax = plt.subplots()
+    ax.bar(x, shares, width=width)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    _percent_axis(ax.yaxis)
+    return _figure_bytes(fig, fmt)
+
+
+def render_step_curve(x, y, *, title, xlabel, ylabel, fmt="png"):
+    plt = _pyplot()
+    fig, ax = plt.subplots()
+    ax.step(x, y, where='post')
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.grid(True, linestyle='--', alpha=0.7)
+    return _figure_bytes(fig, fmt)
@@ -0,0 +1,240 @@
+"""Named timing spans for finding which section of a slow rerun is to blame.
+
+Profiling is off unless BLINDBOX_PROFILE is set; `span()` then returns a shared do-nothing object, so
+instrumented code costs (next to) nothing.
+
+    BLINDBOX_PROFILE=1             wall time, rows processed and net allocated memory blocks per span
+    BLINDBOX_PROFILE=tracemalloc   also net and peak bytes allocated (tracemalloc slows the app down a lot)
+    BLINDBOX_PROFILE_LOG=path      appends every rerun's spans to a JSON Lines file
+    BLINDBOX_PROFILE_PROM=path     rewrites Prometheus text metrics after every rerun (e.g. for node_exporter's textfile collector)
+
+Spans nest: a span opened inside another is recorded under its path ('main/stats_tab/chart.price_histogram').
+"""
+
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+PROFILE_MODE = os.environ.get("BLINDBOX_PROFILE", "").strip().lower()
+PROFILE_ENABLED = PROFILE_MODE not in ("", "0", "false", "off")
+PROFILE_TRACEMALLOC = PROFILE_MODE == "tracemalloc"
+PROFILE_LOG_PATH = os.environ.get("BLINDBOX_PROFILE_LOG")
+PROFILE_PROM_PATH = os.environ.get("BLINDBOX_PROFILE_PROM")
+
+# Upper bounds (seconds) of the Prometheus histogram buckets for span wall time
+SPAN_SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+if PROFILE_TRACEMALLOC and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+
+class _NullSpan:
+    """Stand-in returned while profiling is off."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def count(self, rows):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+_local = threading.local() # Per script thread: open span stack and the current rerun
+
+
+class Span:
+    """One timed section: wall time, rows processed and memory allocated between enter and exit."""
+    __slots__ = ('name', 'path', 'depth', 'rows', 'started_at', 'wall_seconds', 'alloc_blocks', 'alloc_bytes',
+                 'peak_bytes', 'error', '_start', '_start_blocks', '_start_bytes')
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self.path = name
+        self.depth = 0
+        self.started_at = None
+        self.wall_seconds = None
+        self.alloc_blocks = None
+        self.alloc_bytes = None
+        self.peak_bytes = None
+        self.error = None
+
+    def count(self, rows):
+        """Adds to the rows this span processed (for counts only known part-way through)."""
+        self.rows = (self.rows or 0) + int(rows)
+
+    def __enter__(self):
+        stack = _span_stack()
+        if stack:
+            self.path = f"{stack[-1].path}/{self.name}"
+            self.depth = len(stack)
+        stack.append(self)
+        run = getattr(_local, 'run', None)
+        if run is not None:
+            run.spans.append(self) # Recorded on entry, so parents come before their children
+        self.started_at = time.time()
+        if PROFILE_TRACEMALLOC:
+            self._start_bytes = tracemalloc.get_traced_memory()[0]
+        self._start_blocks = sys.getallocatedblocks()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall_seconds = time.perf_counter() - self._start
+        self.alloc_blocks = sys.getallocatedblocks() - self._start_blocks
+        if PROFILE_TRACEMALLOC:
+            current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            self.alloc_bytes = current_bytes - self._start_bytes
+            self.peak_bytes = peak_bytes # Process-wide peak since tracing started
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        stack = _span_stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        SPAN_REGISTRY.record(self)
+        return False
+
+    def as_dict(self):
+        record = {
+            'span': self.path,
+            'depth': self.depth,
+            'started_at': self.started_at,
+            'wall_ms': None if self.wall_seconds is None else round(self.wall_seconds * 1000, 3),
+            'rows': self.rows,
+            'alloc_blocks': self.alloc_blocks,
+        }
+        if PROFILE_TRACEMALLOC:
+            record['alloc_bytes'] = self.alloc_bytes
+            record['peak_bytes'] = self.peak_bytes
+        if self.error:
+            record['error'] = self.error
+        return record
+
+
+def _span_stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def span(name, rows=None):
+    """Context manager timing the enclosed block as `name`; a shared no-op while profiling is off."""
+    if not PROFILE_ENABLED:
+        return _NULL_SPAN
+    return Span(name, rows)
+
+
+class RerunProfile:
+    """Every span recorded during one script run, in the order they were entered."""
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.spans = []
+
+    def records(self):
+        return [dict(span.as_dict(), run=self.run_id) for span in self.spans]
+
+    def to_jsonl(self):
+        return "".join(json.dumps(record) + "\n" for record in self.records())
+
+
+@contextlib.contextmanager
+def profile_rerun(name="main"):
+    """Collects one rerun's spans under a root span `name`, then exports them (JSON Lines log, Prometheus file)."""
+    profile = RerunProfile(SPAN_REGISTRY.next_run_id())
+    _local.run = profile
+    _local.stack = []
+    try:
+        with Span(name):
+            yield profile
+    finally:
+        _local.run = None
+        export_rerun(profile)
+
+
+class SpanRegistry:
+    """Process-wide totals per span path (shared by every session), exported as Prometheus metrics."""
+
+    def __init__(self, buckets=SPAN_SECONDS_BUCKETS):
+        self.buckets = buckets
+        self._metrics = {} # path -> [count, seconds, rows, bucket counts, last alloc blocks, last alloc bytes]
+        self._runs = 0
+        self._lock = threading.Lock()
+
+    def next_run_id(self):
+        with self._lock:
+            self._runs += 1
+            return self._runs
+
+    def record(self, span):
+        with self._lock:
+            metric = self._metrics.get(span.path)
+            if metric is None:
+                metric = self._metrics[span.path] = [0, 0.0, 0, [0] * len(self.buckets), 0, None]
+            metric[0] += 1
+            metric[1] += span.wall_seconds
+            metric[2] += span.rows or 0
+            for i, upper in enumerate(self.buckets):
+                if span.wall_seconds <= upper:
+                    metric[3][i] += 1
+            metric[4] = span.alloc_blocks
+            metric[5] = span.alloc_bytes
+
+    def prometheus_text(self):
+        """Metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted((path, [m[0], m[1], m[2], list(m[3]), m[4], m[5]]) for path, m in self._metrics.items())
+        lines = [
+            "# HELP blindbox_span_seconds Wall time of instrumented app sections.",
+            "# TYPE blindbox_span_seconds histogram",
+        ]
+        for path, (count, seconds, _, bucket_counts, _, _) in metrics:
+            label = _prometheus_label(path)
+            for upper, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f'blindbox_span_seconds_bucket{{span="{label}",le="{upper}"}} {bucket_count}')
+            lines.append(f'blindbox_span_seconds_bucket{{span="{label}",le="+Inf"}} {count}')
+            lines.append(f'blindbox_span_seconds_sum{{span="{label}"}} {seconds:.6f}')
+            lines.append(f'blindbox_span_seconds_count{{span="{label}"}} {count}')
+        lines += ["# HELP blindbox_span_rows_total Rows processed by instrumented app sections.",
+                  "# TYPE blindbox_span_rows_total counter"]
+        lines += [f'blindbox_span_rows_total{{span="{_prometheus_label(path)}"}} {m[2]}' for path, m in metrics]
+        lines += ["# HELP blindbox_span_alloc_blocks Net memory blocks allocated by the latest run of each section.",
+                  "# TYPE blindbox_span_alloc_blocks gauge"]
+        lines += [f'blindbox_span_alloc_blocks{{span="{_prometheus_label(path)}"}} {m[4]}' for path, m in metrics]
+        if PROFILE_TRACEMALLOC:
+            lines += ["# HELP blindbox_span_alloc_bytes Net bytes allocated by the latest run of each section.",
+                      "# TYPE blindbox_span_alloc_bytes gauge"]
+            lines += [f'blindbox_span_alloc_bytes{{span="{_prometheus_label(path)}"}} {m[5]}' for path, m in metrics]
+        return "\n".join(lines) + "\n"
+
+
+def _prometheus_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+SPAN_REGISTRY = SpanRegistry()
+_export_lock = threading.Lock()
+
+
+def export_rerun(profile):
+    """Appends a rerun's spans to BLINDBOX_PROFILE_LOG and rewrites BLINDBOX_PROFILE_PROM, if set."""
+    if not PROFILE_LOG_PATH and not PROFILE_PROM_PATH:
+        return
+    with _export_lock:
+        if PROFILE_LOG_PATH:
+            with open(PROFILE_LOG_PATH, 'a', encoding='utf-8') as log_file:
+                log_file.write(profile.to_jsonl())
+        if PROFILE_PROM_PATH:
+            temp_path = f"{PROFILE_PROM_PATH}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as prom_file:
+                prom_file.write(SPAN_REGISTRY.prometheus_text())
+            os.replace(temp_path, PROFILE_PROM_PATH) # Scrapers never see a half-written file
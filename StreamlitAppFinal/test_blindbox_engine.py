@@ -0,0 +1,369 @@
+"""Checks for the app-independent catalog, collection, probability and optimizer code in blindbox_engine."""
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import blindbox_engine
+from blindbox_engine import (LOCAL_DATA_PATH, CatalogIndex, CatalogManifestCache, CollectionStats, CollectionStore,
+                             MasterCatalogCache, SQLiteCollectionStore, apply_figure_ownership,
+                             boxes_for_completion_probability, completion_cdf, expected_boxes_to_complete,
+                             filter_and_sort_figures, optimize_purchase_plan)
+
+
+def make_targets(series_prices, targets_per_series=3, probability=1 / 12):
+    """Unowned-target frame with `targets_per_series` targets of equal odds in each {series: box price}."""
+    rows = [
+        {'series': series, 'character_series_name': f"{series} Character", 'figure_name': f"{series} #{i}",
+         'price': price, 'probability': probability}
+        for series, price in series_prices.items() for i in range(targets_per_series)
+    ]
+    return pd.DataFrame(rows)
+
+
+def markov_completion_cdf(probs, max_boxes):
+    """P(all targets pulled within n boxes), by stepping the distribution over collected-target sets box by box."""
+    full = (1 << len(probs)) - 1
+    dist = np.zeros(full + 1)
+    dist[0] = 1.0
+    cdf = [dist[full]]
+    for _ in range(max_boxes):
+        step = dist * (1 - sum(probs)) # Boxes holding no target
+        for i, p in enumerate(probs):
+            for state in range(full + 1):
+                step[state | (1 << i)] += dist[state] * p
+        dist = step
+        cdf.append(dist[full])
+    return np.array(cdf)
+
+
+# --- Catalog ---
+
+def test_catalog_is_parsed_once_and_shared_until_the_source_changes(tmp_path, monkeypatch):
+    parses = []
+    parse = blindbox_engine.parse_master_catalog
+    monkeypatch.setattr(blindbox_engine, 'parse_master_catalog', lambda raw: parses.append(raw) or parse(raw))
+    source = tmp_path / "box_data.csv"
+    shutil.copy(LOCAL_DATA_PATH, source)
+    cache = MasterCatalogCache([str(tmp_path / "missing.csv"), str(source)]) # The first source falls back to the second
+
+    df, index, digest = cache.get()
+    again, again_index, again_digest = cache.get()
+    assert len(parses) == 1
+    assert again_index is index and again_digest == digest
+    again['price'] = 0.0 # Session edits stay private
+    assert (cache.get()[0]['price'] > 0).all()
+
+    source.write_bytes(source.read_bytes().rstrip() + b"\nNew,New Series,New Figure,$9.99,1/6,\n")
+    os.utime(source, (os.path.getmtime(source) + 5,) * 2)
+    refreshed, _, refreshed_digest = cache.get()
+    assert len(parses) == 2
+    assert refreshed_digest != digest
+    assert len(refreshed) == len(df) + 1
+
+
+CATALOG_CSV = b"""character_name,series_name,figure_name,price,probability,figure_photo
+Peach Riot,Rise Up,Poppy,$17.99,1/12,https://example.com/poppy.jpg
+Peach Riot,Rise Up,Gigi,$17.99,0.0833,
+Peach Riot,Rise Up,Poppy,$19.99,1/6,
+Skullpanda,The Sound,Echo,16.99,1/0,
+Skullpanda,The Sound,Secret,$16.99,1/144,
+"""
+
+
+def test_catalog_is_parsed_into_compact_types():
+    catalog = blindbox_engine.parse_master_catalog(CATALOG_CSV)
+    assert catalog['figure_name'].tolist() == ["Poppy", "Gigi", "Secret"] # Duplicates keep their first listing; 1/0 is dropped
+    assert all(catalog[col].dtype == 'category' for col in blindbox_engine.CATALOG_CATEGORY_COLUMNS)
+    assert all(catalog[col].dtype == np.float32 for col in blindbox_engine.CATALOG_FLOAT_COLUMNS)
+    assert [blindbox_engine.catalog_price(price) for price in catalog['price']] == [17.99, 17.99, 16.99]
+    np.testing.assert_allclose(catalog['probability'], [1 / 12, 0.0833, 1 / 144], rtol=1e-6)
+    assert catalog['figure_photo'].isna().tolist() == [False, True, True]
+    with pytest.raises(ValueError, match="probability"):
+        blindbox_engine.parse_master_catalog(b"character_name,series_name,figure_name,price\nA,B,C,$1\n")
+
+
+def test_manifest_sources_are_merged_and_only_changed_ones_reparsed(tmp_path, monkeypatch):
+    parses = []
+    parse = blindbox_engine.parse_master_catalog
+    monkeypatch.setattr(blindbox_engine, 'parse_master_catalog', lambda raw: parses.append(raw) or parse(raw))
+    header = "character_name,series_name,figure_name,price,probability\n"
+    (tmp_path / "series").mkdir()
+    rise_up, sound = tmp_path / "series" / "rise_up.csv", tmp_path / "series" / "sound.csv"
+    rise_up.write_text(header + "Peach Riot,Rise Up,Poppy,$17.99,1/12\n")
+    sound.write_text(header + "Skullpanda,The Sound,Echo,$16.99,1/12\nPeach Riot,Rise Up,Poppy,$1.00,1/2\n")
+    manifest = tmp_path / "catalog.txt"
+    manifest.write_text("# Per-series files\nseries/rise_up.csv\n\nseries/sound.csv\nseries/rise_up.csv\n")
+    cache = CatalogManifestCache(str(manifest), max_workers=2)
+
+    df, _, digest = cache.get()
+    assert sorted(df['figure_name']) == ["Echo", "Poppy"]
+    assert blindbox_engine.catalog_price(df.loc[df['figure_name'] == "Poppy", 'price'].iloc[0]) == 17.99 # First listing wins
+    assert len(parses) == 2
+    assert cache.get()[2] == digest and len(parses) == 2
+
+    sound.write_text(header + "Skullpanda,The Sound,Echo,$16.99,1/12\nSkullpanda,The Sound,Hush,$16.99,1/12\n")
+    os.utime(sound, (os.path.getmtime(sound) + 5,) * 2)
+    df, _, digest = cache.get()
+    assert len(parses) == 3 # Only the edited source
+    assert sorted(df['figure_name']) == ["Echo", "Hush", "Poppy"]
+
+    sound.unlink() # A failing source keeps serving its last good rows
+    os.utime(rise_up, (os.path.getmtime(rise_up) + 5,) * 2)
+    assert cache.get()[2] == digest
+    assert list(cache.errors) == [str(sound)]
+
+
+def test_catalog_index_rows_match_boolean_masks():
+    with open(LOCAL_DATA_PATH, 'rb') as fh:
+        catalog = blindbox_engine.parse_master_catalog(fh.read())
+    index = CatalogIndex(catalog)
+    assert index.character_series == sorted(catalog['character_series_name'].unique())
+    selection = {}
+    for character in index.character_series:
+        in_character = catalog['character_series_name'] == character
+        np.testing.assert_array_equal(index.rows(character), np.flatnonzero(in_character))
+        assert index.sub_series_options(character) == sorted(catalog.loc[in_character, 'series'].unique())
+        for sub_series in index.sub_series_options(character):
+            np.testing.assert_array_equal(index.rows(character, sub_series), np.flatnonzero(in_character & (catalog['series'] == sub_series)))
+        selection[character] = index.sub_series_options(character)[:1]
+    assert len(index.rows("No Such Series")) == 0
+
+    characters = list(selection)[::2]
+    rows = index.selection_rows(selection, characters)
+    expected = [np.flatnonzero((catalog['character_series_name'] == c) & catalog['series'].isin(selection[c])) for c in characters]
+    np.testing.assert_array_equal(rows, np.concatenate(expected))
+
+
+# --- Completion odds ---
+
+@pytest.mark.parametrize("probs", [
+    [1 / 12] * 3,
+    [1 / 144, 1 / 12, 1 / 12, 1 / 6],
+    [0.05, 0.1, 0.2, 0.3, 0.35], # Every box holds a target
+    [0.25],
+])
+def test_completion_cdf_matches_markov_chain(probs):
+    np.testing.assert_allclose(completion_cdf(probs, 120), markov_completion_cdf(probs, 120), atol=1e-12)
+
+
+def test_completion_cdf_is_the_same_in_small_chunks(monkeypatch):
+    probs = [1 / 144, 1 / 36, 1 / 12, 1 / 12]
+    expected = markov_completion_cdf(probs, 301)
+    monkeypatch.setattr(blindbox_engine, 'COMPLETION_CHUNK_CELLS', 7)
+    np.testing.assert_allclose(completion_cdf(probs, 301), expected, atol=1e-12)
+
+
+def test_completion_cdf_refuses_oversized_tables(monkeypatch):
+    monkeypatch.setattr(blindbox_engine, 'MAX_COMPLETION_CELLS', 1000)
+    with pytest.raises(ValueError):
+        completion_cdf([0.01, 0.02, 0.03, 0.04], 999)
+
+
+def test_expected_boxes_matches_coupon_collector():
+    # k equally likely targets of odds p: sum of 1 / (j * p) for j = 1..k
+    assert expected_boxes_to_complete([1 / 12] * 4) == pytest.approx(12 * (1 + 1 / 2 + 1 / 3 + 1 / 4))
+    assert expected_boxes_to_complete([0.2]) == pytest.approx(5)
+
+
+def test_boxes_for_completion_probability_is_the_first_box_reaching_the_level():
+    probs = [1 / 12, 1 / 12, 1 / 6]
+    boxes = boxes_for_completion_probability(probs, 0.9)
+    cdf = markov_completion_cdf(probs, boxes)
+    assert cdf[boxes] >= 0.9 > cdf[boxes - 1]
+
+
+# --- Purchase optimizer ---
+
+def test_purchase_plan_spends_within_budget():
+    plan = optimize_purchase_plan(make_targets({'A': 17.99, 'B': 14.99}), 100)
+    assert plan['spend'] <= 100
+    assert plan['plan']['spend'].sum() == pytest.approx(plan['spend'])
+    assert plan['curve']['expected_targets'].iloc[-1] == pytest.approx(plan['expected_targets'])
+
+
+@pytest.mark.parametrize("budget", [179.90, 184.90, 1000])
+def test_marginal_value_when_budget_buys_every_affordable_box(budget):
+    # One series takes the whole budget, so the next box is past what the budget affords
+    plan = optimize_purchase_plan(make_targets({'Rise Up': 17.99}), budget)
+    boxes = int(plan['plan']['boxes'].iloc[0])
+    probs = np.full(3, 1 / 12)
+    next_box_gain = (probs * (1 - probs) ** boxes).sum()
+    assert plan['marginal_value'] == pytest.approx(next_box_gain / 17.99)
+
+
+def test_marginal_value_when_no_box_is_affordable():
+    plan = optimize_purchase_plan(make_targets({'A': 17.99}), 5)
+    assert plan['plan'].empty
+    assert plan['marginal_value'] == pytest.approx(3 / 12 / 17.99)
+
+
+# --- Collection store ---
+
+def make_collection(names, price=10.0, quantity=1, source="CSV Upload"):
+    return pd.DataFrame({
+        'figure_name': names, 'series_name': "Skullpanda", 'sub_series_name': "The Sound",
+        'price_paid': price, 'owned_date': pd.Timestamp("2024-03-05"), 'source': source, 'quantity': quantity,
+    })
+
+
+def test_store_upserts_deletes_and_rolls_back_failed_batches():
+    store = CollectionStore()
+    store.upsert("A", {'series_name': "Skullpanda", 'quantity': 2, 'not a column': 1})
+    assert store.quantity("A") == 2 and "A" in store and "B" not in store
+    assert 'not a column' not in store.get("A")
+    view = store.to_dataframe()
+    store.upsert("A", {'quantity': 2})
+    assert store.to_dataframe() is view # Unchanged writes keep the cached frame
+
+    with pytest.raises(RuntimeError), store.batch():
+        store.upsert("B", {'quantity': 1})
+        store.delete("A")
+        raise RuntimeError("abort")
+    assert store.quantity("A") == 2 and "B" not in store
+    with store.batch():
+        store.upsert("B", {'quantity': 1})
+        store.delete("A")
+    assert store.to_dataframe()['figure_name'].tolist() == ["B"]
+
+
+def test_bulk_upsert_counts_inserted_updated_and_unchanged():
+    store = CollectionStore()
+    assert store.bulk_upsert(make_collection(["A", "B", "C"])) == {'inserted': 3, 'updated': 0, 'unchanged': 0}
+    upload = make_collection(["A", "B", "C", "D"])
+    upload.loc[1, 'price_paid'] = 12.0
+    assert store.bulk_upsert(upload) == {'inserted': 1, 'updated': 1, 'unchanged': 2}
+    assert len(store) == 4
+    assert store.get("B")['price_paid'] == 12.0
+
+
+def test_bulk_upsert_keeps_the_last_row_per_figure():
+    store = CollectionStore()
+    upload = make_collection(["A", "B", "A"], quantity=[1, 1, 3])
+    assert store.bulk_upsert(upload)['inserted'] == 2
+    assert store.quantity("A") == 3
+    assert sorted(store.to_dataframe()['figure_name']) == ["A", "B"]
+
+
+def test_bulk_upsert_compares_rows_with_missing_fields():
+    store = CollectionStore()
+    store.upsert("A", {'quantity': 1}) # Every other field is pd.NA
+    upload = store.to_dataframe().copy()
+    assert store.bulk_upsert(upload) == {'inserted': 0, 'updated': 0, 'unchanged': 1}
+
+
+@pytest.mark.parametrize("n_rows", [10, blindbox_engine.STATS_REBUILD_THRESHOLD + 10])
+def test_bulk_upsert_stats_match_a_full_rebuild(n_rows):
+    # Small uploads update the stats record by record, large ones rebuild them from the merged frame
+    store = CollectionStore()
+    store.bulk_upsert(make_collection([f"Figure {i}" for i in range(n_rows)], price=np.arange(n_rows) % 7 + 5.0))
+    update = make_collection([f"Figure {i}" for i in range(0, 2 * n_rows, 2)], quantity=2, source="Store")
+    store.bulk_upsert(update)
+    rebuilt = CollectionStats.from_frame(store.to_dataframe())
+    assert store.stats.total_figures == rebuilt.total_figures == n_rows // 2 + 2 * n_rows
+    assert store.stats.total_spent == pytest.approx(rebuilt.total_spent)
+    pd.testing.assert_frame_equal(store.stats.breakdown('source'), rebuilt.breakdown('source'))
+
+
+def test_incremental_stats_match_a_full_rebuild():
+    rng = np.random.default_rng(0)
+    store = CollectionStore()
+    sources = ["Store", "Online", None]
+    dates = [pd.Timestamp("2024-01-15"), pd.Timestamp("2024-03-02"), pd.NaT, "2023-12-24"]
+    for _ in range(400):
+        name = f"Figure {rng.integers(40)}"
+        if rng.random() < 0.2:
+            store.delete(name)
+        else:
+            store.upsert(name, {
+                'series_name': f"Series {rng.integers(3)}", 'sub_series_name': "Sub",
+                'price_paid': [None, 9.99, 12.5, 17.99][rng.integers(4)], 'owned_date': dates[rng.integers(4)],
+                'source': sources[rng.integers(3)], 'quantity': int(rng.integers(-1, 4)),
+            })
+    rebuilt = CollectionStats.from_frame(store.to_dataframe())
+    assert (store.stats.figure_types, store.stats.total_figures) == (rebuilt.figure_types, rebuilt.total_figures)
+    assert store.stats.total_spent == pytest.approx(rebuilt.total_spent)
+    for expected_values, values in zip(rebuilt.price_distribution(), store.stats.price_distribution()):
+        np.testing.assert_array_equal(values, expected_values)
+    for grouping in CollectionStats.GROUPINGS:
+        key = ['series_name', 'sub_series_name'] if grouping == 'series' else grouping
+        pd.testing.assert_frame_equal(store.stats.breakdown(grouping).sort_values(key, ignore_index=True),
+                                      rebuilt.breakdown(grouping).sort_values(key, ignore_index=True), check_dtype=False)
+
+
+def test_manage_search_matches_any_name_column_and_sorts_stably():
+    catalog = blindbox_engine.parse_master_catalog(CATALOG_CSV)
+    found = filter_and_sort_figures(catalog, "  RISE ", 'price', descending=True)
+    assert found['figure_name'].tolist() == ["Poppy", "Gigi"] # Equal prices keep catalog order
+    assert filter_and_sort_figures(catalog, "skull", 'figure_name')['figure_name'].tolist() == ["Secret"]
+    assert filter_and_sort_figures(catalog, "", 'price')['figure_name'].tolist() == ["Secret", "Poppy", "Gigi"]
+
+
+def test_own_checkbox_adds_updates_and_unowns_figures():
+    catalog = blindbox_engine.parse_master_catalog(CATALOG_CSV)
+    poppy = catalog.iloc[0]
+    store = CollectionStore()
+    apply_figure_ownership(store, poppy, True, 2)
+    assert store.get("Poppy")['source'] == "Marked Owned"
+    assert (store.get("Poppy")['price_paid'], store.get("Poppy")['sub_series_name']) == (17.99, "Rise Up")
+    apply_figure_ownership(store, poppy, False, 2)
+    assert "Poppy" in store and store.quantity("Poppy") == 0 # Kept, but no longer counted as owned
+    store.upsert("Poppy", {'source': "Trade", 'price_paid': 5.0})
+    apply_figure_ownership(store, poppy, True, 1)
+    assert (store.quantity("Poppy"), store.get("Poppy")['price_paid']) == (1, 5.0) # A recorded price is kept
+    apply_figure_ownership(store, catalog.iloc[1], False, 1)
+    assert "Gigi" not in store
+
+
+def test_bulk_upsert_inside_a_batch_is_staged_until_the_block_exits():
+    store = CollectionStore()
+    with store.batch():
+        counts = store.bulk_upsert(make_collection(["A", "B"]))
+        assert store.get("A") is not None
+        assert store.to_dataframe().empty
+    assert counts['inserted'] == 2
+    assert len(store.to_dataframe()) == 2
+
+
+# --- SQLite collection store ---
+
+def test_sqlite_stats_match_the_in_memory_stats(tmp_path):
+    store = SQLiteCollectionStore(str(tmp_path / "collection.db"), "me")
+    upload = make_collection([f"Figure {i}" for i in range(30)], price=np.arange(30) % 4 + 8.5, source=["Store", "Online", None] * 10)
+    upload.loc[::5, 'owned_date'] = pd.NaT
+    upload.loc[::7, 'quantity'] = 0
+    store.bulk_upsert(upload)
+    expected = CollectionStats.from_frame(store.to_dataframe())
+    assert store.collection_totals() == pytest.approx({
+        'figure_types': expected.figure_types, 'total_figures': expected.total_figures, 'total_spent': expected.total_spent
+    })
+    for expected_values, values in zip(expected.price_distribution(), store.stats.price_distribution()):
+        np.testing.assert_array_equal(values, expected_values)
+    for grouping in ('source', 'month'):
+        actual = store.stats.breakdown(grouping)
+        key = actual.columns[0]
+        pd.testing.assert_frame_equal(
+            actual.sort_values(key, ignore_index=True, na_position='last'),
+            expected.breakdown(grouping).sort_values(key, ignore_index=True, na_position='last'),
+            check_dtype=False
+        )
+
+
+def test_sqlite_store_reopens_and_sees_other_writers(tmp_path):
+    db_path = str(tmp_path / "collection.db")
+    writer = SQLiteCollectionStore(db_path, "me")
+    writer.bulk_upsert(make_collection(["A", "B"]))
+    reader = SQLiteCollectionStore(db_path, "me")
+    assert len(reader) == 2
+    assert reader.get("A")['owned_date'] == pd.Timestamp("2024-03-05")
+    assert reader.collection_totals()['total_spent'] == pytest.approx(20.0)
+
+    writer.upsert("B", {'quantity': 4})
+    assert reader.refresh()
+    assert reader.quantity("B") == 4
+    assert reader.collection_totals()['total_figures'] == 5
+    assert not reader.refresh() # Nothing new since the last reload
+    assert len(SQLiteCollectionStore(db_path, "someone else")) == 0
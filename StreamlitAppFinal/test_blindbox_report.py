@@ -0,0 +1,52 @@
+"""Checks for the batch collection report CLI."""
+
+import json
+
+import pytest
+
+from blindbox_engine import LOCAL_DATA_PATH, parse_master_catalog, read_catalog_source, rescaled_probabilities
+from blindbox_report import _json_safe, main
+
+COLLECTION_CSV = """figure_name,series_name,sub_series_name,price_paid,owned_date,quantity
+Poppy: Baddie on Bass,Peach Riot,Rise Up,17.99,2024-03-05,2
+Gigi: Lil' Lead,Peach Riot,Rise Up,17.99,,1
+"""
+
+
+@pytest.fixture
+def collections(tmp_path):
+    folder = tmp_path / "collections"
+    folder.mkdir()
+    (folder / "alice.csv").write_text(COLLECTION_CSV)
+    (folder / "bob.csv").write_text(COLLECTION_CSV.splitlines()[0] + "\nGigi: Lil' Lead,Peach Riot,Rise Up,15,,1\n")
+    (folder / "broken.csv").write_text("figure_name\nOnly a name\n")
+    return folder
+
+
+def read_reports(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_reports_are_written_in_input_order(collections, tmp_path, workers):
+    output = tmp_path / "reports.jsonl"
+    status = main([str(collections), "--output", str(output), "--workers", str(workers),
+                   "--target", "Poppy: Baddie on Bass", "--target", "Frankie: Sick Beats", "--budget", "100"])
+    reports = read_reports(output)
+    assert status == 1 # One collection failed
+    assert [report['collection'].rsplit('/', 1)[-1] for report in reports] == ["alice.csv", "bob.csv", "broken.csv"]
+    assert "missing required columns" in reports[2]['error']
+    stats = reports[0]['stats']
+    assert (stats['figure_types'], stats['total_figures'], stats['total_spent']) == (2, 3, pytest.approx(53.97))
+    assert [row['month'] for row in stats['by_month']] == ["2024-03", None]
+    # Alice owns Poppy, so only Frankie is left to chase; Bob still needs both
+    assert [row['targets'] for row in reports[0]['completion']] == [["Frankie: Sick Beats"]]
+    catalog = parse_master_catalog(read_catalog_source(LOCAL_DATA_PATH)[0])
+    frankie_odds = rescaled_probabilities(catalog)[catalog['figure_name'] == "Frankie: Sick Beats"].iloc[0]
+    assert reports[0]['completion'][0]['expected_boxes'] == pytest.approx(1 / frankie_odds)
+    assert sorted(reports[1]['completion'][0]['targets']) == ["Frankie: Sick Beats", "Poppy: Baddie on Bass"]
+    assert reports[1]['purchase_plan']['spend'] <= 100
+
+
+def test_json_safe_replaces_non_finite_numbers():
+    assert _json_safe({'a': [1.5, float('nan')], 'b': (float('inf'), 2), 'c': "x"}) == {'a': [1.5, None], 'b': [None, 2], 'c': "x"}
@@ -0,0 +1,82 @@
+"""Checks the Monte Carlo box simulator against closed-form means."""
+
+import numpy as np
+import pytest
+
+import box_simulator
+from blindbox_engine import expected_boxes_to_complete
+from box_simulator import STOP_ALL_TARGETS, STOP_ANY_TARGET, STOP_BUDGET, simulate_box_openings, summarize_simulation
+
+# A 12-figure sub-series: one secret at 1/144, the rest sharing the remaining odds
+PROBABILITIES = np.array([1 / 144] + [(1 - 1 / 144) / 11] * 11)
+N_TRIALS = 200_000
+
+
+def test_all_targets_mean_matches_the_exact_expectation():
+    targets = np.zeros(12, dtype=bool)
+    targets[[1, 2, 3]] = True
+    result = simulate_box_openings(PROBABILITIES, targets, np.zeros(12, dtype=bool), STOP_ALL_TARGETS, n_trials=N_TRIALS)
+    assert result['completed'].all()
+    assert result['boxes'].mean() == pytest.approx(expected_boxes_to_complete(PROBABILITIES[targets]), rel=0.01)
+
+
+def test_any_target_mean_is_one_over_the_target_mass():
+    targets = np.zeros(12, dtype=bool)
+    targets[[0, 5]] = True
+    result = simulate_box_openings(PROBABILITIES, targets, np.zeros(12, dtype=bool), STOP_ANY_TARGET, n_trials=N_TRIALS)
+    assert (result['targets_collected'] == 1).all()
+    assert result['boxes'].mean() == pytest.approx(1 / PROBABILITIES[targets].sum(), rel=0.01)
+
+
+def test_budget_means_match_the_per_figure_odds():
+    boxes = 20
+    targets = np.zeros(12, dtype=bool)
+    targets[[0, 1, 2]] = True
+    owned = np.zeros(12, dtype=bool)
+    owned[[3, 4]] = True
+    result = simulate_box_openings(PROBABILITIES, targets, owned, STOP_BUDGET, max_boxes=boxes, n_trials=N_TRIALS)
+    pulled = 1 - (1 - PROBABILITIES) ** boxes # Chance each figure turns up at least once
+    assert (result['boxes'] == boxes).all()
+    assert result['targets_collected'].mean() == pytest.approx(pulled[targets].sum(), rel=0.01)
+    # Every box that is not a first pull of a target or of an unowned figure is a duplicate
+    assert result['duplicates'].mean() == pytest.approx(boxes - pulled[~owned].sum(), rel=0.01)
+
+
+def test_owned_targets_are_not_chased():
+    targets = np.ones(12, dtype=bool)
+    owned = np.ones(12, dtype=bool)
+    owned[7] = False
+    result = simulate_box_openings(PROBABILITIES, targets, owned, STOP_ALL_TARGETS, n_trials=N_TRIALS)
+    assert result['boxes'].mean() == pytest.approx(1 / PROBABILITIES[7], rel=0.01)
+    assert (result['duplicates'] == result['boxes'] - 1).all()
+
+
+def test_results_depend_only_on_the_seed(monkeypatch):
+    monkeypatch.setattr(box_simulator, 'SIMULATION_CHUNK_TRIALS', 1000)
+    targets = np.zeros(12, dtype=bool)
+    targets[:4] = True
+    args = (PROBABILITIES, targets, np.zeros(12, dtype=bool), STOP_ALL_TARGETS)
+    serial = simulate_box_openings(*args, n_trials=4500, seed=7)
+    pooled = simulate_box_openings(*args, n_trials=4500, seed=7, n_workers=2)
+    np.testing.assert_array_equal(serial['boxes'], pooled['boxes'])
+    np.testing.assert_array_equal(serial['duplicates'], pooled['duplicates'])
+    assert not np.array_equal(serial['boxes'], simulate_box_openings(*args, n_trials=4500, seed=8)['boxes'])
+
+
+def test_summary_costs_scale_with_the_box_price():
+    targets = np.zeros(12, dtype=bool)
+    targets[1] = True
+    result = simulate_box_openings(PROBABILITIES, targets, np.zeros(12, dtype=bool), STOP_ALL_TARGETS, n_trials=10_000)
+    summary = summarize_simulation(result, box_price=17.99)
+    assert summary.loc['Cost ($)', 'Mean'] == pytest.approx(summary.loc['Boxes Opened', 'Mean'] * 17.99)
+    assert summary.loc['Boxes Opened', 'P5'] <= summary.loc['Boxes Opened', 'P50'] <= summary.loc['Boxes Opened', 'P95']
+
+
+@pytest.mark.parametrize("kwargs", [
+    {'probabilities': [0.5, 0.5], 'target_mask': [False, False], 'owned_mask': [False, False]},
+    {'probabilities': [0.0, 1.0], 'target_mask': [True, False], 'owned_mask': [False, False]},
+    {'probabilities': [0.5, 0.5], 'target_mask': [True, False], 'owned_mask': [False, False], 'stop_rule': STOP_BUDGET},
+])
+def test_invalid_simulations_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        simulate_box_openings(**kwargs)
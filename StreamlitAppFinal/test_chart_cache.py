@@ -0,0 +1,44 @@
+"""Checks for the content-addressed chart render cache."""
+
+import numpy as np
+
+from chart_cache import ChartRenderCache, render_step_curve
+
+
+def fake_renderer(values, *, title, fmt="png"):
+    fake_renderer.calls += 1
+    return f"{title}:{fmt}:{values.sum()}".encode().ljust(100)
+
+
+def test_unchanged_charts_are_served_without_rendering():
+    fake_renderer.calls = 0
+    cache = ChartRenderCache()
+    first = cache.render(fake_renderer, np.arange(5), title="Prices")
+    assert cache.render(fake_renderer, np.arange(5), title="Prices") == first
+    assert (fake_renderer.calls, cache.hits, cache.misses) == (1, 1, 1)
+    # New data, styling or format is a different chart
+    cache.render(fake_renderer, np.arange(6), title="Prices")
+    cache.render(fake_renderer, np.arange(5), title="Costs")
+    cache.render(fake_renderer, np.arange(5), title="Prices", fmt="svg")
+    cache.render(fake_renderer, np.arange(5, dtype=np.float32), title="Prices")
+    assert fake_renderer.calls == 5
+    assert len(cache) == 5
+
+
+def test_least_recently_used_charts_are_evicted_past_the_byte_cap():
+    fake_renderer.calls = 0
+    cache = ChartRenderCache(max_bytes=250)
+    for n in (1, 2, 1, 3): # Chart 1 is used again before chart 3 arrives, so chart 2 goes
+        cache.render(fake_renderer, np.arange(n), title="Chart")
+    assert len(cache) == 2
+    assert cache.total_bytes == 200
+    cache.render(fake_renderer, np.arange(1), title="Chart")
+    assert fake_renderer.calls == 3
+    cache.render(fake_renderer, np.arange(2), title="Chart")
+    assert fake_renderer.calls == 4
+
+
+def test_renderers_return_image_bytes():
+    png = render_step_curve(np.arange(3), np.array([0.1, 0.5, 0.9]), title="t", xlabel="x", ylabel="y")
+    assert png.startswith(b"\x89PNG")
+    assert b"<svg" in render_step_curve(np.arange(3), np.ones(3), title="t", xlabel="x", ylabel="y", fmt="svg")
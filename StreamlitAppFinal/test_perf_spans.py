@@ -0,0 +1,58 @@
+"""Checks for the named timing spans and their JSON Lines / Prometheus exports."""
+
+import json
+
+import pytest
+
+import perf_spans
+from perf_spans import SpanRegistry, profile_rerun, span
+
+
+@pytest.fixture
+def profiling(monkeypatch, tmp_path):
+    """Turns profiling on with a fresh registry and both exports pointed at tmp_path."""
+    monkeypatch.setattr(perf_spans, 'PROFILE_ENABLED', True)
+    monkeypatch.setattr(perf_spans, 'SPAN_REGISTRY', SpanRegistry(buckets=(0.5, 60.0)))
+    monkeypatch.setattr(perf_spans, 'PROFILE_LOG_PATH', str(tmp_path / "spans.jsonl"))
+    monkeypatch.setattr(perf_spans, 'PROFILE_PROM_PATH', str(tmp_path / "spans.prom"))
+    return tmp_path
+
+
+def test_spans_are_free_while_profiling_is_off(monkeypatch):
+    monkeypatch.setattr(perf_spans, 'PROFILE_ENABLED', False)
+    assert span("a") is span("b", rows=3)
+    with span("a") as s:
+        s.count(10)
+
+
+def test_nested_spans_are_recorded_by_path_and_exported(profiling):
+    for _ in range(2):
+        with profile_rerun("main") as profile:
+            with span("stats_tab"):
+                with span("chart", rows=5) as chart:
+                    chart.count(2)
+            with pytest.raises(KeyError), span("broken"):
+                raise KeyError("x")
+
+    records = [json.loads(line) for line in (profiling / "spans.jsonl").read_text().splitlines()]
+    assert [(r['run'], r['span'], r['depth']) for r in records[:4]] == [
+        (1, "main", 0), (1, "main/stats_tab", 1), (1, "main/stats_tab/chart", 2), (1, "main/broken", 1)
+    ]
+    assert len(records) == 8
+    assert records[2]['rows'] == 7
+    assert records[3]['error'] == "KeyError"
+    assert all(r['wall_ms'] >= 0 for r in records)
+    assert [s.path for s in profile.spans] == ["main", "main/stats_tab", "main/stats_tab/chart", "main/broken"]
+
+    prom = (profiling / "spans.prom").read_text()
+    assert 'blindbox_span_seconds_count{span="main/stats_tab/chart"} 2' in prom
+    assert 'blindbox_span_seconds_bucket{span="main",le="+Inf"} 2' in prom
+    assert 'blindbox_span_rows_total{span="main/stats_tab/chart"} 14' in prom
+
+
+def test_prometheus_labels_are_escaped():
+    registry = SpanRegistry()
+    s = perf_spans.Span('say "hi"\\now')
+    s.wall_seconds, s.alloc_blocks = 0.002, 0
+    registry.record(s)
+    assert 'span="say \\"hi\\"\\\\now"' in registry.prometheus_text()
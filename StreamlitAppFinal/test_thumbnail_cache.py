@@ -0,0 +1,69 @@
+"""Checks for the on-disk figure thumbnail cache."""
+
+import io
+
+import pytest
+from PIL import Image
+
+from thumbnail_cache import ThumbnailCache, downscale_image, looks_like_image
+
+
+def make_png(width, height, mode='RGBA'):
+    buffer = io.BytesIO()
+    Image.new(mode, (width, height), (200, 30, 30, 0) if mode == 'RGBA' else (200, 30, 30)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class CountingFetcher:
+    def __init__(self, images):
+        self.images = images
+        self.calls = []
+
+    def __call__(self, source):
+        self.calls.append(source)
+        return self.images[source] # KeyError stands in for an unreachable image
+
+
+@pytest.mark.parametrize("source, expected", [
+    ("https://example.com/a", True), ("photos/skullpanda.PNG", True), ("", False), ("N/A", False), (None, False),
+])
+def test_looks_like_image(source, expected):
+    assert looks_like_image(source) is expected
+
+
+def test_downscale_shrinks_to_width_and_flattens_transparency():
+    with Image.open(io.BytesIO(downscale_image(make_png(800, 400), 200))) as image:
+        assert (image.format, image.size, image.mode) == ("JPEG", (200, 100), "RGB")
+        red, green, blue = image.getpixel((100, 50))
+        assert min(red, green, blue) > 240 # Transparent pixels become white
+    with Image.open(io.BytesIO(downscale_image(make_png(100, 50, 'RGB'), 200))) as image:
+        assert image.size == (100, 50) # Never enlarged
+
+
+def test_thumbnails_are_fetched_once_and_reused_across_instances(tmp_path):
+    fetcher = CountingFetcher({"a.png": make_png(600, 600), "b.png": make_png(600, 300)})
+    cache = ThumbnailCache(str(tmp_path), fetcher=fetcher, pixel_density=1)
+    results = cache.thumbnails(["a.png", "b.png", "a.png", "missing.png", "not an image"], 150)
+    assert set(results) == {"a.png", "b.png", "missing.png"}
+    assert results["missing.png"] is None
+    assert cache.thumbnail("a.png", 150) == results["a.png"]
+    assert cache.thumbnail("missing.png", 150) is None # Recent failures are not retried
+    assert sorted(fetcher.calls) == ["a.png", "b.png", "missing.png"]
+
+    reopened = ThumbnailCache(str(tmp_path), fetcher=fetcher, pixel_density=1)
+    assert len(reopened) == 2
+    assert reopened.thumbnail("b.png", 150) == results["b.png"]
+    assert len(fetcher.calls) == 3
+
+
+def test_oldest_thumbnails_are_evicted_past_the_byte_cap(tmp_path):
+    fetcher = CountingFetcher({f"{i}.png": make_png(300, 300) for i in range(3)})
+    size = len(downscale_image(make_png(300, 300), 100))
+    cache = ThumbnailCache(str(tmp_path), max_bytes=2 * size, fetcher=fetcher, max_workers=1, pixel_density=1)
+    for i in range(3):
+        cache.thumbnail(f"{i}.png", 100)
+    assert len(cache) == 2
+    assert cache.total_bytes == 2 * size
+    assert len(list(tmp_path.glob("*.jpg"))) == 2
+    cache.thumbnail("2.png", 100)
+    assert len(fetcher.calls) == 3
@@ -0,0 +1,182 @@
+"""Downscaled, disk-cached thumbnails for the catalog's `figure_photo` images.
+
+The catalog links full-size (1200x1200) CDN photos, but the app only shows them as small
+thumbnails. Each photo is fetched once, shrunk to the width the app displays it at and stored as
+a small JPEG in a size-bounded directory; the least recently used thumbnails are evicted first.
+Fetching goes through a pluggable `fetcher`, so a local directory or a stub can stand in for the CDN.
+"""
+
+import concurrent.futures
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+
+THUMBNAIL_CACHE_DIR = os.environ.get(
+    "BLINDBOX_THUMBNAIL_DIR", os.path.join(tempfile.gettempdir(), "blindbox_thumbnails")
+)
+THUMBNAIL_CACHE_MAX_BYTES = 128 * 1024 * 1024 # Disk cap for stored thumbnails
+THUMBNAIL_FETCH_TIMEOUT = 10 # Seconds per image download
+THUMBNAIL_FETCH_WORKERS = 8
+THUMBNAIL_RETRY_SECONDS = 600 # How long a failed fetch is remembered before retrying
+THUMBNAIL_JPEG_QUALITY = 85
+THUMBNAIL_PIXEL_DENSITY = 2 # Stored width = display width x density, so thumbnails stay sharp on HiDPI screens
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+def looks_like_image(source):
+    """True for values that can be an image URL or an image file path."""
+    if not isinstance(source, str) or not source.strip():
+        return False
+    source = source.strip()
+    return source.startswith(('http://', 'https://')) or source.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def fetch_image_bytes(source, base_dir=None, timeout=THUMBNAIL_FETCH_TIMEOUT):
+    """Reads an image from an http(s) URL or a file path (relative paths resolve against `base_dir`)."""
+    if source.startswith(('http://', 'https://')):
+        request = urllib.request.Request(source, headers={'User-Agent': 'blindbox-tracker'})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.read()
+    if base_dir and not os.path.isabs(source):
+        source = os.path.join(base_dir, source)
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def downscale_image(raw, width, quality=THUMBNAIL_JPEG_QUALITY):
+    """Shrinks an encoded image to `width` pixels wide (never enlarges) and returns it as JPEG bytes."""
+    from PIL import Image # Pillow ships with matplotlib and streamlit; imported only when a thumbnail is made
+
+    with Image.open(io.BytesIO(raw)) as image:
+        image.draft('RGB', (width, width)) # Lets the JPEG decoder skip most of the full-size pixels
+        if image.mode in ('RGBA', 'LA', 'P'): # Flatten transparency onto white
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+class ThumbnailCache:
+    """Size-bounded on-disk LRU cache of downscaled images, keyed by source and width."""
+
+    def __init__(self, cache_dir=THUMBNAIL_CACHE_DIR, max_bytes=THUMBNAIL_CACHE_MAX_BYTES, fetcher=None,
+                 max_workers=THUMBNAIL_FETCH_WORKERS, pixel_density=THUMBNAIL_PIXEL_DENSITY):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.fetcher = fetcher or fetch_image_bytes
+        self.max_workers = max_workers
+        self.pixel_density = pixel_density
+        self._lock = threading.Lock()
+        self._failures = {} # key -> time of the last failed fetch
+        self._entries = {}  # key -> (last use, size in bytes)
+        os.makedirs(cache_dir, exist_ok=True)
+        with os.scandir(cache_dir) as entries: # Pick up thumbnails stored by earlier runs
+            for entry in entries:
+                if entry.name.endswith('.jpg') and entry.is_file():
+                    stat = entry.stat()
+                    self._entries[entry.name[:-4]] = (stat.st_mtime, stat.st_size)
+        self._total_bytes = sum(size for _, size in self._entries.values())
+
+    def _key(self, source, width):
+        return f"{hashlib.sha256(source.encode()).hexdigest()[:32]}_{width}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.jpg")
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError: # Evicted or removed by another process
+            with self._lock:
+                _, size = self._entries.pop(key, (0, 0))
+                self._total_bytes -= size
+            return None
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (now, len(data))
+        try:
+            os.utime(self._path(key), (now, now)) # Keep recency on disk for the next process
+        except OSError:
+            pass
+        return data
+
+    def _store(self, key, data):
+        temp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, self._path(key)) # Readers never see a half-written file
+        with self._lock:
+            _, old_size = self._entries.get(key, (0, 0))
+            self._entries[key] = (time.time(), len(data))
+            self._total_bytes += len(data) - old_size
+            if self._total_bytes <= self.max_bytes:
+                return
+            for evict_key, (_, size) in sorted(self._entries.items(), key=lambda item: item[1][0]): # Oldest first
+                if self._total_bytes <= self.max_bytes:
+                    break
+                if evict_key == key:
+                    continue
+                del self._entries[evict_key]
+                self._total_bytes -= size
+                try:
+                    os.remove(self._path(evict_key))
+                except FileNotFoundError:
+                    pass
+
+    def thumbnail(self, source, width):
+        """Returns JPEG bytes of `source` shrunk for display at `width` pixels, or None if it can't be loaded."""
+        if not looks_like_image(source):
+            return None
+        source = source.strip()
+        width = int(width * self.pixel_density)
+        key = self._key(source, width)
+        if key in self._entries:
+            data = self._read(key)
+            if data is not None:
+                return data
+        with self._lock:
+            failed_at = self._failures.get(key)
+        if failed_at is not None and time.time() - failed_at < THUMBNAIL_RETRY_SECONDS:
+            return None
+        try:
+            data = downscale_image(self.fetcher(source), width)
+        except Exception: # Unreachable host, missing file or not an image
+            with self._lock:
+                self._failures[key] = time.time()
+            return None
+        self._store(key, data)
+        with self._lock:
+            self._failures.pop(key, None)
+        return data
+
+    def thumbnails(self, sources, width):
+        """Thumbnails for many sources, fetching the missing ones in parallel. Returns {source: bytes or None}."""
+        sources = list(dict.fromkeys(s for s in sources if looks_like_image(s)))
+        missing = [s for s in sources if self._key(s.strip(), int(width * self.pixel_density)) not in self._entries]
+        results = {}
+        if len(missing) > 1 and self.max_workers > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as pool:
+                results = dict(zip(missing, pool.map(lambda s: self.thumbnail(s, width), missing)))
+        for source in sources:
+            if source not in results:
+                results[source] = self.thumbnail(source, width)
+        return results
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
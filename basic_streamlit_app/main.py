@@ -1,74 +1,122 @@
+import os
+
 import streamlit as st
 import pandas as pd
 
-# Import dataset
-players = "data/female_players.csv"
-data_url = "https://raw.githubusercontent.com/kmgilland/GILLAND-Python-Portfolio/refs/heads/main/basic_streamlit_app/data/female_players.csv"
-df = pd.read_csv(data_url, dtype=str)
-
-if "OVR" in df.columns:
-    df["OVR"] = pd.to_numeric(df["OVR"], errors='coerce')
-    # Optional: drop rows where "OVR" could not be converted, if that makes sense for your app
-    # df.dropna(subset=["OVR"], inplace=True)
-else:
-    st.error("The 'OVR' column was not found in the DataFrame.")
-    # You might want to stop execution or handle this case differently
+from players_engine import ANALYTICS_GROUP_COLUMNS, DATA_URL, FACE_STAT_COLUMNS, FORMATIONS, LOCAL_DATA_PATH, PlayersDataCache
+
+pd.set_option("mode.copy_on_write", True) # The roster frame is shared by every session
+
+# Import dataset: an optional local or synthetic roster first, then the bundled CSV, then the published one
+PLAYERS_SOURCES = [source for source in [os.environ.get("FEMALE_PLAYERS_CSV"), LOCAL_DATA_PATH, DATA_URL] if source]
+
+@st.cache_resource(show_spinner=False)
+def get_players_cache():
+    """One typed roster per server process, shared by every session and reloaded only when its source changes."""
+    return PlayersDataCache(PLAYERS_SOURCES)
+
+def display_bar_chart(frame, value_title, stacked=True):
+    """Bar chart of a groups x series frame, from a plain Vega-Lite spec (much cheaper per rerun than st.bar_chart)."""
+    long_df = frame.rename_axis("group").reset_index().melt("group", var_name="series", value_name="value")
+    encoding = {
+        "x": {"field": "group", "type": "nominal", "sort": None, "title": None},
+        "y": {"field": "value", "type": "quantitative", "title": value_title},
+        "color": {"field": "series", "type": "nominal", "sort": None, "title": None},
+    }
+    if not stacked: # Side-by-side bars per group
+        encoding["y"]["stack"] = None
+        encoding["xOffset"] = {"field": "series", "sort": None}
+    st.vega_lite_chart(long_df, {"mark": {"type": "bar", "tooltip": True}, "encoding": encoding}, use_container_width=True)
+
+try:
+    df, players_index, players_version = get_players_cache().get()
+except Exception as e:
+    st.error(f"Could not load the players data: {e}")
     st.stop()
 
 # Introduction
 st.title("EA Sports FC 25: Female Players Explorer")
 st.write("Welcome, prospective managers! Here you can explore player ratings, stats, and filters for all female playable characters in EA Sports FC 25.")
 
-# Position Mapping
-position_map = {
-    "GK": "Goalkeeper",
-    "CB": "Center Back",
-    "LB": "Left Back",
-    "RB": "Right Back",
-    "CDM": "Central Defensive Midfielder",
-    "CM": "Central Midfielder",
-    "CAM": "Central Attacking Midfielder",
-    "LM": "Left Midfielder",
-    "RM": "Right Midfielder",
-    "LW": "Left Winger",
-    "RW": "Right Winger",
-    "ST": "Striker",
-    "CF": "Center Forward"
-}
-
-df["Full Position"] = df["Position"].map(position_map).fillna(df["Position"])
+# Mode
+app_mode = st.sidebar.radio("Mode:", ["Explore Players", "Squad Builder", "Analytics"])
 
 # Sidebar filters
 st.sidebar.header("Filter Players")
 
 # Filter by Team
-teams = sorted(df["Team"].dropna().unique())
+teams = players_index.options["Team"]
 selected_team = st.sidebar.selectbox("Select a Team:", ["All"] + teams)
 
 # Filter by Nation
-nations = sorted(df["Nation"].dropna().unique())
+nations = players_index.options["Nation"]
 selected_nation = st.sidebar.selectbox("Select a Nation:", ["All"] + nations)
 
 # Filter by Position
-positions = sorted(df["Position"].dropna().unique())
+positions = players_index.options["Position"]
 selected_position = st.sidebar.selectbox("Select a Position:", ["All"] + positions)
 
 # Filter by Overall Rating
-ovr_min, ovr_max = int(df["OVR"].min()), int(df["OVR"].max())
+ovr_min, ovr_max = players_index.ovr_bounds
 ovr_range = st.sidebar.slider("Overall Rating Range:", ovr_min, ovr_max, (ovr_min, ovr_max))
 
-# Apply Filters
-filtered_df = df.copy()
-if selected_team != "All":
-    filtered_df = filtered_df[filtered_df["Team"] == selected_team]
-if selected_nation != "All":
-    filtered_df = filtered_df[filtered_df["Nation"] == selected_nation]
-if selected_position != "All":
-    filtered_df = filtered_df[filtered_df["Position"] == selected_position]
-filtered_df = filtered_df[(filtered_df["OVR"] >= ovr_range[0]) & (filtered_df["OVR"] <= ovr_range[1])]
+# Apply Filters: precomputed bitsets and a sorted OVR range, then one take
+selections = {"Team": selected_team, "Nation": selected_nation, "Position": selected_position}
+active_filters = {col: value for col, value in selections.items() if value != "All"}
+filtered_df = df.take(players_index.filter_rows(active_filters, ovr_range))
+
+# Squad Builder: best XI and bench from the filtered players, re-solved on every filter change
+if app_mode == "Squad Builder":
+    st.subheader("Squad Builder")
+    formation = st.selectbox("Formation:", list(FORMATIONS))
+    cap_col1, cap_col2 = st.columns(2)
+    max_per_team = cap_col1.number_input("Max players per team (0 = no limit):", 0, 11, 0)
+    max_per_nation = cap_col2.number_input("Max players per nation (0 = no limit):", 0, 11, 0)
+    chem_col1, chem_col2 = st.columns(2)
+    chemistry_column = chem_col1.selectbox("Chemistry group:", ["None", "League", "Nation", "Team"])
+    chemistry_size = chem_col2.slider("Starters sharing it:", 2, 11, 5, disabled=chemistry_column == "None")
+    chemistry = None if chemistry_column == "None" else (chemistry_column, chemistry_size)
+
+    lineup, bench = players_index.squads.build(formation, filtered_df.index.to_numpy(), max_per_team, max_per_nation, chemistry)
+    starters = [(slot, row) for slot, row in lineup if row is not None]
+    if not starters:
+        st.markdown("***No starting XI fits your filters and constraints.***")
+    else:
+        squad_columns = ["Name", "Position", "Alternative positions", "OVR", "Team", "Nation", "League"]
+        xi_df = df.take([row for _, row in starters])[squad_columns]
+        xi_df.insert(0, "Slot", [slot for slot, _ in starters])
+        st.metric("Average Starting OVR", f"{xi_df['OVR'].mean():.1f}")
+        if len(starters) < len(lineup):
+            st.warning(f"Only {len(starters)} of {len(lineup)} slots could be filled: {', '.join(slot for slot, row in lineup if row is None)} left open.")
+        st.write("**Starting XI**")
+        st.dataframe(xi_df, hide_index=True)
+        if bench:
+            st.write("**Bench**")
+            st.dataframe(df.take(bench)[squad_columns], hide_index=True)
+
+# Analytics: per-group aggregates rolled up from the precomputed cube for the current filters
+elif app_mode == "Analytics":
+    st.subheader("Team, Nation & League Analytics")
+    group_col = st.selectbox("Group players by:", [col for col in ANALYTICS_GROUP_COLUMNS if col in players_index.analytics.groups])
+    summary, position_mix, ages = players_index.analytics.summary(group_col, active_filters, ovr_range)
+    if summary.empty:
+        st.markdown("***There are no players that fit your selection.***")
+    else:
+        rank_by = st.selectbox("Rank groups by:", ["Mean OVR", "Median OVR", "Max OVR", "Players"])
+        shown_count = st.slider("Groups shown:", 1, min(50, len(summary)), min(15, len(summary))) if len(summary) > 1 else 1
+        shown = summary.sort_values([rank_by, "Players"], ascending=False, kind="stable").head(shown_count)
+        st.write(f"Showing {len(shown)} of {len(summary)} {group_col.lower()} groups:")
+        st.dataframe(shown.round(1))
+
+        st.write("**Attribute Profile** (mean ratings)")
+        display_bar_chart(shown[[col for col in FACE_STAT_COLUMNS if col in shown.columns]], "Mean rating", stacked=False)
+        st.write("**Position Mix** (% of players)")
+        display_bar_chart((position_mix.loc[shown.index] * 100).round(1), "% of players")
+        st.write("**Age Distribution** (% of players)")
+        display_bar_chart((ages.loc[shown.index] * 100).round(1), "% of players")
 
 # Check if there are players after filtering
-if filtered_df.empty:
+elif filtered_df.empty:
     st.markdown(f"***There are no players that fit your selection.***")
 else:
     # Show filtered DataFrame
@@ -77,7 +125,16 @@ else:
 
     # Player Selection
     st.subheader("Player Details")
-    selected_player = st.selectbox("Select a player to view details:", filtered_df["Name"].unique())
+    name_query = st.text_input("Search players by name:", placeholder="e.g. Bonmati or alexia put")
+    search_team_nation = st.checkbox("Also match team and nation names")
+    player_options = filtered_df["Name"].unique()
+    if name_query.strip():
+        matches = players_index.search.search(name_query, filtered_df.index.to_numpy(), include_team_nation=search_team_nation)
+        if len(matches):
+            player_options = df["Name"].take(matches).unique() # Best matches first
+        else:
+            st.info("No players match your search, so all filtered players are listed.")
+    selected_player = st.selectbox("Select a player to view details:", player_options)
     player_info = filtered_df[filtered_df["Name"] == selected_player].iloc[0]
 
     # Display player stats
@@ -100,3 +157,18 @@ else:
     # Link to EA page
     if pd.notna(player_info['url']):
         st.markdown(f"[View Player on EA Sports Website]({player_info['url']})")
+
+    # Similar players: ranked over the whole roster, or only the sidebar's position and rating range
+    st.subheader("Similar Players")
+    similar_count = st.slider("Number of similar players:", 1, 25, 10)
+    within_filters = st.checkbox("Only players matching the sidebar's position and rating filters")
+    candidate_rows = None
+    if within_filters:
+        candidate_rows = players_index.filter_rows({"Position": selected_position} if selected_position != "All" else None, ovr_range)
+    similar_rows, distances = players_index.similarity.nearest(int(player_info.name), similar_count, candidate_rows)
+    if len(similar_rows) == 0:
+        st.markdown("***No other players fit these constraints.***")
+    else:
+        similar_df = df.take(similar_rows)[["Name", "Position", "OVR", "Team", "Nation"]].assign(Distance=distances.round(2))
+        st.dataframe(similar_df, hide_index=True)
+        st.caption("Distance is the typical gap per attribute, in standard deviations across the roster (goalkeepers are also compared on GK ratings).")
@@ -0,0 +1,665 @@
+"""Headless roster engine for the Female Players Explorer: loading, typing and snapshotting the players CSV.
+
+Nothing here imports Streamlit, so the app, benchmarks and notebooks share one loader; the app only
+wraps `PlayersDataCache` in `st.cache_resource` so every browser session reuses the same frame.
+"""
+
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+# --- Constants ---
+
+# Bundled copy of the roster, read first; the published copy on GitHub is only a fallback
+LOCAL_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "female_players.csv")
+DATA_URL = "https://raw.githubusercontent.com/kmgilland/GILLAND-Python-Portfolio/refs/heads/main/basic_streamlit_app/data/female_players.csv"
+
+# Typed snapshots of the parsed roster, so a restarted app skips the CSV parser
+SNAPSHOT_DIR = os.environ.get("FEMALE_PLAYERS_SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "female_players_snapshots"))
+SNAPSHOT_VERSION = 1 # Bump whenever the typed schema below changes, so old snapshots are rebuilt
+
+PLAYERS_REFRESH_SECONDS = 300 # How often a remote roster source is re-checked for changes
+PLAYERS_FETCH_TIMEOUT = 10    # Seconds to wait on a remote roster before falling back
+
+FACE_STAT_COLUMNS = ['PAC', 'SHO', 'PAS', 'DRI', 'DEF', 'PHY']
+DETAIL_STAT_COLUMNS = [
+    'Acceleration', 'Sprint Speed', 'Positioning', 'Finishing', 'Shot Power', 'Long Shots', 'Volleys', 'Penalties',
+    'Vision', 'Crossing', 'Free Kick Accuracy', 'Short Passing', 'Long Passing', 'Curve', 'Dribbling', 'Agility',
+    'Balance', 'Reactions', 'Ball Control', 'Composure', 'Interceptions', 'Heading Accuracy', 'Def Awareness',
+    'Standing Tackle', 'Sliding Tackle', 'Jumping', 'Stamina', 'Strength', 'Aggression'
+]
+GK_STAT_COLUMNS = ['GK Diving', 'GK Handling', 'GK Kicking', 'GK Positioning', 'GK Reflexes'] # Empty for outfield players
+RATING_COLUMNS = ['OVR'] + FACE_STAT_COLUMNS + DETAIL_STAT_COLUMNS + GK_STAT_COLUMNS
+SMALL_INT_COLUMNS = RATING_COLUMNS + ['Rank', 'Weak foot', 'Skill moves', 'Age']
+
+# Repeated labels stored as categoricals (each distinct string once, rows hold small integer codes)
+CATEGORY_COLUMNS = ['Position', 'Full Position', 'Preferred foot', 'Alternative positions', 'Nation', 'League', 'Team']
+
+REQUIRED_COLUMNS = ['Name', 'OVR', 'Position', 'Team', 'Nation']
+
+FILTER_COLUMNS = ['Team', 'Nation', 'Position'] # Sidebar filters answered from precomputed row bitsets
+SIMILARITY_COLUMNS = FACE_STAT_COLUMNS + DETAIL_STAT_COLUMNS # Compared for every player; GK ratings only between keepers
+
+# Starting slots of each formation, back to front
+FORMATIONS = {
+    "4-3-3": ["GK", "LB", "CB", "CB", "RB", "CM", "CM", "CM", "LW", "ST", "RW"],
+    "4-4-2": ["GK", "LB", "CB", "CB", "RB", "LM", "CM", "CM", "RM", "ST", "ST"],
+    "4-2-3-1": ["GK", "LB", "CB", "CB", "RB", "CDM", "CDM", "LM", "CAM", "RM", "ST"],
+    "4-1-2-1-2": ["GK", "LB", "CB", "CB", "RB", "CDM", "CM", "CM", "CAM", "ST", "ST"],
+    "3-5-2": ["GK", "CB", "CB", "CB", "LM", "CDM", "CDM", "CAM", "RM", "ST", "ST"],
+    "5-3-2": ["GK", "LB", "CB", "CB", "CB", "RB", "CM", "CM", "CM", "ST", "ST"],
+}
+BENCH_SIZE = 7
+SQUAD_POOL_PER_POSITION = 40   # Best eligible players per slot position the solver considers (11 is enough without caps)
+SQUAD_CHEMISTRY_CANDIDATES = 25 # Strongest League/Nation/Team groups tried as the core of a chemistry-constrained XI
+CHEMISTRY_COLUMNS = ['League', 'Nation', 'Team']
+
+SEARCH_COLUMNS = ['Team', 'Nation'] # Optionally searched alongside Name
+SEARCH_MIN_SIMILARITY = 0.4 # Share of the query's trigrams a match must contain
+NON_ALPHANUMERIC = re.compile(r'[\W_]+')
+
+ANALYTICS_GROUP_COLUMNS = ['Team', 'Nation', 'League']
+AGE_BINS = [0, 21, 25, 29, 33, np.inf] # Age distribution buckets: [lower, upper)
+AGE_BIN_LABELS = ['Under 21', '21-24', '25-28', '29-32', '33+']
+
+POSITION_NAMES = {
+    "GK": "Goalkeeper",
+    "CB": "Center Back",
+    "LB": "Left Back",
+    "RB": "Right Back",
+    "CDM": "Central Defensive Midfielder",
+    "CM": "Central Midfielder",
+    "CAM": "Central Attacking Midfielder",
+    "LM": "Left Midfielder",
+    "RM": "Right Midfielder",
+    "LW": "Left Winger",
+    "RW": "Right Winger",
+    "ST": "Striker",
+    "CF": "Center Forward"
+}
+
+# --- Loading ---
+
+def read_players_source(source):
+    """Reads raw CSV bytes from a URL or local path. Returns (bytes, mtime), with mtime None for URLs."""
+    if source.startswith(('http://', 'https://')):
+        with urllib.request.urlopen(source, timeout=PLAYERS_FETCH_TIMEOUT) as response:
+            return response.read(), None
+    with open(source, 'rb') as fh:
+        raw = fh.read()
+    return raw, os.path.getmtime(source)
+
+def small_int(values):
+    """Numeric column as the smallest unsigned integer dtype holding it (nullable 'UInt8' etc. if values are missing)."""
+    numbers = pd.to_numeric(values, errors='coerce').round()
+    largest = numbers.max()
+    bits = 8 if not largest > np.iinfo(np.uint8).max else 16 if largest <= np.iinfo(np.uint16).max else 32
+    if numbers.isna().any():
+        return numbers.astype(f"UInt{bits}")
+    return numbers.astype(f"uint{bits}")
+
+def parse_players(raw):
+    """Parses raw roster CSV bytes into the typed frame the app works on.
+
+    Ratings become small unsigned integers (nullable for the outfielders' empty GK ratings), Height and
+    Weight ('162cm / 5'4"', '53kg / 117lb') become 'Height (cm)' and 'Weight (kg)', and repeated labels
+    become categoricals. Raises ValueError if a column the app needs is missing.
+    """
+    df = pd.read_csv(io.BytesIO(raw))
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Players CSV is missing required column(s): {', '.join(missing)}")
+    df = df.drop(columns=[col for col in df.columns if col.startswith('Unnamed:')]) # Saved index columns
+
+    for col in SMALL_INT_COLUMNS:
+        if col in df.columns:
+            df[col] = small_int(df[col])
+    for col, pattern, unit_col in [('Height', r'(\d+(?:\.\d+)?)\s*cm', 'Height (cm)'),
+                                   ('Weight', r'(\d+(?:\.\d+)?)\s*kg', 'Weight (kg)')]:
+        if col in df.columns:
+            df[unit_col] = small_int(df[col].astype(str).str.extract(pattern, expand=False))
+            df = df.drop(columns=col)
+
+    df['Full Position'] = df['Position'].map(POSITION_NAMES).fillna(df['Position'])
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df.reset_index(drop=True)
+
+# --- Snapshots ---
+
+def snapshot_path(source, content_key, snapshot_dir=SNAPSHOT_DIR):
+    """Snapshot file for one version of a source; the name changes whenever the source or the schema does."""
+    source_key = hashlib.sha256(source.encode('utf-8')).hexdigest()[:12]
+    version_key = hashlib.sha256(f"{SNAPSHOT_VERSION}:{content_key}".encode('utf-8')).hexdigest()[:16]
+    return os.path.join(snapshot_dir, f"players-{source_key}-{version_key}.feather")
+
+def read_snapshot(path):
+    """Typed roster from a snapshot, or None if there is no usable snapshot at `path`."""
+    try:
+        return pd.read_feather(path)
+    except Exception: # Missing, half-written or from an incompatible pyarrow: rebuild it
+        return None
+
+def write_snapshot(df, path):
+    """Atomically writes a roster snapshot and removes older snapshots of the same source."""
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        df.to_feather(temp_path)
+        os.replace(temp_path, path) # Other processes never read a half-written snapshot
+        prefix = os.path.basename(path).rsplit('-', 1)[0] + '-'
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name.endswith('.feather') and name != os.path.basename(path):
+                os.remove(os.path.join(directory, name))
+    except OSError: # A read-only or full disk only costs the next restart a CSV parse
+        pass
+
+def load_players(source, snapshot_dir=SNAPSHOT_DIR):
+    """Typed roster for one source, from its snapshot when the source is unchanged. Returns (frame, mtime, key).
+
+    Local files are keyed on size and mtime, so an unchanged file is never opened; URLs are downloaded
+    and keyed on a hash of their content.
+    """
+    if source.startswith(('http://', 'https://')):
+        raw, mtime = read_players_source(source)
+        content_key = hashlib.sha256(raw).hexdigest()
+    else:
+        stat = os.stat(source)
+        raw, mtime = None, stat.st_mtime
+        content_key = f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    path = snapshot_path(source, content_key, snapshot_dir)
+    df = read_snapshot(path)
+    if df is None:
+        if raw is None:
+            raw, mtime = read_players_source(source)
+        df = parse_players(raw)
+        write_snapshot(df, path)
+    return df, mtime, content_key
+
+# --- Filter index ---
+
+class PlayersIndex:
+    """Precomputed answers to the sidebar filters, built once per loaded roster.
+
+    Every Team, Nation and Position value has a packed bitset of its rows and OVR is kept sorted, so a
+    filter change is a few bitset ANDs plus one `searchsorted` range, and the app needs a single `take`.
+    `similarity` answers "find similar players" queries, `squads` builds best XIs, `search` finds
+    players by name and `analytics` aggregates teams, nations and leagues over the same rows.
+    """
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        self.options = {} # column -> sorted values present in the roster
+        self._bitsets = {} # column -> {value: packed row bitset}
+        for col in FILTER_COLUMNS:
+            groups = df.groupby(col, sort=True, observed=True).indices if self.n_rows else {}
+            self.options[col] = list(groups)
+            self._bitsets[col] = {}
+            for value, positions in groups.items():
+                rows = np.zeros(self.n_rows, dtype=bool)
+                rows[positions] = True
+                self._bitsets[col][value] = np.packbits(rows)
+
+        ovr = df['OVR'].to_numpy(dtype=float, na_value=np.nan)
+        self._ovr_order = np.argsort(ovr, kind='stable') # Missing ratings sort last, outside every range
+        self._ovr_sorted = ovr[self._ovr_order]
+        rated = self._ovr_sorted[~np.isnan(self._ovr_sorted)]
+        self.ovr_bounds = (int(rated[0]), int(rated[-1])) if len(rated) else (0, 0)
+        self.similarity = SimilarityIndex(df)
+        self.squads = SquadBuilder(df)
+        self.search = PlayerSearchIndex(df)
+        self.analytics = AnalyticsCube(df)
+
+    def filter_rows(self, selections=None, ovr_range=None):
+        """Row positions matching every {column: value} in `selections` and an inclusive OVR range, in roster order."""
+        bits = None
+        for col, value in (selections or {}).items():
+            bitset = self._bitsets[col].get(value)
+            if bitset is None:
+                return np.empty(0, dtype=np.intp)
+            bits = bitset if bits is None else bits & bitset
+        mask = None if bits is None else np.unpackbits(bits, count=self.n_rows).view(bool)
+
+        if ovr_range is not None:
+            start = np.searchsorted(self._ovr_sorted, ovr_range[0], side='left')
+            stop = np.searchsorted(self._ovr_sorted, ovr_range[1], side='right')
+            if start > 0 or stop < self.n_rows: # Skip the range mask when it keeps every player
+                in_range = np.zeros(self.n_rows, dtype=bool)
+                in_range[self._ovr_order[start:stop]] = True
+                mask = in_range if mask is None else mask & in_range
+        if mask is None:
+            return np.arange(self.n_rows)
+        return np.flatnonzero(mask)
+
+# --- Similar players ---
+
+class SimilarityIndex:
+    """Every player's ratings, standardized per attribute into one float32 matrix at load.
+
+    Outfield players are compared on the face and detailed attributes. Goalkeepers are also compared on
+    their GK ratings, which outfielders lack and count as 0 on. A query is one matrix-vector product and
+    an `argpartition`, with squared row norms precomputed.
+    """
+
+    def __init__(self, df):
+        columns = [col for col in SIMILARITY_COLUMNS if col in df.columns]
+        gk_columns = [col for col in GK_STAT_COLUMNS if col in df.columns]
+        values = df[columns + gk_columns].to_numpy(dtype=np.float32, na_value=np.nan)
+        missing = np.isnan(values)
+        counts = np.maximum((~missing).sum(axis=0), 1)
+        mean = np.where(missing, 0, values).sum(axis=0) / counts
+        std = np.sqrt(np.where(missing, 0, (values - mean) ** 2).sum(axis=0) / counts)
+        std[std == 0] = 1
+        # Missing outfield attributes count as average; missing GK ratings as 0 (no keeping ability)
+        fill = np.concatenate([mean[:len(columns)], np.zeros(len(gk_columns), dtype=np.float32)])
+        values = np.where(missing, fill, values)
+
+        self.n_rows = len(df)
+        self._has_gk = ~missing[:, len(columns):].any(axis=1) if gk_columns else np.zeros(self.n_rows, dtype=bool)
+        self._full = ((values - mean) / std).astype(np.float32)
+        self._outfield = np.ascontiguousarray(self._full[:, :len(columns)])
+        self._full_norms = np.einsum('ij,ij->i', self._full, self._full)
+        self._outfield_norms = np.einsum('ij,ij->i', self._outfield, self._outfield)
+
+    def nearest(self, row, k=10, candidate_rows=None):
+        """The `k` players closest to row `row`, among `candidate_rows` if given. Returns (rows, distances).
+
+        Distances are root-mean-square gaps in standard deviations per attribute, closest first; the
+        player itself is never returned.
+        """
+        matrix, norms = (self._full, self._full_norms) if self._has_gk[row] else (self._outfield, self._outfield_norms)
+        query = matrix[row]
+        squared = norms - 2 * (matrix @ query) + norms[row] # |x - q|^2 for every player at once
+
+        candidates = np.arange(self.n_rows) if candidate_rows is None else np.asarray(candidate_rows, dtype=np.intp)
+        candidates = candidates[candidates != row]
+        k = min(k, len(candidates))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        candidate_squared = squared[candidates]
+        top = np.argpartition(candidate_squared, k - 1)[:k]
+        top = top[np.argsort(candidate_squared[top], kind='stable')]
+        return candidates[top], np.sqrt(np.maximum(candidate_squared[top], 0) / matrix.shape[1])
+
+# --- Squad builder ---
+
+class SquadBuilder:
+    """Best starting XI and bench for a formation, with players allowed in their alternative positions.
+
+    Every position keeps a precomputed list of the players who can play it (main or alternative
+    position), best OVR first. A solve only looks at the top of those lists for the formation's slots.
+    Players are then added best-first whenever an augmenting path still matches everyone chosen to a
+    distinct slot. Without caps that greedy matching is exactly the highest-OVR XI, because the value of a
+    player does not depend on the slot. Team/nation caps and a chemistry group make it a heuristic.
+    """
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        self._ovr = df['OVR'].to_numpy(dtype=float, na_value=-1)
+        self._by_ovr = np.argsort(-self._ovr, kind='stable') # Best first; roster order breaks ties
+
+        primary = df['Position'].astype(str).to_numpy()
+        alternatives = (df['Alternative positions'].astype(object).fillna('').to_numpy()
+                        if 'Alternative positions' in df.columns else np.full(self.n_rows, ''))
+        pairs, pair_keys = pd.factorize(pd.Series(primary + '|' + alternatives.astype(str)))
+        pair_positions = [frozenset(p.strip() for p in key.replace('|', ',').split(',') if p.strip()) for key in pair_keys]
+        self._positions = [pair_positions[pair] for pair in pairs] # row -> positions it can fill
+        self._ranked = {} # position -> eligible rows, best OVR first
+        for position in {slot for slots in FORMATIONS.values() for slot in slots}:
+            can_play = np.array([position in positions for positions in pair_positions], dtype=bool)
+            eligible = can_play[pairs] if len(pairs) else np.zeros(0, dtype=bool)
+            self._ranked[position] = self._by_ovr[eligible[self._by_ovr]]
+
+        self._codes = {col: df[col].astype('category').cat.codes.to_numpy() for col in CHEMISTRY_COLUMNS if col in df.columns}
+
+    def _augment(self, row, slots, slot_rows, visited):
+        """Kuhn's augmenting path: seats `row`, moving already seated players along; leaves slot_rows as is on failure."""
+        for i, slot in enumerate(slots):
+            if i in visited or slot not in self._positions[row]:
+                continue
+            visited.add(i)
+            if slot_rows[i] is None or self._augment(slot_rows[i], slots, slot_rows, visited):
+                slot_rows[i] = row
+                return True
+        return False
+
+    def _fill(self, slots, slot_rows, candidates, caps, counts, limit=None):
+        """Greedily seats candidates (best first) that fit under the caps. Returns how many were seated."""
+        seated = 0
+        chosen = {row for row in slot_rows if row is not None}
+        for row in candidates:
+            if len(chosen) == len(slots) or (limit is not None and seated == limit):
+                break
+            row = int(row)
+            if row in chosen or any(counts[col].get(self._codes[col][row], 0) >= cap for col, cap in caps.items()):
+                continue
+            if self._augment(row, slots, slot_rows, set()):
+                chosen.add(row)
+                seated += 1
+                for col in caps:
+                    code = self._codes[col][row]
+                    counts[col][code] = counts[col].get(code, 0) + 1
+        return seated
+
+    def _solve(self, slots, pool, caps, core=None, core_size=0):
+        slot_rows = [None] * len(slots)
+        counts = {col: {} for col in caps}
+        if core is not None and self._fill(slots, slot_rows, core, caps, counts, limit=core_size) < core_size:
+            return None # The group cannot provide enough players for these slots
+        self._fill(slots, slot_rows, pool, caps, counts)
+        return slot_rows
+
+    def build(self, formation, rows=None, max_per_team=None, max_per_nation=None, chemistry=None, bench_size=BENCH_SIZE):
+        """Best XI for `formation` among `rows` (all players if None). Returns ([(slot, row or None)], bench rows).
+
+        `chemistry` is (column, n): at least n starters share one League, Nation or Team. The caps and the
+        chemistry group apply to the starting XI; the bench is the best remaining players, keeper first.
+        """
+        slots = FORMATIONS[formation]
+        allowed = np.ones(self.n_rows, dtype=bool)
+        if rows is not None:
+            allowed[:] = False
+            allowed[rows] = True
+        caps = {col: cap for col, cap in [('Team', max_per_team), ('Nation', max_per_nation)] if cap and col in self._codes}
+
+        pool_size = SQUAD_POOL_PER_POSITION if caps or chemistry else len(slots)
+        ranked = [self._ranked[slot] for slot in dict.fromkeys(slots)]
+        pool = np.unique(np.concatenate([rows_[allowed[rows_]][:pool_size] for rows_ in ranked]))
+        pool = pool[np.argsort(-self._ovr[pool], kind='stable')] if len(pool) else pool
+
+        if chemistry and chemistry[0] in self._codes:
+            col, core_size = chemistry
+            in_slots = np.zeros(self.n_rows, dtype=bool)
+            for rows_ in ranked:
+                in_slots[rows_] = True
+            members = self._by_ovr[(allowed & in_slots)[self._by_ovr]]
+            member_codes = self._codes[col][members]
+            # Strongest groups first: the summed OVR of each big enough group's best eleven
+            group_rank = pd.Series(member_codes).groupby(member_codes).cumcount().to_numpy() # members are best first
+            top = group_rank < len(slots)
+            strength = pd.Series(self._ovr[members][top]).groupby(member_codes[top]).agg(['sum', 'size'])
+            strength = strength[(strength['size'] >= core_size) & (strength.index >= 0)]
+            best, best_total = None, -np.inf
+            for code in strength['sum'].sort_values(ascending=False, kind='stable').index[:SQUAD_CHEMISTRY_CANDIDATES]:
+                core = members[member_codes == code]
+                slot_rows = self._solve(slots, np.concatenate([core, pool]), caps, core, core_size)
+                if slot_rows is None:
+                    continue
+                total = sum(self._ovr[row] for row in slot_rows if row is not None)
+                if total > best_total:
+                    best, best_total = slot_rows, total
+            slot_rows = best if best is not None else [None] * len(slots)
+        else:
+            slot_rows = self._solve(slots, pool, caps)
+
+        starters = {row for row in slot_rows if row is not None}
+        remaining = [int(row) for row in self._by_ovr[allowed[self._by_ovr]][:len(starters) + bench_size + 1] if row not in starters]
+        keepers = [int(row) for row in self._ranked['GK'][allowed[self._ranked['GK']]][:len(starters) + 2] if row not in starters]
+        bench = keepers[:1] if bench_size else [] # A backup keeper, then the best of the rest
+        bench += [row for row in remaining if row not in bench][:max(bench_size - len(bench), 0)]
+        return list(zip(slots, slot_rows)), bench
+
+# --- Name search ---
+
+def fold_text(text):
+    """Lower-cased, accent-free form of `text` with punctuation as spaces ('Aitana Bonmatí' -> 'aitana bonmati')."""
+    text = str(text)
+    if not text.isascii():
+        text = ''.join(ch for ch in unicodedata.normalize('NFKD', text) if not unicodedata.combining(ch))
+    return NON_ALPHANUMERIC.sub(' ', text.casefold()).strip()
+
+def trigrams(folded, prefix_only=False):
+    """Trigrams of each word padded with spaces, plus its first letter (' a'), so word starts count.
+
+    With `prefix_only`, words get no trailing space, as every query word may still be half typed.
+    """
+    grams = set()
+    for word in folded.split():
+        padded = f" {word}" if prefix_only else f" {word} "
+        grams.add(padded[:2])
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+class TrigramIndex:
+    """Inverted index from trigram to the distinct values containing it, over accent-folded strings."""
+
+    def __init__(self, values):
+        self.values = list(values)
+        self.folded = [fold_text(value) for value in self.values]
+        postings = {}
+        sizes = []
+        for i, text in enumerate(self.folded):
+            grams = trigrams(text)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self._sizes = np.array(sizes, dtype=np.float32)
+        self._postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        # Every word of every value, sorted, so a prefix is one searchsorted range
+        words = sorted((word, i) for i, text in enumerate(self.folded) for word in set(text.split()))
+        self._words = np.array([word for word, _ in words], dtype=str)
+        self._word_owners = np.array([i for _, i in words], dtype=np.int32)
+
+    def scores(self, folded_query):
+        """Match score (0 to 2) of every value: trigram similarity, plus 1 if a word starts with every query word."""
+        scores = np.zeros(len(self.values), dtype=np.float32)
+        query_words = folded_query.split()
+        query_grams = trigrams(folded_query, prefix_only=True)
+        hits = [self._postings[gram] for gram in query_grams if gram in self._postings]
+        if not hits:
+            return scores
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.values)).astype(np.float32)
+        recall = shared / len(query_grams)
+        dice = 2 * shared / (len(query_grams) + self._sizes) # Prefers shorter values among equal recalls
+        scores = np.where(recall >= SEARCH_MIN_SIMILARITY, (recall + dice) / 2, 0).astype(np.float32)
+        starts = np.zeros(len(self.values), dtype=np.int32) # Query words each value has a word starting with
+        for query_word in set(query_words):
+            start = np.searchsorted(self._words, query_word, side='left')
+            stop = np.searchsorted(self._words, query_word + '\U0010ffff', side='left')
+            starts[np.unique(self._word_owners[start:stop])] += 1
+        scores[starts == len(set(query_words))] += 1
+        return scores
+
+class PlayerSearchIndex:
+    """Type-ahead search over player names, and optionally teams and nations, built once at load.
+
+    Each column indexes its distinct values only (teams and nations repeat across many players), and
+    row scores are gathered through the column's category codes.
+    """
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        self._ovr = df['OVR'].to_numpy(dtype=float, na_value=-1)
+        self._fields = {}
+        for col in ['Name'] + [col for col in SEARCH_COLUMNS if col in df.columns]:
+            values = df[col].astype('category')
+            self._fields[col] = (values.cat.codes.to_numpy(), TrigramIndex(values.cat.categories))
+
+    def search(self, query, rows=None, limit=20, include_team_nation=False):
+        """Row positions best matching `query` (among `rows` if given), best first; ties go to higher OVR."""
+        folded_query = fold_text(query)
+        if not folded_query:
+            return np.empty(0, dtype=np.intp)
+        row_scores = np.zeros(self.n_rows, dtype=np.float32)
+        for col, (codes, index) in self._fields.items():
+            if col != 'Name' and not include_team_nation:
+                continue
+            value_scores = np.append(index.scores(folded_query), np.float32(0)) # Code -1 (missing) scores 0
+            row_scores = np.maximum(row_scores, value_scores[codes])
+        candidates = np.flatnonzero(row_scores) if rows is None else np.asarray(rows, dtype=np.intp)[row_scores[rows] > 0]
+        if len(candidates) > limit: # Everything scoring at least the limit-th best, so OVR can break its ties
+            cutoff = -np.partition(-row_scores[candidates], limit - 1)[limit - 1]
+            candidates = candidates[row_scores[candidates] >= cutoff]
+        order = np.lexsort((-self._ovr[candidates], -row_scores[candidates]))
+        return candidates[order][:limit]
+
+# --- Analytics cube ---
+
+class AnalyticsCube:
+    """Per-Team/Nation/League aggregates from a group-by cube built once at load.
+
+    A cell holds the players sharing a League, Team, Nation, Position and OVR. Those are every sidebar
+    filter dimension, so a filter change picks whole cells. Each cell stores its player count,
+    attribute sums and counts, and age-bucket counts. The selected cells are then summed per group with
+    `bincount`. OVR is a cell key, so median and max OVR are exact.
+    """
+
+    def __init__(self, df):
+        self.groups = {} # column -> category labels, indexed by cell code
+        keys = [col for col in ['League', 'Team', 'Nation', 'Position'] if col in df.columns] + ['OVR']
+        stats = [col for col in FACE_STAT_COLUMNS if col in df.columns]
+        frame = pd.DataFrame({col: df[col] for col in keys})
+        for col in stats:
+            frame[f"{col} sum"] = df[col].astype(float)
+            frame[f"{col} n"] = df[col].notna().astype(int)
+        ages = pd.cut(df['Age'].astype(float), AGE_BINS, right=False, labels=AGE_BIN_LABELS) if 'Age' in df.columns else None
+        for label in AGE_BIN_LABELS:
+            frame[label] = (ages == label).astype(int) if ages is not None else 0
+        frame['Players'] = 1
+        cells = frame.groupby(keys, observed=True, sort=False, dropna=False).sum().reset_index()
+        cells = cells[cells['OVR'].notna()] # Players without a rating fall outside every OVR range
+
+        self.n_cells = len(cells)
+        self.stats = stats
+        self._codes = {}
+        for col in keys[:-1]:
+            values = cells[col].astype('category') if cells[col].dtype != 'category' else cells[col]
+            self._codes[col] = values.cat.codes.to_numpy().astype(np.intp)
+            self.groups[col] = values.cat.categories
+        self._ovr = cells['OVR'].to_numpy(dtype=float)
+        self._players = cells['Players'].to_numpy(dtype=float)
+        self._stat_sums = cells[[f"{col} sum" for col in stats]].to_numpy(dtype=float)
+        self._stat_counts = cells[[f"{col} n" for col in stats]].to_numpy(dtype=float)
+        self._ages = cells[AGE_BIN_LABELS].to_numpy(dtype=float)
+
+    def cell_mask(self, selections=None, ovr_range=None):
+        """Cells matching every {column: value} in `selections` and an inclusive OVR range."""
+        mask = np.ones(self.n_cells, dtype=bool)
+        for col, value in (selections or {}).items():
+            categories = self.groups.get(col)
+            if categories is None or value not in categories:
+                return np.zeros(self.n_cells, dtype=bool)
+            mask &= self._codes[col] == categories.get_loc(value)
+        if ovr_range is not None:
+            mask &= (self._ovr >= ovr_range[0]) & (self._ovr <= ovr_range[1])
+        return mask
+
+    def summary(self, group_col, selections=None, ovr_range=None):
+        """Aggregates per `group_col` value over the selected cells: (summary, position mix, age distribution).
+
+        The summary holds player count, mean/median/max OVR and mean face stats. The position mix and
+        age distribution are shares of each group's players. Groups without selected players are left out.
+        """
+        cells = np.flatnonzero(self.cell_mask(selections, ovr_range))
+        cells = cells[self._codes[group_col][cells] >= 0] # Players missing this column belong to no group
+        labels = self.groups[group_col]
+        n_groups = len(labels)
+        codes = self._codes[group_col][cells]
+        players = self._players[cells]
+        count = np.bincount(codes, weights=players, minlength=n_groups)
+        present = np.flatnonzero(count)
+        index = pd.Index(labels[present], name=group_col)
+
+        # Median and max: walk each group's cells in OVR order on one cumulative player count
+        order = np.lexsort((self._ovr[cells], codes))
+        cumulative = np.cumsum(players[order])
+        group_start = np.concatenate([[0], np.cumsum(count)[:-1]])[present]
+        total = count[present]
+        ovr_sorted = self._ovr[cells][order]
+        lower = ovr_sorted[np.searchsorted(cumulative, group_start + (total + 1) // 2, side='left')]
+        upper = ovr_sorted[np.searchsorted(cumulative, group_start + total // 2 + 1, side='left')]
+        highest = ovr_sorted[np.searchsorted(cumulative, group_start + total, side='left')]
+
+        summary = pd.DataFrame({
+            'Players': total.astype(int),
+            'Mean OVR': np.bincount(codes, weights=self._ovr[cells] * players, minlength=n_groups)[present] / total,
+            'Median OVR': (lower + upper) / 2,
+            'Max OVR': highest.astype(int),
+        }, index=index)
+        for i, col in enumerate(self.stats):
+            sums = np.bincount(codes, weights=self._stat_sums[cells, i], minlength=n_groups)[present]
+            counts = np.bincount(codes, weights=self._stat_counts[cells, i], minlength=n_groups)[present]
+            summary[col] = np.divide(sums, counts, out=np.full(len(present), np.nan), where=counts > 0)
+
+        positions = self.groups['Position']
+        position_codes = self._codes['Position'][cells]
+        position_counts = np.bincount(codes * len(positions) + np.maximum(position_codes, 0), weights=players * (position_codes >= 0),
+                                      minlength=n_groups * len(positions)).reshape(n_groups, len(positions))[present]
+        position_mix = pd.DataFrame(position_counts / position_counts.sum(axis=1, keepdims=True).clip(min=1), index=index, columns=list(positions))
+        position_mix = position_mix.loc[:, position_counts.sum(axis=0) > 0]
+
+        age_counts = np.stack([np.bincount(codes, weights=self._ages[cells, i], minlength=n_groups)[present]
+                               for i in range(len(AGE_BIN_LABELS))], axis=1)
+        age_totals = age_counts.sum(axis=1, keepdims=True)
+        ages = pd.DataFrame(np.divide(age_counts, age_totals, out=np.zeros(age_counts.shape), where=age_totals > 0),
+                            index=index, columns=AGE_BIN_LABELS)
+        return summary, position_mix, ages
+
+# --- Shared roster ---
+
+class PlayersDataCache:
+    """Process-wide holder for the typed roster, shared by every browser session.
+
+    Sources are tried in order. A local source is re-checked by mtime on every call (a single stat, no
+    read); a remote one at most every `refresh_seconds`. The CSV is only parsed when no snapshot of the
+    current source version exists.
+    """
+
+    def __init__(self, sources, snapshot_dir=SNAPSHOT_DIR, refresh_seconds=PLAYERS_REFRESH_SECONDS):
+        self.sources = list(sources) # Tried in order; later entries are fallbacks
+        self.snapshot_dir = snapshot_dir
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._df = None
+        self._index = None
+        self._key = None
+        self._source = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def _is_fresh(self, now):
+        if self._df is None:
+            return False
+        if self._mtime is not None: # Local file: cheap mtime check catches edits immediately
+            try:
+                return os.path.getmtime(self._source) == self._mtime
+            except OSError:
+                return False
+        return now - self._checked_at < self.refresh_seconds
+
+    def get(self):
+        """Returns (read-only roster view, its PlayersIndex, version key), reloading from the sources if needed."""
+        with self._lock:
+            now = time.monotonic()
+            if not self._is_fresh(now):
+                last_error = None
+                for source in self.sources:
+                    try:
+                        df, mtime, key = load_players(source, self.snapshot_dir)
+                        break
+                    except Exception as e: # Fall back to the next source
+                        last_error = e
+                else:
+                    if self._df is None:
+                        raise last_error
+                    df = None # Keep serving the last good roster until a source comes back
+                    self._checked_at = now
+
+                if df is not None:
+                    self._source, self._mtime, self._checked_at = source, mtime, now
+                    if key != self._key:
+                        self._df, self._index, self._key = df, PlayersIndex(df), key
+            # A shallow copy shares the typed columns; copy-on-write keeps session changes private
+            return self._df.copy(deep=False), self._index, self._key
@@ -0,0 +1,205 @@
+"""Checks for the roster loader and the precomputed indexes in players_engine, against plain pandas answers."""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import players_engine
+from players_engine import (AGE_BIN_LABELS, AGE_BINS, FACE_STAT_COLUMNS, FORMATIONS, GK_STAT_COLUMNS, LOCAL_DATA_PATH,
+                            SIMILARITY_COLUMNS, PlayersIndex, SquadBuilder, fold_text, load_players, parse_players)
+
+
+@pytest.fixture(scope="module")
+def roster(tmp_path_factory):
+    df, _, _ = load_players(LOCAL_DATA_PATH, str(tmp_path_factory.mktemp("snapshots")))
+    return df
+
+
+@pytest.fixture(scope="module")
+def index(roster):
+    return PlayersIndex(roster)
+
+
+# --- Loading ---
+
+def test_roster_is_parsed_into_compact_types(roster):
+    assert not [col for col in roster.columns if col.startswith('Unnamed')]
+    assert roster['OVR'].dtype == 'uint8'
+    assert roster['GK Diving'].dtype == 'UInt8'
+    assert roster.loc[roster['Position'] != 'GK', 'GK Diving'].isna().all()
+    assert roster['Team'].dtype == 'category'
+    assert roster['Height (cm)'].between(140, 210).all()
+    assert roster.loc[roster['Name'] == "Aitana Bonmatí", 'Full Position'].iloc[0] == "Central Midfielder"
+
+
+def test_unchanged_roster_is_read_from_its_snapshot(roster, tmp_path, monkeypatch):
+    first, mtime, key = load_players(LOCAL_DATA_PATH, str(tmp_path))
+    monkeypatch.setattr(players_engine, 'parse_players', lambda raw: pytest.fail("CSV parsed again"))
+    again, again_mtime, again_key = load_players(LOCAL_DATA_PATH, str(tmp_path))
+    pd.testing.assert_frame_equal(again, first)
+    pd.testing.assert_frame_equal(again, roster)
+    assert (again_mtime, again_key) == (mtime, key)
+    assert len(list(tmp_path.glob("*.feather"))) == 1
+
+
+def test_roster_without_required_columns_is_rejected():
+    with pytest.raises(ValueError, match="OVR"):
+        parse_players(b"Name,Position,Team,Nation\nA,ST,X,Y\n")
+
+
+# --- Filter index ---
+
+@pytest.mark.parametrize("selections, ovr_range", [
+    (None, None),
+    ({'Team': "FC Barcelona"}, None),
+    ({'Nation': "England", 'Position': "CB"}, (75, 85)),
+    (None, (88, 99)),
+    ({'Team': "No Such Team"}, None),
+])
+def test_filter_rows_match_boolean_masks(roster, index, selections, ovr_range):
+    mask = pd.Series(True, index=roster.index)
+    for col, value in (selections or {}).items():
+        mask &= roster[col] == value
+    if ovr_range is not None:
+        mask &= roster['OVR'].between(*ovr_range)
+    np.testing.assert_array_equal(index.filter_rows(selections, ovr_range), np.flatnonzero(mask))
+
+
+# --- Similar players ---
+
+@pytest.mark.parametrize("position", ["ST", "GK"])
+def test_nearest_players_match_brute_force_distances(roster, index, position):
+    row = int(np.flatnonzero(roster['Position'] == position)[0])
+    columns = SIMILARITY_COLUMNS + (GK_STAT_COLUMNS if position == "GK" else [])
+    values = roster[columns].astype(float)
+    mean, std = values.mean(), values.std(ddof=0)
+    filled = values.fillna({col: 0.0 if col in GK_STAT_COLUMNS else mean[col] for col in columns}) # Outfielders have no GK ratings
+    scaled = (filled - mean) / std
+    distances = np.sqrt(((scaled - scaled.iloc[row]) ** 2).mean(axis=1)).drop(index=row).sort_values()
+
+    rows, found = index.similarity.nearest(row, k=10)
+    assert row not in rows
+    np.testing.assert_allclose(found, distances.iloc[:10], rtol=1e-4)
+    np.testing.assert_allclose(distances.loc[rows], found, rtol=1e-4)
+
+
+def test_nearest_players_stay_within_the_candidates(roster, index):
+    candidates = index.filter_rows({'Position': "CB"})
+    rows, distances = index.similarity.nearest(int(candidates[0]), k=5, candidate_rows=candidates)
+    assert len(rows) == 5
+    assert set(rows) <= set(candidates[1:])
+    assert (np.diff(distances) >= 0).all()
+    assert len(index.similarity.nearest(int(candidates[0]), k=5, candidate_rows=candidates[:1])[0]) == 0
+
+
+# --- Squad builder ---
+
+def can_seat_all(players, slots, positions):
+    """True if every player gets a distinct slot they can play (simple augmenting paths)."""
+    seated = [None] * len(slots)
+
+    def seat(player, tried):
+        for i, slot in enumerate(slots):
+            if i not in tried and slot in positions[player]:
+                tried.add(i)
+                if seated[i] is None or seat(seated[i], tried):
+                    seated[i] = player
+                    return True
+        return False
+
+    return all(seat(player, set()) for player in players)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_uncapped_xi_is_the_best_possible(seed):
+    rng = np.random.default_rng(seed)
+    slots = FORMATIONS["4-4-2"]
+    names = sorted(set(slots))
+    primary = slots + list(rng.choice(names, 5)) # The first eleven alone can fill the formation
+    alternatives = [",".join(rng.choice(names, rng.integers(0, 3), replace=False)) for _ in primary]
+    roster = pd.DataFrame({
+        'OVR': rng.permutation(np.arange(60, 60 + len(primary))), 'Position': primary, 'Alternative positions': alternatives,
+        'Team': "T", 'Nation': "N", 'League': "L",
+    })
+    positions = [{primary[i], *filter(None, alternatives[i].split(","))} for i in range(len(primary))]
+    best = max(roster['OVR'].iloc[list(xi)].sum() for xi in itertools.combinations(range(len(primary)), len(slots))
+               if can_seat_all(xi, slots, positions))
+
+    lineup, bench = SquadBuilder(roster).build("4-4-2", bench_size=3)
+    starters = [row for _, row in lineup]
+    assert None not in starters and len(set(starters)) == len(slots)
+    assert all(slot in positions[row] for slot, row in lineup)
+    assert roster['OVR'].iloc[starters].sum() == best
+    assert not set(bench) & set(starters)
+
+
+def test_caps_and_chemistry_hold_on_the_full_roster(roster, index):
+    lineup, bench = index.squads.build("4-3-3", max_per_team=2, max_per_nation=3, chemistry=('League', 6))
+    starters = [row for _, row in lineup]
+    assert None not in starters
+    xi = roster.iloc[starters]
+    assert xi['Team'].value_counts().max() <= 2
+    assert xi['Nation'].value_counts().max() <= 3
+    assert xi['League'].value_counts().max() >= 6
+    for slot, row in lineup:
+        alternatives = roster['Alternative positions'].iloc[row]
+        assert slot == roster['Position'].iloc[row] or slot in str(alternatives).replace(" ", "").split(",")
+    assert roster['Position'].iloc[bench[0]] == "GK"
+    assert len(bench) == 7 and not set(bench) & set(starters)
+
+
+# --- Name search ---
+
+def test_fold_text_drops_case_accents_and_punctuation():
+    assert fold_text("Aitana Bonmatí") == "aitana bonmati"
+    assert fold_text("  Marie-Antoinette KATOTO ") == "marie antoinette katoto"
+
+
+@pytest.mark.parametrize("query", ["bonmati", "Bonmatí", "aitana bon", "bonmatti"])
+def test_search_finds_names_from_partial_accentless_or_misspelt_queries(roster, index, query):
+    assert roster['Name'].iloc[index.search.search(query, limit=3)[0]] == "Aitana Bonmatí"
+
+
+def test_search_breaks_ties_by_ovr_and_respects_rows(roster, index):
+    matches = index.search.search("sam kerr", limit=2)
+    assert (roster['Name'].iloc[matches] == "Sam Kerr").all()
+    assert roster['OVR'].iloc[matches[0]] >= roster['OVR'].iloc[matches[1]]
+    strikers = index.filter_rows({'Position': "ST"})
+    assert set(index.search.search("kerr", strikers)) <= set(strikers)
+    assert len(index.search.search("  ")) == 0
+
+
+def test_search_covers_teams_only_when_asked(index):
+    team_rows = index.filter_rows({'Team': "FC Barcelona"})
+    assert set(team_rows) <= set(index.search.search("barcelona", limit=100, include_team_nation=True))
+    assert len(index.search.search("barcelona", limit=100)) < len(team_rows) # Only names that look alike
+
+
+# --- Analytics cube ---
+
+@pytest.mark.parametrize("group_col, selections, ovr_range", [
+    ("Team", None, None),
+    ("Nation", {'Position': "ST"}, (70, 95)),
+    ("League", {'Nation': "Spain"}, None),
+])
+def test_group_summaries_match_a_pandas_groupby(roster, index, group_col, selections, ovr_range):
+    rows = roster.take(index.filter_rows(selections, ovr_range))
+    groups = rows.assign(OVR=rows['OVR'].astype(float)).groupby(group_col, observed=True)
+    summary, position_mix, ages = index.analytics.summary(group_col, selections, ovr_range)
+
+    expected = pd.DataFrame({
+        'Players': groups.size(), 'Mean OVR': groups['OVR'].mean(), 'Median OVR': groups['OVR'].median(),
+        'Max OVR': groups['OVR'].max(), **{col: groups[col].mean() for col in FACE_STAT_COLUMNS},
+    })
+    summary = summary.sort_index()
+    pd.testing.assert_frame_equal(summary, expected.sort_index(), check_dtype=False, check_index_type=False,
+                                  check_categorical=False)
+    expected_mix = pd.crosstab(rows[group_col].astype(object), rows['Position'].astype(object), normalize='index')
+    pd.testing.assert_frame_equal(position_mix.loc[expected_mix.index, expected_mix.columns], expected_mix,
+                                  check_names=False, check_index_type=False)
+    age_shares = pd.cut(rows['Age'].astype(float), AGE_BINS, right=False, labels=AGE_BIN_LABELS)
+    expected_ages = pd.crosstab(rows[group_col].astype(object), age_shares, normalize='index').reindex(columns=AGE_BIN_LABELS, fill_value=0.0)
+    pd.testing.assert_frame_equal(ages.loc[expected_ages.index], expected_ages, check_names=False, check_index_type=False,
+                                  check_column_type=False)
@@ -0,0 +1,53 @@
+"""Local HTTP stand-in for remote catalog sources, with an optional per-request delay.
+
+Serves a folder (e.g. one written by `synthetic_data.write_catalog_sources`) the way a CDN would,
+including Last-Modified / 304 Not Modified, so manifest loading can be timed and tested offline:
+
+    python benchmarks/catalog_server.py /tmp/catalog_sources --port 8765 --delay 0.5
+    BLINDBOX_CATALOG_MANIFEST=/tmp/catalog_sources/manifest.txt streamlit run StreamlitAppFinal/Streamlit.py
+"""
+
+import argparse
+import functools
+import http.server
+import threading
+import time
+
+
+class SlowFileHandler(http.server.SimpleHTTPRequestHandler):
+    """Static file handler that sleeps `delay` seconds before answering each request."""
+
+    delay = 0.0
+
+    def send_head(self):
+        time.sleep(self.delay)
+        return super().send_head()
+
+    def log_message(self, format, *args):
+        pass # Keep benchmark output quiet
+
+
+def start_server(directory, port=0, delay=0.0):
+    """Serves `directory` on a background thread. Returns (server, base URL); call server.shutdown() to stop."""
+    handler = type('Handler', (SlowFileHandler,), {'delay': delay})
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), functools.partial(handler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a folder of catalog CSVs over local HTTP.")
+    parser.add_argument('directory', help="Folder to serve")
+    parser.add_argument('--port', type=int, default=8765, help="Port (default: 8765)")
+    parser.add_argument('--delay', type=float, default=0.0, help="Seconds to wait before each response (default: 0)")
+    args = parser.parse_args()
+    server, base_url = start_server(args.directory, args.port, args.delay)
+    print(f"Serving {args.directory} at {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+"""Rerun-latency benchmarks for the portfolio's Streamlit apps, driven headlessly with AppTest.
+
+For every app and dataset size, synthetic data is generated (see `synthetic_data.py`) and the app
+is run in a fresh Python process: cold start, an idle rerun, then one timed rerun per sidebar or tab
+action. Each step records wall time, the process' peak RSS so far and any exceptions the app raised.
+Results are written as JSON so runs can be compared:
+
+    python benchmarks/run_benchmarks.py                                # both apps, 10^2..10^5 rows
+    python benchmarks/run_benchmarks.py --app blindbox --sizes 100,1000000 --repeat 5
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results/before.json
+
+With --baseline, steps that got slower by more than --threshold are listed and the exit code is 1.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARK_DIR)
+BLINDBOX_APP_DIR = os.path.join(REPO_ROOT, 'StreamlitAppFinal')
+PLAYERS_APP_DIR = os.path.join(REPO_ROOT, 'basic_streamlit_app')
+APPS = {
+    'blindbox': os.path.join(BLINDBOX_APP_DIR, 'Streamlit.py'),
+    'players': os.path.join(PLAYERS_APP_DIR, 'main.py'),
+}
+
+DEFAULT_SIZES = (100, 1_000, 10_000, 100_000)
+DEFAULT_RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+APP_TIMEOUT_SECONDS = 1800 # Per rerun; 10^6-row catalogs take a while
+REGRESSION_THRESHOLD = 0.25 # Relative slowdown flagged against a baseline
+REGRESSION_NOISE_SECONDS = 0.05 # Slowdowns smaller than this are ignored as noise
+BENCHMARK_COLLECTION_ID = "benchmark"
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024) # Bytes on macOS, KiB on Linux
+
+
+class StepRecorder:
+    """Times AppTest reruns (or plain callables) and collects one result dict per step."""
+
+    def __init__(self, app_test):
+        self.app_test = app_test
+        self.steps = []
+
+    def rerun(self, step, change=None):
+        """Applies `change(app_test)` (a widget interaction), then times the rerun it triggers."""
+        if change is not None:
+            change(self.app_test)
+        started = time.perf_counter()
+        self.app_test.run()
+        self._record(step, time.perf_counter() - started, [str(e.value) for e in self.app_test.exception])
+
+    def call(self, step, func):
+        """Times a headless call that has no widget of its own (e.g. the upload merge)."""
+        started = time.perf_counter()
+        func()
+        self._record(step, time.perf_counter() - started, [])
+
+    def _record(self, step, seconds, exceptions):
+        self.steps.append({'step': step, 'seconds': seconds, 'peak_rss_mb': round(_peak_rss_mb(), 1), 'exceptions': exceptions})
+
+
+def _by_label(widgets, label_prefix):
+    return next(w for w in widgets if w.label.startswith(label_prefix))
+
+
+# --- Scenarios (run inside the child process) ---
+
+def run_blindbox_scenario(data_dir):
+    from streamlit.testing.v1 import AppTest
+
+    os.environ['BLINDBOX_CATALOG'] = os.path.join(data_dir, 'catalog.csv')
+    os.environ['BLINDBOX_COLLECTION_DB'] = os.path.join(data_dir, 'collections.db')
+    os.environ['BLINDBOX_THUMBNAIL_DIR'] = os.path.join(data_dir, 'thumbnails')
+    at = AppTest.from_file(APPS['blindbox'], default_timeout=APP_TIMEOUT_SECONDS)
+    recorder = StepRecorder(at)
+
+    def select_sub_series(at):
+        for widget in at.sidebar.multiselect:
+            if widget.key and widget.key.startswith('sub_series_multiselect_'):
+                widget.set_value(widget.options)
+
+    def select_targets(at): # Unowned figures, so the probability tabs have work to do
+        import pandas as pd
+        owned = set(pd.read_csv(os.path.join(data_dir, 'collection.csv'))['figure_name'])
+        targets = _by_label(at.sidebar.multiselect, "Select Your Target Figures")
+        targets.set_value([name for name in targets.options if name not in owned][:3])
+
+    def select_prob_sub_series(at):
+        selector = at.selectbox(key='prob_sub_series_select')
+        selector.set_value(selector.options[1])
+
+    def browse_first_character(at):
+        selector = at.selectbox(key='browse_char_series_filter')
+        selector.set_value(selector.options[1])
+
+    recorder.rerun('cold_start')
+    recorder.rerun('rerun_idle')
+    recorder.rerun('open_saved_collection', lambda at: at.text_input(key='collection_db_name').input(BENCHMARK_COLLECTION_ID))
+    recorder.rerun('select_character_series', lambda at: at.multiselect(key='character_series_selector_main').set_value(
+        at.multiselect(key='character_series_selector_main').options[:2]))
+    recorder.rerun('select_sub_series', select_sub_series)
+    recorder.rerun('show_figures', lambda at: at.button(key='filter_figures_button').click())
+    recorder.rerun('manage_page_size_100', lambda at: at.selectbox(key='manage_page_size').set_value(100))
+    recorder.rerun('manage_search', lambda at: at.text_input(key='manage_search').input("series"))
+    recorder.rerun('manage_bulk_edit_view', lambda at: at.radio(key='manage_view_mode').set_value("Bulk Edit Table"))
+    recorder.rerun('manage_cards_view', lambda at: at.radio(key='manage_view_mode').set_value("Cards"))
+    recorder.rerun('set_targets', select_targets)
+    recorder.rerun('prob_select_sub_series', select_prob_sub_series)
+    recorder.rerun('sim_budget_rule', lambda at: at.selectbox(key='sim_stop_rule').set_value("My budget runs out"))
+    recorder.rerun('browse_filter', browse_first_character)
+    recorder.rerun('rerun_loaded')
+
+    # The upload merge runs inside a file-uploader callback AppTest can't drive, so time the engine call it makes
+    import pandas as pd
+    from blindbox_engine import CollectionStore, prepare_collection_upload
+    upload_df = pd.read_csv(os.path.join(data_dir, 'collection.csv'))
+    store = CollectionStore()
+    store.bulk_upsert(prepare_collection_upload(upload_df.iloc[::2])) # Half the rows already owned
+    recorder.call('upload_merge', lambda: store.bulk_upsert(prepare_collection_upload(upload_df)))
+    return recorder.steps
+
+
+def run_players_scenario(data_dir):
+    from streamlit.testing.v1 import AppTest
+
+    os.environ['FEMALE_PLAYERS_CSV'] = os.path.join(data_dir, 'female_players.csv')
+    os.environ['FEMALE_PLAYERS_SNAPSHOT_DIR'] = os.path.join(data_dir, 'snapshots') # First repeat parses, later ones restart from the snapshot
+    at = AppTest.from_file(APPS['players'], default_timeout=APP_TIMEOUT_SECONDS)
+    recorder = StepRecorder(at)
+
+    def select_first(label):
+        def change(at):
+            selector = _by_label(at.sidebar.selectbox, label)
+            selector.set_value(selector.options[1])
+        return change
+
+    def narrow_rating(at):
+        slider = _by_label(at.sidebar.slider, "Overall Rating Range")
+        low, high = slider.min, slider.max
+        slider.set_range(low + (high - low) // 4, high - (high - low) // 4)
+
+    def select_last_player(at):
+        selector = _by_label(at.selectbox, "Select a player")
+        selector.set_value(selector.options[-1])
+
+    recorder.rerun('cold_start')
+    recorder.rerun('rerun_idle')
+    recorder.rerun('select_team', select_first("Select a Team"))
+    recorder.rerun('reset_team', lambda at: _by_label(at.sidebar.selectbox, "Select a Team").set_value("All"))
+    recorder.rerun('select_position', select_first("Select a Position"))
+    recorder.rerun('narrow_rating', narrow_rating)
+    recorder.rerun('search_player', lambda at: _by_label(at.text_input, "Search players").input("player 00"))
+    recorder.rerun('select_player', select_last_player)
+    return recorder.steps
+
+
+SCENARIOS = {'blindbox': run_blindbox_scenario, 'players': run_players_scenario}
+
+
+# --- Orchestration (parent process) ---
+
+def prepare_data(app, n_rows, data_dir):
+    """Writes the synthetic inputs an app's scenario reads."""
+    sys.path.insert(0, BENCHMARK_DIR)
+    import synthetic_data
+
+    if app == 'players':
+        synthetic_data.make_roster(n_rows).to_csv(os.path.join(data_dir, 'female_players.csv'))
+        return
+    photo_paths = synthetic_data.write_photos(os.path.join(data_dir, 'photos')) # Local photos keep runs off the network
+    catalog_df = synthetic_data.make_catalog(n_rows, photo_sources=photo_paths)
+    catalog_df.to_csv(os.path.join(data_dir, 'catalog.csv'), index=False)
+    collection_df = synthetic_data.make_collection(catalog_df, max(1, n_rows // 2))
+    collection_df.to_csv(os.path.join(data_dir, 'collection.csv'), index=False)
+
+    sys.path.insert(0, BLINDBOX_APP_DIR)
+    from blindbox_engine import SQLiteCollectionStore, prepare_collection_upload
+    store = SQLiteCollectionStore(os.path.join(data_dir, 'collections.db'), BENCHMARK_COLLECTION_ID)
+    store.bulk_upsert(prepare_collection_upload(collection_df))
+
+
+def run_child(app, data_dir):
+    """Runs one scenario in a fresh interpreter so cold start and peak memory are per run."""
+    result_path = os.path.join(data_dir, 'result.json')
+    app_dir = os.path.dirname(APPS[app])
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', app, data_dir, result_path],
+        cwd=app_dir, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{app} scenario failed:\n{completed.stderr[-4000:]}")
+    with open(result_path) as f:
+        return json.load(f)
+
+
+def summarize_runs(runs):
+    """Median/min/max seconds and the highest peak RSS per step across repeated runs."""
+    summary = []
+    for step_runs in zip(*runs):
+        seconds = [run['seconds'] for run in step_runs]
+        summary.append({
+            'step': step_runs[0]['step'],
+            'median_seconds': statistics.median(seconds),
+            'min_seconds': min(seconds),
+            'max_seconds': max(seconds),
+            'peak_rss_mb': max(run['peak_rss_mb'] for run in step_runs),
+            'exceptions': sorted({e for run in step_runs for e in run['exceptions']}),
+        })
+    return summary
+
+
+def _environment():
+    def version(module):
+        try:
+            return __import__(module).__version__
+        except ImportError:
+            return None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'git_commit': commit or None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'packages': {module: version(module) for module in ('streamlit', 'pandas', 'numpy', 'matplotlib')},
+    }
+
+
+def compare_to_baseline(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Steps whose median got slower than the baseline's by more than `threshold` (relative)."""
+    baseline_steps = {
+        (scenario['app'], scenario['rows'], step['step']): step['median_seconds']
+        for scenario in baseline['scenarios'] for step in scenario['steps']
+    }
+    regressions = []
+    for scenario in results['scenarios']:
+        for step in scenario['steps']:
+            before = baseline_steps.get((scenario['app'], scenario['rows'], step['step']))
+            after = step['median_seconds']
+            if before is not None and after > before * (1 + threshold) and after - before > REGRESSION_NOISE_SECONDS:
+                regressions.append({'app': scenario['app'], 'rows': scenario['rows'], 'step': step['step'],
+                                    'baseline_seconds': before, 'seconds': after, 'ratio': after / before})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Streamlit app reruns on synthetic data.")
+    parser.add_argument('--app', choices=[*APPS, 'all'], default='all')
+    parser.add_argument('--sizes', default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="Comma-separated row counts (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=3, help="Fresh-process runs per app and size (default: 3)")
+    parser.add_argument('--output', help="Results JSON path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--baseline', help="Earlier results JSON to check for regressions")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help="Relative slowdown that counts as a regression")
+    parser.add_argument('--child', nargs=3, metavar=('APP', 'DATA_DIR', 'RESULT_PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child: # Inside the fresh interpreter started by run_child
+        app, data_dir, result_path = args.child
+        with open(result_path, 'w') as f:
+            json.dump(SCENARIOS[app](data_dir), f)
+        return 0
+
+    apps = list(APPS) if args.app == 'all' else [args.app]
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results = {'created': datetime.datetime.now().isoformat(timespec='seconds'), 'repeat': args.repeat,
+               **_environment(), 'scenarios': []}
+    for app in apps:
+        for n_rows in sizes:
+            with tempfile.TemporaryDirectory() as data_dir:
+                prepare_data(app, n_rows, data_dir)
+                runs = [run_child(app, data_dir) for _ in range(args.repeat)]
+            steps = summarize_runs(runs)
+            results['scenarios'].append({'app': app, 'rows': n_rows, 'steps': steps})
+            slowest = max(steps, key=lambda step: step['median_seconds'])
+            print(f"{app:>9} {n_rows:>9,} rows: cold start {steps[0]['median_seconds']:.2f}s, "
+                  f"slowest step {slowest['step']} {slowest['median_seconds']:.2f}s, "
+                  f"peak RSS {max(step['peak_rss_mb'] for step in steps):.0f} MB", file=sys.stderr)
+
+    output = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['app']} {r['rows']:,} rows {r['step']}: "
+                  f"{r['baseline_seconds']:.3f}s -> {r['seconds']:.3f}s (x{r['ratio']:.2f})", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Synthetic datasets shaped like the portfolio apps' real inputs, at any size.
+
+- `make_catalog`: a `box_data.csv`-shaped blind-box catalog (sub-series of ~12 regular figures plus a secret).
+- `write_catalog_sources`: that catalog split into per-series CSV files listed in a manifest.
+- `make_collection`: a personal collection CSV for that catalog, as uploaded in the app.
+- `make_roster`: a `female_players.csv`-shaped roster with the same columns and value formats.
+
+Every generator is seeded, so the same size and seed always give the same frame.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+FIGURES_PER_SUB_SERIES = 12
+SUB_SERIES_PER_CHARACTER = 8
+BOX_PRICES = ["$14.99", "$15.99", "$16.99", "$17.99", "$18.99"]
+
+PLAYER_POSITIONS = ['CB', 'CM', 'ST', 'GK', 'RB', 'LB', 'CDM', 'LM', 'RM', 'CAM', 'RW', 'LW']
+PLAYER_POSITION_WEIGHTS = [261, 249, 242, 183, 123, 119, 117, 67, 65, 63, 45, 42] # Shares in the real roster
+PLAYER_FACE_STATS = ['PAC', 'SHO', 'PAS', 'DRI', 'DEF', 'PHY']
+PLAYER_DETAIL_STATS = [
+    'Acceleration', 'Sprint Speed', 'Positioning', 'Finishing', 'Shot Power', 'Long Shots', 'Volleys', 'Penalties',
+    'Vision', 'Crossing', 'Free Kick Accuracy', 'Short Passing', 'Long Passing', 'Curve', 'Dribbling', 'Agility',
+    'Balance', 'Reactions', 'Ball Control', 'Composure', 'Interceptions', 'Heading Accuracy', 'Def Awareness',
+    'Standing Tackle', 'Sliding Tackle', 'Jumping', 'Stamina', 'Strength', 'Aggression'
+]
+PLAYER_GK_STATS = ['GK Diving', 'GK Handling', 'GK Kicking', 'GK Positioning', 'GK Reflexes']
+PLAYER_STYLES = ['Technical', 'Finesse Shot', 'First Touch', 'Incisive Pass', 'Pinged Pass', 'Relentless', 'Tiki Taka',
+                 'Rapid', 'Power Header', 'Intercept', 'Block', 'Bruiser', 'Quick Step', 'Trivela', 'Far Reach']
+
+
+def make_catalog(n_rows, seed=0, photo_sources=None):
+    """Blind-box catalog with `n_rows` figures in the raw CSV format (prices like '$15.99', odds like '1/12').
+
+    Figure photos cycle through `photo_sources` if given (e.g. local files, to keep runs off the network).
+    """
+    rng = np.random.default_rng(seed)
+    per_series = FIGURES_PER_SUB_SERIES + 1
+    figure_index = np.arange(n_rows)
+    sub_series_index = figure_index // per_series
+    slot = figure_index % per_series
+    is_secret = slot == FIGURES_PER_SUB_SERIES
+    series_price = rng.choice(BOX_PRICES, size=sub_series_index.max() + 1)
+    return pd.DataFrame({
+        'character_name': [f"Character {i:05d}" for i in sub_series_index // SUB_SERIES_PER_CHARACTER],
+        'series_name': [f"Series {i:06d}" for i in sub_series_index],
+        'figure_name': [f"Figure {i:07d}" for i in figure_index],
+        'price': series_price[sub_series_index],
+        'probability': np.where(is_secret, "1/144", f"1/{FIGURES_PER_SUB_SERIES}"),
+        'figure_photo': (np.resize(np.asarray(photo_sources, dtype=object), n_rows) if photo_sources is not None
+                         else [f"https://example.com/figures/{i:07d}.jpg" for i in figure_index]),
+    })
+
+
+def write_catalog_sources(directory, catalog_df, n_files, base_url=None):
+    """Splits a `make_catalog` frame into `n_files` per-character CSVs plus a `manifest.txt` listing them.
+
+    The manifest lists `base_url/<file>` URLs when `base_url` is given (e.g. a local `catalog_server.py`),
+    otherwise the file names. Returns the manifest path.
+    """
+    os.makedirs(directory, exist_ok=True)
+    characters = catalog_df['character_name'].unique()
+    entries = []
+    for i, file_characters in enumerate(np.array_split(characters, n_files)):
+        file_name = f"series_{i:04d}.csv"
+        catalog_df[catalog_df['character_name'].isin(file_characters)].to_csv(os.path.join(directory, file_name), index=False)
+        entries.append(f"{base_url.rstrip('/')}/{file_name}" if base_url else file_name)
+    manifest_path = os.path.join(directory, "manifest.txt")
+    with open(manifest_path, 'w', encoding='utf-8') as fh:
+        fh.write("\n".join(entries) + "\n")
+    return manifest_path
+
+
+def write_photos(directory, count=16, size=1200):
+    """Writes `count` full-size JPEG figure photos (like the catalog's CDN images) and returns their paths."""
+    from PIL import Image
+
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(count)
+    paths = []
+    for i in range(count):
+        pixels = rng.integers(0, 256, (size // 8, size // 8, 3), dtype=np.uint8) # Blocky noise compresses like a photo
+        path = os.path.join(directory, f"figure_{i:02d}.jpg")
+        Image.fromarray(pixels).resize((size, size)).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def make_collection(catalog_df, n_rows, seed=0):
+    """Collection CSV owning `n_rows` random figures of a `make_catalog` frame (all of them if it is smaller)."""
+    rng = np.random.default_rng(seed)
+    picks = catalog_df.iloc[np.sort(rng.choice(len(catalog_df), size=min(n_rows, len(catalog_df)), replace=False))]
+    owned_dates = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 730, len(picks)), unit='D')
+    return pd.DataFrame({
+        'figure_name': picks['figure_name'].to_numpy(),
+        'series_name': picks['character_name'].to_numpy(),
+        'sub_series_name': picks['series_name'].to_numpy(),
+        'price_paid': picks['price'].str.lstrip('$').astype(float).to_numpy(),
+        'owned_date': owned_dates.strftime('%Y-%m-%d'),
+        'source': rng.choice(["Store", "Online", "Trade", "CSV Upload"], size=len(picks)),
+        'quantity': rng.choice([1, 1, 1, 2, 3], size=len(picks)),
+    })
+
+
+def make_roster(n_rows, seed=0):
+    """Player roster with `female_players.csv`'s columns and string formats."""
+    rng = np.random.default_rng(seed)
+    n_teams = max(2, n_rows // 20)
+    teams = np.array([f"Team {i:05d}" for i in range(n_teams)])
+    team_index = rng.integers(0, n_teams, n_rows)
+    positions = rng.choice(PLAYER_POSITIONS, size=n_rows, p=np.array(PLAYER_POSITION_WEIGHTS) / sum(PLAYER_POSITION_WEIGHTS))
+    is_gk = positions == 'GK'
+    ovr = np.clip(rng.normal(72, 7, n_rows).round(), 50, 93).astype(int)
+    height_cm = rng.integers(155, 190, n_rows)
+    weight_kg = rng.integers(50, 80, n_rows)
+
+    roster = {
+        'Unnamed: 0': np.arange(n_rows),
+        'Rank': np.clip(100 - ovr, 1, None),
+        'Name': [f"Player {i:07d}" for i in range(n_rows)],
+        'OVR': ovr,
+    }
+    for stat in PLAYER_FACE_STATS + PLAYER_DETAIL_STATS:
+        roster[stat] = np.clip(ovr + rng.integers(-25, 15, n_rows), 20, 99)
+    roster.update({
+        'Position': positions,
+        'Weak foot': rng.integers(1, 6, n_rows),
+        'Skill moves': rng.integers(1, 6, n_rows),
+        'Preferred foot': np.where(rng.random(n_rows) < 0.85, "Right", "Left"),
+        'Height': [f"{cm}cm / {int(cm / 30.48)}'{round(cm / 2.54 % 12)}\"" for cm in height_cm],
+        'Weight': [f"{kg}kg / {round(kg * 2.2046)}lb" for kg in weight_kg],
+        'Alternative positions': np.where(rng.random(n_rows) < 0.6, rng.choice(PLAYER_POSITIONS[4:], size=n_rows), None),
+        'Age': rng.integers(16, 40, n_rows),
+        'Nation': [f"Nation {i:03d}" for i in rng.integers(0, 64, n_rows)],
+        'League': (np.array([f"League {i:02d}" for i in range(12)]))[team_index % 12],
+        'Team': teams[team_index],
+        'play style': [", ".join(rng.choice(PLAYER_STYLES, size=k, replace=False)) for k in rng.integers(1, 8, n_rows)],
+        'url': [f"https://example.com/player-ratings/player-{i}/{200000 + i}" for i in range(n_rows)],
+    })
+    for stat in PLAYER_GK_STATS: # Only goalkeepers have GK ratings, stored as floats like the real file
+        roster[stat] = np.where(is_gk, np.clip(ovr + rng.integers(-8, 6, n_rows), 20, 99).astype(float), np.nan)
+    df = pd.DataFrame(roster)
+    df.index.name = '' # The real file's unnamed leading column
+    return df
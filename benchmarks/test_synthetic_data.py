@@ -0,0 +1,44 @@
+"""Checks that the synthetic datasets stay readable by the apps' own parsers."""
+
+import sys
+
+import pandas as pd
+
+from run_benchmarks import BLINDBOX_APP_DIR, PLAYERS_APP_DIR
+from synthetic_data import make_catalog, make_collection, make_roster, write_catalog_sources
+
+sys.path.insert(0, BLINDBOX_APP_DIR)
+sys.path.insert(0, PLAYERS_APP_DIR)
+from blindbox_engine import CatalogManifestCache, CollectionStore, parse_master_catalog, prepare_collection_upload # noqa: E402
+from players_engine import REQUIRED_COLUMNS, parse_players # noqa: E402
+
+
+def test_generators_are_seeded():
+    pd.testing.assert_frame_equal(make_catalog(100, seed=3), make_catalog(100, seed=3))
+    assert not make_roster(50, seed=1).equals(make_roster(50, seed=2))
+
+
+def test_catalog_and_collection_load_like_the_real_files():
+    raw_catalog = make_catalog(1000)
+    catalog = parse_master_catalog(raw_catalog.to_csv(index=False).encode())
+    assert len(catalog) == 1000
+    assert (catalog['series'].value_counts() <= 13).all() # Twelve regular figures and a secret per sub-series
+
+    store = CollectionStore()
+    counts = store.bulk_upsert(prepare_collection_upload(make_collection(raw_catalog, 300)))
+    assert counts['inserted'] == len(store) == 300
+    assert store.owned_dataframe()['figure_name'].isin(catalog['figure_name']).all()
+
+
+def test_manifest_sources_merge_back_into_the_catalog(tmp_path):
+    raw_catalog = make_catalog(500)
+    df, _, _ = CatalogManifestCache(write_catalog_sources(str(tmp_path), raw_catalog, n_files=4)).get()
+    assert sorted(df['figure_name']) == sorted(raw_catalog['figure_name'])
+
+
+def test_roster_loads_like_the_real_file():
+    roster = parse_players(make_roster(200).to_csv(index=False).encode())
+    assert len(roster) == 200
+    assert roster[REQUIRED_COLUMNS].notna().all().all()
+    assert roster.loc[roster['Position'] != 'GK', 'GK Diving'].isna().all()
+    assert roster['Height (cm)'].notna().all()